@@ -2,6 +2,7 @@ from typing import Dict, Any, Optional, List
 from app.utils.app_logging import get_logger
 from app.config.app_config import AppConfigSingleton
 from app.config.chroma_client_service import ChromaClientService
+from app.config.vector_db_client import distance_to_score
 
 cfg = AppConfigSingleton.instance()
 logger = get_logger(cfg)
@@ -30,18 +31,20 @@ class RetrievalTools:
         if client_id: where["client_id"] = client_id
         if doc_type: where["doc_type"] = doc_type
 
-        res = dbclient.query(query_text=query, n_results=n_results, where=where or None)
+        res = dbclient.query(query_text=query, n_results=n_results, where=where or None, snippet_chars=800)
         ids = res.get("ids", [[]])[0]
         docs = res.get("documents", [[]])[0]
         metas = res.get("metadatas", [[]])[0]
+        dists = (res.get("distances") or [[]])[0] or [None] * len(ids)
         hits: List[Dict[str, Any]] = []
         for i, _id in enumerate(ids):
             meta = metas[i] or {}
             hits.append({
                 "id": _id,
                 "parent_id": meta.get("parent_id") or _id.split("::chunk::")[0],
-                "text": (docs[i] or "")[:800],
-                "metadata": meta
+                "text": docs[i] or "",
+                "metadata": meta,
+                "score": distance_to_score(dists[i])
             })
         logger.info("[Tools] vector_search hits=%d", len(hits))
         return {"query": query, "hits": hits}
@@ -1,12 +1,16 @@
 # app/adapters/feature/react_single_agent/tool_adapters.py
 from typing import Dict, Any, Optional, List, Tuple
+import asyncio, time
 from app.config.app_config import AppConfigSingleton
 from app.utils.app_logging import get_logger
 from app.config.vector_db_client import VectorDBClient
+from app.utils.deadline import Deadline
+from app.utils import metrics, tracing
 
 _cfg = AppConfigSingleton.instance()
 _logger = get_logger(_cfg)
 _vdb = VectorDBClient(backend="chroma")
+_parent_vdb = VectorDBClient(backend="chroma", collection_name=_cfg.parent_collection_name)
 
 def _normalize_where(where: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
     if not where: return None
@@ -25,13 +29,39 @@ def _normalize_where(where: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]
             norm[lk] = v
     return norm
 
-def _query_with_where(query: str, top_k: int, where: Optional[Dict[str, Any]]) -> Dict[str, Any]:
-    return _vdb.search(query=query, top_k=top_k, where=where)
+_WITH_EMBEDDINGS = ["metadatas", "documents", "embeddings"]
+
+def _query_with_where(query: str, top_k: int, where: Optional[Dict[str, Any]], min_score: Optional[float] = None,
+                      snippet_chars: Optional[int] = None, fields: Optional[List[str]] = None,
+                      include_embeddings: bool = False) -> Dict[str, Any]:
+    return _vdb.search(query=query, top_k=top_k, where=where, min_score=min_score, snippet_chars=snippet_chars, fields=fields,
+                       include=_WITH_EMBEDDINGS if include_embeddings else None)
+
+def _relaxation_stages(where: Optional[Dict[str, Any]]) -> List[Tuple[str, Optional[Dict[str, Any]]]]:
+    candidates: List[Tuple[str, Optional[Dict[str, Any]]]] = []
+    base = _normalize_where(where)
+    candidates.append(("strict", base))
+    if base:
+        bB = dict(base)
+        if "year" in bB:
+            bB["form"] = (bB.get("form") or "10-k").lower()
+            candidates.append(("year+form", bB))
+    if base and "year" in base:
+        candidates.append(("year-only", {"year": base["year"]}))
+    candidates.append(("unfiltered", None))
+    return candidates
+
+def _with_parents(filt: Optional[Dict[str, Any]], parent_ids: List[str]) -> Dict[str, Any]:
+    out = dict(filt or {})
+    out["parent_id"] = parent_ids[0] if len(parent_ids) == 1 else {"$in": parent_ids}
+    return out
 
 def _build_hits(res: Dict[str, Any]) -> List[Dict[str, Any]]:
     ids = res.get("ids", [[]])[0]
     docs = res.get("documents", [[]])[0]
     metas = res.get("metadatas", [[]])[0]
+    scores = (res.get("scores") or [[]])[0] or [None] * len(ids)
+    embs = (res.get("embeddings") or [None])[0]
     hits: List[Dict[str, Any]] = []
     for i in range(len(ids)):
         meta = metas[i] or {}
@@ -43,33 +73,77 @@ def _build_hits(res: Dict[str, Any]) -> List[Dict[str, Any]]:
             "id": ids[i],
             "text": docs[i],
             "parent_id": pid,
-            "meta": meta
+            "meta": meta,
+            "score": scores[i],
+            **({"embedding": embs[i]} if embs is not None else {})
         })
     return hits
 
 class RetrievalTools:
     @staticmethod
-    async def vector_search(query: str, n_results: int = 5, where: Dict[str, Any] = None) -> Dict[str, Any]:
-        candidates: List[Tuple[str, Optional[Dict[str, Any]]]] = []
-        base = _normalize_where(where)
-        candidates.append(("strict", base))
-        if base:
-            bB = dict(base)
-            if "year" in bB:
-                bB["form"] = (bB.get("form") or "10-k").lower()
-                candidates.append(("year+form", bB))
-        if base and "year" in base:
-            candidates.append(("year-only", {"year": base["year"]}))
-        candidates.append(("unfiltered", None))
+    async def embed_query(query: str) -> List[float]:
+        # same (memoized) query embedding the chunk search uses
+        return await asyncio.to_thread(_vdb.get_query_embedding, query)
+
+    @staticmethod
+    def embed_texts(texts: List[str]) -> List[List[float]]:
+        """Blocking batch embedding with the chunk collection's model (vectors comparable to the chunk embeddings)."""
+        return _vdb.embed_many(texts)
+
+    @staticmethod
+    async def parent_search(query: str, n_parents: int = 3, where: Optional[Dict[str, Any]] = None) -> List[str]:
+        """Stage 1 of two-stage retrieval: top parent ids from the parent summary index."""
+        sections = max(1, _cfg.parent_sections_per_doc)
+        res = await _parent_vdb.search(query=query, top_k=n_parents * sections, where=where, include=["metadatas"], fields=["parent_id"])
+        parent_ids: List[str] = []
+        for h in _build_hits(res):
+            pid = h.get("parent_id")
+            if pid and pid not in parent_ids:
+                parent_ids.append(pid)
+            if len(parent_ids) >= n_parents:
+                break
+        return parent_ids
 
-        for stage, filt in candidates:
+    @staticmethod
+    @tracing.traced("retrieval.vector_search")
+    async def vector_search(query: str, n_results: int = 5, where: Dict[str, Any] = None, parent_k: Optional[int] = None,
+                            min_score: Optional[float] = None, snippet_chars: Optional[int] = None,
+                            fields: Optional[List[str]] = None, deadline: Optional[Deadline] = None,
+                            include_embeddings: bool = False) -> Dict[str, Any]:
+        # include_embeddings puts each hit's stored chunk vector on hit["embedding"] (for grounded scoring)
+        # min_score drops weak hits, so a stage with only weak matches relaxes to the next filter stage
+        t0 = time.perf_counter()
+        tracing.annotate(query=query[:200], k=n_results, parent_k=parent_k, min_score=min_score)
+        for i, (stage, filt) in enumerate(_relaxation_stages(where)):
+            if i and deadline is not None and deadline.below(_cfg.agent_llm_reserve_ms):
+                # keep what is left of the request for the synthesis call instead of relaxing further
+                deadline.note("retrieval", "relaxation_stopped", query=query, next_stage=stage)
+                break
+            t_stage = time.perf_counter()
+            parent_ids: List[str] = []
+            if parent_k:
+                # Two-stage: pick top parents under this stage's filter, then search chunks only within them.
+                # An empty parent index (corpus indexed before summaries existed) falls back to a plain chunk search.
+                try:
+                    parent_ids = await RetrievalTools.parent_search(query, parent_k, filt)
+                except Exception as e:
+                    _logger.warning("[Tools] parent_search failed stage=%s: %s", stage, e)
+                if parent_ids:
+                    filt = _with_parents(filt, parent_ids)
             _logger.info("[Tools] vector_search stage=%s query='%s' where=%s n=%d", stage, query, filt, n_results)
-            res = await _query_with_where(query, n_results, filt)
+            res = await _query_with_where(query, n_results, filt, min_score, snippet_chars, fields, include_embeddings)
             hits = _build_hits(res)
+            metrics.RETRIEVAL_STAGE_SECONDS.observe(time.perf_counter() - t_stage, stage=stage, outcome="hits" if hits else "empty")
+            tracing.record("retrieval.stage", t_stage, stage=stage, hits=len(hits), parents=len(parent_ids))
             _logger.info("[Tools] vector_search stage=%s hits=%d", stage, len(hits))
             if hits:
                 res["hits"] = hits
                 res["stage"] = stage
+                res["parent_ids"] = parent_ids
+                res["latency_ms"] = int((time.perf_counter() - t0) * 1000)
+                tracing.annotate(stage=stage, hits=len(hits))
                 return res
 
-        return {"hits": [], "ids": [[]], "documents": [[]], "metadatas": [[]], "stage": "none", "latency_ms": 0}
+        tracing.annotate(stage="none", hits=0)
+        return {"hits": [], "ids": [[]], "documents": [[]], "metadatas": [[]], "stage": "none",
+                "latency_ms": int((time.perf_counter() - t0) * 1000)}
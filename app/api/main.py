@@ -1,11 +1,17 @@
 from fastapi import FastAPI
 from app.config.app_config import AppConfig, AppConfigSingleton
+from app.config.llm_client import close_llm_client
 from app.utils.app_logging import get_logger
+from app.utils.metrics import MetricsMiddleware
+from app.utils.profiler import ProfilingMiddleware
 
 # Routers
 from app.router.clients_router import router as clients_router
 from app.router.doc_indexing_router import indexing_router
 from app.router.rag_search_router import rag_router
+from app.router.eval_router import eval_router
+from app.router.metrics_router import metrics_router
+from app.router.debug_router import debug_router
 from app.router.feature.react_agent.react_router import react_router
 from app.router.feature.react_agent.react_mermaid import react_mermaid_router
 #from app.router.feature.react_single_agent.react_functions_router import router as react_single_agent_router
@@ -17,6 +23,12 @@ from app.router.feature.react_single_agent.react_functions_router import router
 app = FastAPI(title="GL RAG FastAPI", version="0.1.1")
 cfg = AppConfigSingleton.instance()
 logger = get_logger(cfg)
+app.add_middleware(MetricsMiddleware)
+app.add_middleware(ProfilingMiddleware)   # outermost: the sampled window covers the whole request
+
+@app.on_event("shutdown")
+async def _close_llm_pool():
+    await close_llm_client()
 
 @app.get("/doc-indexing/health")
 async def health():
@@ -27,6 +39,9 @@ async def health():
 app.include_router(clients_router, prefix="/clients")
 app.include_router(indexing_router)   # exposes /doc-indexing/*
 app.include_router(rag_router)        # exposes /rag-search/*
+app.include_router(eval_router)       # exposes /eval/*
+app.include_router(metrics_router)    # exposes /metrics
+app.include_router(debug_router)      # exposes /debug/*
 app.include_router(react_router)
 app.include_router(react_mermaid_router)
 
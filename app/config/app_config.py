@@ -28,6 +28,110 @@ class AppConfig:
     auth_required: bool = False
     rate_limit_per_minute: int = 60
 
+    # Two-stage retrieval: a small per-parent index (section centroids) narrows the chunk search
+    parent_collection_name: str = "documents_parents"
+    parent_sections_per_doc: int = 4
+    rag_parent_top_k: int = 3
+
+    # Retrieval scores are normalized cosine similarities in [0, 1]
+    rag_min_score: Optional[float] = None
+    rag_confident_score: float = 0.75
+    rag_confident_hits: int = 3
+
+    # Self-reflection loops stop at the target score (None = scorer maximum), on a plateau, or on unchanged context
+    rag_loop_target_score: Optional[float] = None
+    rag_loop_min_gain: float = 0.05
+
+    # React agent request deadline (0 = none) and the budgets below which it degrades
+    agent_deadline_ms: int = 30000
+    agent_variants_min_ms: int = 8000     # less than this at start: answer with the original question only
+    agent_loop_min_ms: int = 4000         # less than this before a follow-up loop: stop looping
+    agent_llm_reserve_ms: int = 2000      # retrieval stops relaxing filters when only this much is left
+
+    # Synthesis context packing (app/utils/context_packer.py)
+    context_token_budget: int = 1200
+    context_max_per_parent: int = 3
+    context_dedupe_threshold: float = 0.8
+    # tiktoken BPE files are only read from here, never downloaded; seed once (see README) or counts use ~4 chars/token
+    tiktoken_cache_dir: str = ""
+
+    # Function-calling agent: tool calls of one turn run concurrently, each bounded by its own timeout
+    functions_max_tool_rounds: int = 3
+    functions_tool_timeout_sec: float = 10.0
+    functions_tool_snippet_chars: int = 600
+
+    # Plain RAG path (/rag-search): per-process caps on in-flight retrievals and LLM calls
+    rag_max_concurrent_retrievals: int = 32
+    rag_max_concurrent_llm: int = 16
+
+    # LLM backend: "openai" (openai_base_url) or "fake" (in-process stand-in, app/config/fake_openai.py)
+    llm_backend: str = "openai"
+    fake_llm_latency_ms: float = 200.0
+    fake_llm_latency_dist: str = "lognormal"   # fixed | uniform | exponential | lognormal (median = latency_ms)
+    fake_llm_latency_sigma: float = 0.5
+    fake_llm_ms_per_token: float = 0.0
+    fake_llm_error_rate: float = 0.0
+    fake_llm_rate_limit_rate: float = 0.0
+    fake_llm_seed: int = 0
+
+    # Shared AsyncOpenAI client: keep-alive pool size and per-call timeouts
+    llm_max_connections: int = 200
+    llm_max_keepalive: int = 50
+    llm_keepalive_expiry_sec: float = 30.0
+    llm_connect_timeout_sec: float = 5.0
+    llm_request_timeout_sec: float = 60.0
+
+    # Global LLM limiter: rate_limit_per_minute (requests) + tokens/min buckets, AIMD concurrency cap; 0 disables a bucket
+    llm_tokens_per_minute: int = 200000
+    llm_concurrency_initial: int = 16
+    llm_concurrency_min: int = 1
+    llm_concurrency_max: int = 256
+    llm_latency_spike_factor: float = 2.0
+
+    # Answer cache in front of the react agents' synthesis call (feature flag "answer_cache")
+    answer_cache_path: str = ""
+    answer_cache_max_entries: int = 2000
+    answer_cache_semantic_threshold: float = 0.95
+
+    # Batch evaluation runner (app/service/eval/batch_runner.py)
+    eval_concurrency: int = 16
+    eval_output_dir: str = ""
+
+    # Benchmark suite (app/service/eval/benchmark.py): results, baseline and scratch index live under bench_dir
+    bench_dir: str = ""
+    bench_regression_tolerance: float = 0.15
+
+    # Prometheus metrics (app/utils/metrics.py), served on GET /metrics
+    metrics_enabled: bool = True
+
+    # Span tracing (app/utils/tracing.py): sampled runs go to trace_exporter and GET /debug/trace/{run_id}
+    tracing_enabled: bool = True
+    trace_sample_rate: float = 0.1
+    trace_exporter: str = "jsonl"   # jsonl | otlp | none
+    trace_file: str = ""
+    trace_recent: int = 200
+
+    # Logging (app/utils/app_logging.py): queue-backed writer, optional JSON lines, per-template rate limit for INFO/DEBUG
+    log_json: bool = False
+    log_rate_limit: float = 20.0
+    log_queue_size: int = 10000
+
+    # On-demand profiling (app/utils/profiler.py): X-Profile header / ?profile= per request, GET /debug/profile for the worker
+    profiling_enabled: bool = False
+    profiling_token: str = ""
+    profiling_interval_ms: float = 5.0
+    profiling_max_seconds: int = 60
+    profile_dir: str = ""
+
+    # grounded_v1 output scoring (VariantOutputScoreService): answer sentences vs the cited chunks' stored embeddings.
+    # Cosine below the floor counts as unsupported, at or above full as fully supported.
+    # grounded_target_score (opt-in, unset = 5.0) is a good-enough stop: a grounded_v1 loop scoring at least this ends its
+    # variant's loops. It never cancels other variants; the scoreboard only does that at the maximum.
+    grounded_similarity_floor: float = 0.25
+    grounded_similarity_full: float = 0.6
+    grounded_target_score: Optional[float] = None
+    grounded_max_sentences: int = 16
+
 class AppConfigSingleton:
     _instance: Optional[AppConfig] = None
 
@@ -74,13 +178,79 @@ class AppConfigSingleton:
                 feature_flags={
                     "react_variants": True,
                     "output_scoring": True,
+                    "parent_two_stage_retrieval": True,
+                    "answer_cache": os.getenv("ANSWER_CACHE_ENABLED", "true").lower() == "true",
+                    "agent_single_flight": True,
                 },
                 db_providers={
                     "postgres": {"enabled": os.getenv("POSTGRES_ENABLED", "false").lower() == "true"},
                     "snowflake": {"enabled": os.getenv("SNOWFLAKE_ENABLED", "false").lower() == "true"}
                 },
                 auth_required=os.getenv("AUTH_REQUIRED", "false").lower() == "true",
-                rate_limit_per_minute=int(os.getenv("RATE_LIMIT_PER_MINUTE", "60"))
+                rate_limit_per_minute=int(os.getenv("RATE_LIMIT_PER_MINUTE", "60")),
+                parent_sections_per_doc=int(os.getenv("PARENT_SECTIONS_PER_DOC", "4")),
+                rag_parent_top_k=int(os.getenv("RAG_PARENT_TOP_K", "3")),
+                rag_min_score=float(os.getenv("RAG_MIN_SCORE")) if os.getenv("RAG_MIN_SCORE") else None,
+                rag_confident_score=float(os.getenv("RAG_CONFIDENT_SCORE", "0.75")),
+                rag_confident_hits=int(os.getenv("RAG_CONFIDENT_HITS", "3")),
+                rag_loop_target_score=float(os.getenv("RAG_LOOP_TARGET_SCORE")) if os.getenv("RAG_LOOP_TARGET_SCORE") else None,
+                rag_loop_min_gain=float(os.getenv("RAG_LOOP_MIN_GAIN", "0.05")),
+                agent_deadline_ms=int(os.getenv("AGENT_DEADLINE_MS", "30000")),
+                agent_variants_min_ms=int(os.getenv("AGENT_VARIANTS_MIN_MS", "8000")),
+                agent_loop_min_ms=int(os.getenv("AGENT_LOOP_MIN_MS", "4000")),
+                agent_llm_reserve_ms=int(os.getenv("AGENT_LLM_RESERVE_MS", "2000")),
+                context_token_budget=int(os.getenv("CONTEXT_TOKEN_BUDGET", "1200")),
+                context_max_per_parent=int(os.getenv("CONTEXT_MAX_PER_PARENT", "3")),
+                context_dedupe_threshold=float(os.getenv("CONTEXT_DEDUPE_THRESHOLD", "0.8")),
+                tiktoken_cache_dir=os.getenv("TIKTOKEN_CACHE_DIR", os.path.join(data, "tiktoken")),
+                functions_max_tool_rounds=int(os.getenv("FUNCTIONS_MAX_TOOL_ROUNDS", "3")),
+                functions_tool_timeout_sec=float(os.getenv("FUNCTIONS_TOOL_TIMEOUT_SEC", "10")),
+                functions_tool_snippet_chars=int(os.getenv("FUNCTIONS_TOOL_SNIPPET_CHARS", "600")),
+                rag_max_concurrent_retrievals=int(os.getenv("RAG_MAX_CONCURRENT_RETRIEVALS", "32")),
+                rag_max_concurrent_llm=int(os.getenv("RAG_MAX_CONCURRENT_LLM", "16")),
+                llm_backend=os.getenv("LLM_BACKEND", "openai").lower(),
+                fake_llm_latency_ms=float(os.getenv("FAKE_LLM_LATENCY_MS", "200")),
+                fake_llm_latency_dist=os.getenv("FAKE_LLM_LATENCY_DIST", "lognormal"),
+                fake_llm_latency_sigma=float(os.getenv("FAKE_LLM_LATENCY_SIGMA", "0.5")),
+                fake_llm_ms_per_token=float(os.getenv("FAKE_LLM_MS_PER_TOKEN", "0")),
+                fake_llm_error_rate=float(os.getenv("FAKE_LLM_ERROR_RATE", "0")),
+                fake_llm_rate_limit_rate=float(os.getenv("FAKE_LLM_RATE_LIMIT_RATE", "0")),
+                fake_llm_seed=int(os.getenv("FAKE_LLM_SEED", "0")),
+                llm_max_connections=int(os.getenv("LLM_MAX_CONNECTIONS", "200")),
+                llm_max_keepalive=int(os.getenv("LLM_MAX_KEEPALIVE", "50")),
+                llm_keepalive_expiry_sec=float(os.getenv("LLM_KEEPALIVE_EXPIRY_SEC", "30")),
+                llm_connect_timeout_sec=float(os.getenv("LLM_CONNECT_TIMEOUT_SEC", "5")),
+                llm_request_timeout_sec=float(os.getenv("LLM_REQUEST_TIMEOUT_SEC", "60")),
+                llm_tokens_per_minute=int(os.getenv("LLM_TOKENS_PER_MINUTE", "200000")),
+                llm_concurrency_initial=int(os.getenv("LLM_CONCURRENCY_INITIAL", "16")),
+                llm_concurrency_min=int(os.getenv("LLM_CONCURRENCY_MIN", "1")),
+                llm_concurrency_max=int(os.getenv("LLM_CONCURRENCY_MAX", "256")),
+                llm_latency_spike_factor=float(os.getenv("LLM_LATENCY_SPIKE_FACTOR", "2.0")),
+                answer_cache_path=os.getenv("ANSWER_CACHE_PATH", os.path.join(data, "cache", "answer_cache.sqlite3")),
+                answer_cache_max_entries=int(os.getenv("ANSWER_CACHE_MAX_ENTRIES", "2000")),
+                answer_cache_semantic_threshold=float(os.getenv("ANSWER_CACHE_SEMANTIC_THRESHOLD", "0.95")),
+                eval_concurrency=int(os.getenv("EVAL_CONCURRENCY", "16")),
+                eval_output_dir=os.getenv("EVAL_OUTPUT_DIR", os.path.join(data, "eval")),
+                bench_dir=os.getenv("BENCH_DIR", os.path.join(data, "bench")),
+                bench_regression_tolerance=float(os.getenv("BENCH_REGRESSION_TOLERANCE", "0.15")),
+                metrics_enabled=os.getenv("METRICS_ENABLED", "true").lower() == "true",
+                tracing_enabled=os.getenv("TRACING_ENABLED", "true").lower() == "true",
+                trace_sample_rate=float(os.getenv("TRACE_SAMPLE_RATE", "0.1")),
+                trace_exporter=os.getenv("TRACE_EXPORTER", "jsonl"),
+                trace_file=os.getenv("TRACE_FILE", os.path.join(logs_dir, "traces.jsonl")),
+                trace_recent=int(os.getenv("TRACE_RECENT", "200")),
+                log_json=os.getenv("LOG_JSON", "false").lower() == "true",
+                log_rate_limit=float(os.getenv("LOG_RATE_LIMIT", "20")),
+                log_queue_size=int(os.getenv("LOG_QUEUE_SIZE", "10000")),
+                profiling_enabled=os.getenv("PROFILING_ENABLED", "false").lower() == "true",
+                profiling_token=os.getenv("PROFILING_TOKEN", ""),
+                profiling_interval_ms=float(os.getenv("PROFILING_INTERVAL_MS", "5")),
+                profiling_max_seconds=int(os.getenv("PROFILING_MAX_SECONDS", "60")),
+                profile_dir=os.getenv("PROFILE_DIR", os.path.join(logs_dir, "profiles")),
+                grounded_similarity_floor=float(os.getenv("GROUNDED_SIMILARITY_FLOOR", "0.25")),
+                grounded_similarity_full=float(os.getenv("GROUNDED_SIMILARITY_FULL", "0.6")),
+                grounded_target_score=float(os.getenv("GROUNDED_TARGET_SCORE")) if os.getenv("GROUNDED_TARGET_SCORE") else None,
+                grounded_max_sentences=int(os.getenv("GROUNDED_MAX_SENTENCES", "16"))
             )
         return cls._instance
 
@@ -7,6 +7,7 @@ from app.config.app_config import AppConfigSingleton
 from app.utils.app_logging import get_logger
 from app.config.chroma_db_client import ChromaDBClient
 from app.config.vector_db_client import VectorDBClient
+from app.utils import metrics
 
 _cfg = AppConfigSingleton.instance()
 _logger = get_logger(_cfg)
@@ -14,6 +15,7 @@ _logger = get_logger(_cfg)
 class ChromaClientService:
     def __init__(self, collection_name: str = "documents_collection", backend: str = "chroma"):
         self._chroma = ChromaDBClient(collection_name=collection_name)
+        self._collection_name = collection_name
         self._vector = VectorDBClient(backend=backend)
 
     def health(self) -> Dict[str, Any]:
@@ -36,9 +38,19 @@ class ChromaClientService:
         return self._chroma.save_metadata(doc_id, patch)
 
     # Legacy text path
-    def query(self, query_text: str, n_results: int = 8, where: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
-        return self._chroma.query(query_text=query_text, n_results=n_results, where=where)
+    def query(self, query_text: str, n_results: int = 8, where: Optional[Dict[str, Any]] = None,
+              include: Optional[List[str]] = None, snippet_chars: Optional[int] = None,
+              fields: Optional[List[str]] = None) -> Dict[str, Any]:
+        # text queries embed inside Chroma, so this one histogram covers embed + query
+        with metrics.VECTOR_QUERY_SECONDS.time(collection=self._collection_name, outcome="error") as lab:
+            res = self._chroma.query(query_text=query_text, n_results=n_results, where=where,
+                                     include=include, snippet_chars=snippet_chars, fields=fields)
+            lab["outcome"] = "ok"
+        return res
 
     # New vector-agnostic path
-    def query_with_reusable_embedding(self, query_text: str, n_results: int = 8, where: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
-        return self._vector.search(query=query_text, top_k=n_results, where=where or {})
+    def query_with_reusable_embedding(self, query_text: str, n_results: int = 8, where: Optional[Dict[str, Any]] = None,
+                                      include: Optional[List[str]] = None, snippet_chars: Optional[int] = None,
+                                      fields: Optional[List[str]] = None) -> Dict[str, Any]:
+        return self._vector.search(query=query_text, top_k=n_results, where=where or {},
+                                   include=include, snippet_chars=snippet_chars, fields=fields)
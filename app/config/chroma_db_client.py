@@ -7,6 +7,8 @@ import chromadb
 from chromadb.utils import embedding_functions
 from app.config.app_config import AppConfigSingleton
 from app.utils.app_logging import get_logger
+from app.utils.snippets import extract_snippet, project_metadata
+from app.config.vector_db_client import chroma_include
 
 _cfg = AppConfigSingleton.instance()
 _logger = get_logger(_cfg)
@@ -76,11 +78,19 @@ class ChromaDBClient:
         items = [{k: {"$eq": v}} for k, v in filt.items()]
         return items[0] if len(items) == 1 else {"$and": items}
 
-    def query(self, query_text: str, n_results: int = 8, where: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    def query(self, query_text: str, n_results: int = 8, where: Optional[Dict[str, Any]] = None,
+              include: Optional[List[str]] = None, snippet_chars: Optional[int] = None,
+              fields: Optional[List[str]] = None) -> Dict[str, Any]:
         if not query_text or not query_text.strip():
             raise ValueError("query_text is required")
         norm_where = self._normalize_where(where)
-        return self.collection.query(query_texts=[query_text], n_results=n_results, where=norm_where)
+        res = self.collection.query(query_texts=[query_text], n_results=n_results, where=norm_where, include=chroma_include(include))
+        # Projection happens here so callers get compact hits instead of truncating full documents themselves
+        if snippet_chars and res.get("documents"):
+            res["documents"] = [[extract_snippet(d, query_text, snippet_chars) if d is not None else None for d in res["documents"][0]]]
+        if fields and res.get("metadatas"):
+            res["metadatas"] = [[project_metadata(m, fields) for m in res["metadatas"][0]]]
+        return res
 
     def query_by_vector(self, query_vector: List[float], n_results: int = 8, where: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
         norm_where = self._normalize_where(where)
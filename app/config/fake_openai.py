@@ -0,0 +1,275 @@
+# app/config/fake_openai.py
+# Deterministic OpenAI-compatible stand-in for load and latency testing: no network, no cost, no rate card.
+# Serves POST /chat/completions (plain, streamed, tool_calls) and GET /models.
+#  - in-process: LLM_BACKEND=fake makes get_llm_client() send every call through fake_transport()
+#  - standalone: python -m app.config.fake_openai --port 8099, then point OPENAI_BASE_URL at http://127.0.0.1:8099/v1
+# Answers are built from the supplied context: the sentences that best match the question, each cited with the
+# [parent-id] of the block it came from. With tools offered and no tool result yet, the first tool is called instead.
+# Latency, injected 5xx errors and 429s are drawn from one seeded RNG, so a run with the same call order repeats exactly.
+
+import argparse
+import asyncio
+import hashlib
+import json
+import random
+import re
+import time
+from typing import Any, Dict, List, Optional, Tuple
+import httpx
+from app.config.app_config import AppConfigSingleton
+from app.utils.context_packer import count_tokens
+
+_cfg = AppConfigSingleton.instance()
+
+LATENCY_DISTS = ("fixed", "uniform", "exponential", "lognormal")
+
+_CITE = re.compile(r"\[([A-Za-z0-9][\w.\-]*(?:::[\w.\-]+)*)\]")
+_CONTEXT = re.compile(r"^Context[^\n]*:\s*$", re.MULTILINE)
+_SENT = re.compile(r"(?<=[.!?])\s+|\n+")
+_TERM = re.compile(r"[a-z0-9]{3,}")
+_STOP = frozenset("the and for with what was were did how this that from are its their year which into about over".split())
+
+# ---------------- answer synthesis ----------------
+
+def _question(messages: List[Dict[str, Any]]) -> str:
+    users = [m for m in messages if m.get("role") == "user"]
+    text = str(users[0].get("content") or "") if users else ""
+    m = re.search(r"Question:\s*(.+)", text)
+    return (m.group(1) if m else text.split("\n", 1)[0]).strip()
+
+def _blocks(messages: List[Dict[str, Any]]) -> Tuple[List[Tuple[str, Optional[str]]], List[str]]:
+    """(text, parent_id or None) evidence blocks plus every id the prompt allows citing, in order of appearance."""
+    blocks: List[Tuple[str, Optional[str]]] = []
+    ids: List[str] = []
+    for m in messages:
+        content = str(m.get("content") or "")
+        if m.get("role") == "tool":
+            try:
+                data = json.loads(content)
+            except ValueError:
+                data = {"snippet": content}
+            items = data.get("hits", [data]) if isinstance(data, dict) else []
+            for h in items:
+                if isinstance(h, dict) and (h.get("snippet") or h.get("text")):
+                    blocks.append((h.get("snippet") or h.get("text"), h.get("parent_id")))
+                    if h.get("parent_id"):
+                        ids.append(h["parent_id"])
+        elif m.get("role") == "user":
+            head = _CONTEXT.search(content)
+            ctx = content[head.end():] if head else content
+            ctx = ctx.split("\nInstructions:", 1)[0]
+            for block in re.split(r"\n-{3,}\n", ctx):
+                ids.extend(c for c in _CITE.findall(block) if c != "parent-id")
+                # "Allowed citations: [a], [b]" headers only contribute ids
+                block = "\n".join(ln for ln in block.split("\n") if not ln.strip().startswith("Allowed citations"))
+                lead = re.match(r"\s*\[([^\[\]]+)\]", block)
+                blocks.append((block, lead.group(1) if lead else None))
+    return blocks, list(dict.fromkeys(ids))
+
+def build_answer(messages: List[Dict[str, Any]]) -> str:
+    question = _question(messages)
+    q_terms = {t for t in _TERM.findall(question.lower()) if t not in _STOP}
+    blocks, ids = _blocks(messages)
+    candidates = []
+    for text, pid in blocks:
+        for s in _SENT.split(_CITE.sub("", text)):
+            s = " ".join(s.split()).strip(" -")
+            if len(s) < 30 or s.endswith("?") or s.startswith(("Question:", "Observation:")) or question in s:
+                continue
+            overlap = len(q_terms & set(_TERM.findall(s.lower())))
+            candidates.append((-overlap, not re.search(r"\d", s), len(candidates), s[:300], pid))
+    if not candidates:
+        return "I do not have enough information in the provided context to answer."
+    picked = sorted(candidates)[:2]
+    parts = []
+    for i, (_, _, _, sentence, pid) in enumerate(sorted(picked, key=lambda c: c[2])):
+        pid = pid or (ids[i % len(ids)] if ids else None)
+        parts.append(sentence.rstrip(".") + (f" [{pid}]." if pid else "."))
+    return " ".join(parts)
+
+def _tool_call(messages: List[Dict[str, Any]], tools: List[Dict[str, Any]], n: int) -> Dict[str, Any]:
+    fn = next(t.get("function") for t in tools if t.get("type") == "function")
+    params = fn.get("parameters") or {}
+    props = params.get("properties") or {}
+    question = _question(messages)
+    args: Dict[str, Any] = {}
+    for name in params.get("required") or []:
+        spec = props.get(name) or {}
+        if spec.get("type") in ("integer", "number"):
+            args[name] = spec.get("default", 5)
+        elif spec.get("type") == "boolean":
+            args[name] = spec.get("default", False)
+        else:
+            args[name] = question
+    call_id = "call_" + hashlib.sha1(f"{question}:{fn['name']}:{n}".encode("utf-8")).hexdigest()[:16]
+    return {"id": call_id, "type": "function", "function": {"name": fn["name"], "arguments": json.dumps(args)}}
+
+# ---------------- server core ----------------
+
+class FakeOpenAI:
+    def __init__(self, model: str = "fake-gpt", latency_ms: float = 200.0, latency_dist: str = "lognormal",
+                 latency_sigma: float = 0.5, ms_per_token: float = 0.0, error_rate: float = 0.0,
+                 rate_limit_rate: float = 0.0, seed: int = 0):
+        if latency_dist not in LATENCY_DISTS:
+            raise ValueError(f"unknown latency distribution {latency_dist!r}; expected one of {', '.join(LATENCY_DISTS)}")
+        self.model = model
+        self.latency_ms = max(0.0, latency_ms)
+        self.latency_dist = latency_dist
+        self.latency_sigma = latency_sigma
+        self.ms_per_token = ms_per_token
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self._rng = random.Random(seed)
+        self.stats = {"requests": 0, "completions": 0, "tool_calls": 0, "streamed": 0, "errors_injected": 0,
+                      "rate_limited_injected": 0, "prompt_tokens": 0, "completion_tokens": 0}
+
+    @classmethod
+    def from_config(cls) -> "FakeOpenAI":
+        return cls(
+            model=_cfg.openai_llm_model or _cfg.openai_default_model or "fake-gpt",
+            latency_ms=_cfg.fake_llm_latency_ms,
+            latency_dist=_cfg.fake_llm_latency_dist,
+            latency_sigma=_cfg.fake_llm_latency_sigma,
+            ms_per_token=_cfg.fake_llm_ms_per_token,
+            error_rate=_cfg.fake_llm_error_rate,
+            rate_limit_rate=_cfg.fake_llm_rate_limit_rate,
+            seed=_cfg.fake_llm_seed,
+        )
+
+    def _latency_s(self, completion_tokens: int) -> float:
+        base, rng = self.latency_ms, self._rng
+        if self.latency_dist == "uniform":
+            base = rng.uniform(0.0, 2.0 * base)
+        elif self.latency_dist == "exponential":
+            base = rng.expovariate(1.0 / base) if base else 0.0
+        elif self.latency_dist == "lognormal":
+            base = base * rng.lognormvariate(0.0, self.latency_sigma)  # median = latency_ms
+        return (base + completion_tokens * self.ms_per_token) / 1000.0
+
+    def respond(self, method: str, path: str, body: bytes) -> Tuple[int, Dict[str, str], bytes, float]:
+        """(status, headers, body, delay_s) for one API call; the caller sleeps delay_s before answering."""
+        self.stats["requests"] += 1
+        path = path.rstrip("/")
+        if method == "GET" and path.endswith("/models"):
+            data = [{"id": self.model, "object": "model", "created": 0, "owned_by": "fake-openai"}]
+            return 200, {}, json.dumps({"object": "list", "data": data}).encode(), 0.0
+        if method != "POST" or not path.endswith("/chat/completions"):
+            return 404, {}, _error("not_found", f"no route {method} {path}"), 0.0
+
+        # draw injection and latency in a fixed order so the RNG sequence only depends on the call order
+        roll = self._rng.random()
+        if roll < self.rate_limit_rate:
+            self.stats["rate_limited_injected"] += 1
+            return 429, {"retry-after": "1"}, _error("rate_limit_exceeded", "injected rate limit"), self._latency_s(0) / 4
+        if roll < self.rate_limit_rate + self.error_rate:
+            self.stats["errors_injected"] += 1
+            return 500, {}, _error("server_error", "injected server error"), self._latency_s(0)
+
+        req = json.loads(body or b"{}")
+        messages = req.get("messages") or []
+        tools = [t for t in req.get("tools") or [] if t.get("type") == "function"]
+        wants_tool = tools and req.get("tool_choice") != "none" and not any(m.get("role") == "tool" for m in messages)
+        if wants_tool:
+            message = {"role": "assistant", "content": None, "tool_calls": [_tool_call(messages, tools, self.stats["requests"])]}
+            finish, text = "tool_calls", message["tool_calls"][0]["function"]["arguments"]
+            self.stats["tool_calls"] += 1
+        else:
+            text = build_answer(messages)
+            max_tokens = req.get("max_tokens")
+            finish = "stop"
+            if max_tokens and count_tokens(text) > max_tokens:
+                text, finish = text[:max_tokens * 4], "length"
+            message = {"role": "assistant", "content": text}
+        self.stats["completions"] += 1
+        usage = {"prompt_tokens": sum(count_tokens(str(m.get("content") or "")) for m in messages) + 3 * len(messages),
+                 "completion_tokens": count_tokens(text)}
+        usage["total_tokens"] = usage["prompt_tokens"] + usage["completion_tokens"]
+        self.stats["prompt_tokens"] += usage["prompt_tokens"]
+        self.stats["completion_tokens"] += usage["completion_tokens"]
+        delay = self._latency_s(usage["completion_tokens"])
+        cid = "chatcmpl-fake-%d" % self.stats["requests"]
+        model = req.get("model") or self.model
+
+        if req.get("stream"):
+            self.stats["streamed"] += 1
+            include_usage = (req.get("stream_options") or {}).get("include_usage")
+            return 200, {"content-type": "text/event-stream"}, _sse(cid, model, message, finish, usage if include_usage else None), delay
+        out = {"id": cid, "object": "chat.completion", "created": int(time.time()), "model": model,
+               "choices": [{"index": 0, "message": message, "finish_reason": finish}], "usage": usage}
+        return 200, {}, json.dumps(out).encode(), delay
+
+    async def handle(self, request: httpx.Request) -> httpx.Response:
+        status, headers, content, delay = self.respond(request.method, request.url.path, request.content)
+        if delay > 0:
+            await asyncio.sleep(delay)
+        headers.setdefault("content-type", "application/json")
+        return httpx.Response(status, headers=headers, content=content)
+
+    def transport(self) -> httpx.MockTransport:
+        return httpx.MockTransport(self.handle)
+
+    def info(self) -> Dict[str, Any]:
+        return {"model": self.model, "latency_ms": self.latency_ms, "latency_dist": self.latency_dist,
+                "error_rate": self.error_rate, "rate_limit_rate": self.rate_limit_rate, **self.stats}
+
+def _error(kind: str, message: str) -> bytes:
+    return json.dumps({"error": {"message": message, "type": kind, "code": kind}}).encode()
+
+def _sse(cid: str, model: str, message: Dict[str, Any], finish: str, usage: Optional[Dict[str, int]]) -> bytes:
+    def chunk(delta: Dict[str, Any], finish_reason: Optional[str] = None) -> str:
+        body = {"id": cid, "object": "chat.completion.chunk", "created": int(time.time()), "model": model,
+                "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}]}
+        return "data: " + json.dumps(body) + "\n\n"
+    events = [chunk({"role": "assistant", "content": ""})]
+    if message.get("tool_calls"):
+        events.append(chunk({"tool_calls": [dict(message["tool_calls"][0], index=0)]}))
+    else:
+        for word in re.findall(r"\S+\s*", message["content"] or ""):
+            events.append(chunk({"content": word}))
+    events.append(chunk({}, finish))
+    if usage is not None:
+        events.append("data: " + json.dumps({"id": cid, "object": "chat.completion.chunk", "created": int(time.time()),
+                                             "model": model, "choices": [], "usage": usage}) + "\n\n")
+    events.append("data: [DONE]\n\n")
+    return "".join(events).encode()
+
+_fake: Optional[FakeOpenAI] = None
+
+def get_fake_openai() -> FakeOpenAI:
+    """Process-wide stand-in built from AppConfig (shared by the in-process transport and the standalone server)."""
+    global _fake
+    if _fake is None:
+        _fake = FakeOpenAI.from_config()
+    return _fake
+
+def fake_transport() -> httpx.MockTransport:
+    return get_fake_openai().transport()
+
+# ---------------- standalone server ----------------
+
+def create_app(fake: Optional[FakeOpenAI] = None):
+    from fastapi import FastAPI, Request, Response
+    fake = fake or get_fake_openai()
+    app = FastAPI(title="Fake OpenAI", version="0.1.0")
+
+    @app.api_route("/v1/{path:path}", methods=["GET", "POST"])
+    async def _proxy(path: str, request: Request):
+        status, headers, content, delay = fake.respond(request.method, "/v1/" + path, await request.body())
+        if delay > 0:
+            await asyncio.sleep(delay)
+        return Response(content=content, status_code=status, headers=headers,
+                        media_type=headers.get("content-type", "application/json"))
+
+    @app.get("/stats")
+    async def _stats():
+        return fake.info()
+
+    return app
+
+if __name__ == "__main__":
+    import uvicorn
+    parser = argparse.ArgumentParser(description="Serve the deterministic OpenAI stand-in.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8099)
+    args = parser.parse_args()
+    uvicorn.run(create_app(), host=args.host, port=args.port, log_level="warning")
@@ -0,0 +1,131 @@
+# app/config/llm_client.py
+# One process-wide AsyncOpenAI client for every agent and the plain RAG path.
+# All completions share a single keep-alive httpx pool, so one worker can hold hundreds of in-flight calls
+# without a thread (or a fresh TLS handshake) per request. Retries stay with with_retries_async at the call sites.
+# Every chat completion goes through chat_completion(), which holds a slot on the process-wide llm_limiter.
+# track_usage() totals the token usage of every completion made inside it (including child tasks and threads).
+# Latency, limiter queueing and tokens also go to the process metrics (app/utils/metrics.py).
+
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Awaitable, Callable, Dict, Iterator, Optional
+import time
+import httpx
+from openai import AsyncOpenAI, RateLimitError
+from app.config.app_config import AppConfigSingleton
+from app.utils.app_logging import get_logger
+from app.utils import metrics, tracing
+from app.utils.event_stream import stream_chat_completion
+from app.utils.rate_limiter import AdaptiveConcurrency, LLMRateLimiter, estimate_tokens
+
+_cfg = AppConfigSingleton.instance()
+_logger = get_logger(_cfg)
+
+_client: Optional[AsyncOpenAI] = None
+_usage: ContextVar[Optional[Dict[str, int]]] = ContextVar("llm_usage", default=None)
+
+llm_limiter = LLMRateLimiter(
+    requests_per_minute=_cfg.rate_limit_per_minute,
+    tokens_per_minute=_cfg.llm_tokens_per_minute,
+    concurrency=AdaptiveConcurrency(
+        initial=_cfg.llm_concurrency_initial,
+        minimum=_cfg.llm_concurrency_min,
+        maximum=_cfg.llm_concurrency_max,
+        latency_spike_factor=_cfg.llm_latency_spike_factor,
+    ),
+    is_rate_limited=lambda e: isinstance(e, RateLimitError),
+)
+metrics.registry.gauge("rag_llm_limiter_state", "LLM limiter state sampled at scrape time.", ("field",),
+                       fn=lambda: {(k,): v for k, v in llm_limiter.stats().items() if k in ("concurrency_limit", "in_flight", "queued")})
+
+def llm_timeout(seconds: Optional[float] = None) -> httpx.Timeout:
+    """Per-call timeout: total read budget of `seconds` (default llm_request_timeout_sec) with a short connect timeout."""
+    total = seconds if seconds is not None else _cfg.llm_request_timeout_sec
+    return httpx.Timeout(total, connect=min(_cfg.llm_connect_timeout_sec, total))
+
+def get_llm_client() -> Optional[AsyncOpenAI]:
+    """Shared AsyncOpenAI client, created lazily on first use; None when no API key is configured.
+    With llm_backend="fake" every call goes to the in-process stand-in (app/config/fake_openai.py) instead."""
+    global _client
+    fake = _cfg.llm_backend == "fake"
+    if _client is None and (_cfg.openai_api_key or fake):
+        limits = httpx.Limits(
+            max_connections=_cfg.llm_max_connections,
+            max_keepalive_connections=_cfg.llm_max_keepalive,
+            keepalive_expiry=_cfg.llm_keepalive_expiry_sec,
+        )
+        transport = None
+        base_url = _cfg.openai_base_url
+        if fake:
+            from app.config.fake_openai import fake_transport
+            transport, base_url = fake_transport(), "http://fake-openai/v1"
+        _client = AsyncOpenAI(
+            api_key=_cfg.openai_api_key or "fake",
+            base_url=base_url,
+            timeout=llm_timeout(),
+            max_retries=0,
+            http_client=httpx.AsyncClient(limits=limits, timeout=llm_timeout(), transport=transport),
+        )
+        _logger.info("[LLMClient] ready backend=%s base_url=%s max_connections=%d keepalive=%d",
+                     _cfg.llm_backend, base_url, _cfg.llm_max_connections, _cfg.llm_max_keepalive)
+    return _client
+
+@contextmanager
+def track_usage() -> Iterator[Dict[str, int]]:
+    """`with track_usage() as usage:` accumulates calls / prompt / completion / total tokens of the enclosed work."""
+    acc = {"calls": 0, "prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0}
+    token = _usage.set(acc)
+    try:
+        yield acc
+    finally:
+        _usage.reset(token)
+
+def _account(resp: Any, model: str, labels: Dict[str, str], sp: Any) -> None:
+    usage = getattr(resp, "usage", None)
+    prompt = (getattr(usage, "prompt_tokens", 0) or 0) if usage is not None else 0
+    completion = (getattr(usage, "completion_tokens", 0) or 0) if usage is not None else 0
+    tracing.set_attributes(sp, prompt_tokens=prompt, completion_tokens=completion)
+    if prompt:
+        metrics.LLM_TOKENS.inc(prompt, model=model, kind="prompt", **labels)
+    if completion:
+        metrics.LLM_TOKENS.inc(completion, model=model, kind="completion", **labels)
+    acc = _usage.get()
+    if acc is None:
+        return
+    acc["calls"] += 1
+    if usage is not None:
+        acc["prompt_tokens"] += prompt
+        acc["completion_tokens"] += completion
+        acc["total_tokens"] += getattr(usage, "total_tokens", None) or prompt + completion
+
+async def chat_completion(client: AsyncOpenAI, on_token: Optional[Callable[[str], Awaitable[None]]] = None, **kwargs: Any):
+    """Rate-limited chat completion; streams deltas to on_token when given. Returns the SDK response (or its stream-shaped stand-in)."""
+    labels, model = metrics.current_labels(), str(kwargs.get("model") or "")
+    with tracing.span("llm.chat_completion", model=model, stream=on_token is not None, max_tokens=kwargs.get("max_tokens")) as sp:
+        async with llm_limiter.slot(estimate_tokens(kwargs.get("messages"), kwargs.get("max_tokens"))) as slot:
+            metrics.LLM_QUEUE_SECONDS.observe(slot.queue_wait_s, **labels)
+            t0, outcome = time.perf_counter(), "error"
+            try:
+                if on_token is not None:
+                    resp = await stream_chat_completion(client, on_token, **kwargs)
+                else:
+                    resp = await client.chat.completions.create(**kwargs)
+                outcome = "ok"
+            except RateLimitError:
+                outcome = "rate_limited"
+                raise
+            finally:
+                metrics.LLM_SECONDS.observe(time.perf_counter() - t0, model=model, outcome=outcome, **labels)
+                tracing.set_attributes(sp, outcome=outcome, queue_wait_ms=round(slot.queue_wait_s * 1000, 2))
+            slot.record(resp)
+            _account(resp, model, labels, sp)
+        if slot.queue_wait_s > 1.0:
+            _logger.info("[LLMClient] queued %.2fs before call (limit=%.1f)", slot.queue_wait_s, llm_limiter.concurrency.limit)
+        return resp
+
+async def close_llm_client() -> None:
+    global _client
+    if _client is not None:
+        await _client.close()
+        _client = None
+        _logger.info("[LLMClient] closed")
@@ -3,9 +3,12 @@
 
 from typing import Dict, Any, List, Optional
 from uuid import uuid4
+import asyncio
 from app.config.app_config import AppConfigSingleton
 from app.utils.app_logging import get_logger
 from app.utils.circuit_breaker import CircuitBreaker, with_retries_async
+from app.utils import memory, metrics
+from app.utils.snippets import extract_snippet, project_metadata
 
 _cfg = AppConfigSingleton.instance()
 _logger = get_logger(_cfg)
@@ -21,7 +24,7 @@ class _EmbeddingService:
 
 class VectorBackend:
     # CRUD
-    def upsert_items(self, texts: List[str], metadatas: List[Dict[str, Any]], ids: List[str]) -> None: raise NotImplementedError
+    def upsert_items(self, texts: List[str], metadatas: List[Dict[str, Any]], ids: List[str], embeddings: Optional[List[List[float]]] = None) -> None: raise NotImplementedError
     def get_ids_by_parent(self, parent_id: str) -> List[str]: raise NotImplementedError
     def delete_by_parent(self, parent_id: str) -> int: raise NotImplementedError
     def delete(self, doc_id: str) -> int: raise NotImplementedError
@@ -29,8 +32,15 @@ class VectorBackend:
     def save_metadata(self, doc_id: str, patch: Dict[str, Any]) -> Dict[str, Any]: raise NotImplementedError
     def count(self) -> int: raise NotImplementedError
     # Search
-    def query_by_text(self, query_text: str, n_results: int, where: Optional[Dict[str, Any]]): raise NotImplementedError
-    def query_by_vector(self, query_vector: List[float], n_results: int, where: Optional[Dict[str, Any]]): raise NotImplementedError
+    def query_by_text(self, query_text: str, n_results: int, where: Optional[Dict[str, Any]], include: Optional[List[str]] = None): raise NotImplementedError
+    def query_by_vector(self, query_vector: List[float], n_results: int, where: Optional[Dict[str, Any]], include: Optional[List[str]] = None): raise NotImplementedError
+
+_DEFAULT_INCLUDE = ["metadatas", "documents", "distances"]
+
+def chroma_include(include: Optional[List[str]]) -> List[str]:
+    # Projection: fetch only what the caller needs; distances are always kept since scores derive from them
+    if not include: return list(_DEFAULT_INCLUDE)
+    return list(dict.fromkeys([*include, "distances"]))
 
 class _ChromaBackend(VectorBackend):
     def __init__(self, collection_name: str = "documents_collection"):
@@ -45,14 +55,17 @@ class _ChromaBackend(VectorBackend):
 
     def _normalize_where(self, filt: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
         if not filt: return None
-        if any(isinstance(v, dict) and any(k.startswith("$") for k in v.keys()) for v in filt.values()):
+        # already a logical expression ($and/$or); trust caller
+        if any(k.startswith("$") for k in filt.keys()):
             return filt
-        items = [{k: {"$eq": v}} for k, v in filt.items()]
+        # per-key: keep operator dicts (e.g. parent_id: {"$in": [...]}) and wrap plain values in $eq
+        items = [{k: v} if isinstance(v, dict) and any(op.startswith("$") for op in v.keys()) else {k: {"$eq": v}}
+                 for k, v in filt.items()]
         return items[0] if len(items) == 1 else {"$and": items}
 
     # CRUD
-    def upsert_items(self, texts: List[str], metadatas: List[Dict[str, Any]], ids: List[str]) -> None:
-        self.collection.upsert(documents=texts, metadatas=metadatas, ids=ids)
+    def upsert_items(self, texts: List[str], metadatas: List[Dict[str, Any]], ids: List[str], embeddings: Optional[List[List[float]]] = None) -> None:
+        self.collection.upsert(documents=texts, metadatas=metadatas, ids=ids, embeddings=embeddings)
     def get_ids_by_parent(self, parent_id: str) -> List[str]:
         res = self.collection.get(where={"parent_id": {"$eq": parent_id}})
         ids = res.get("ids", [])
@@ -75,10 +88,10 @@ class _ChromaBackend(VectorBackend):
         return int(self.collection.count())
 
     # Search
-    def query_by_text(self, query_text: str, n_results: int, where: Optional[Dict[str, Any]]) -> Dict[str, Any]:
-        return self.collection.query(query_texts=[query_text], n_results=n_results, where=self._normalize_where(where))
-    def query_by_vector(self, query_vector: List[float], n_results: int, where: Optional[Dict[str, Any]]) -> Dict[str, Any]:
-        return self.collection.query(query_embeddings=[query_vector], n_results=n_results, where=self._normalize_where(where))
+    def query_by_text(self, query_text: str, n_results: int, where: Optional[Dict[str, Any]], include: Optional[List[str]] = None) -> Dict[str, Any]:
+        return self.collection.query(query_texts=[query_text], n_results=n_results, where=self._normalize_where(where), include=chroma_include(include))
+    def query_by_vector(self, query_vector: List[float], n_results: int, where: Optional[Dict[str, Any]], include: Optional[List[str]] = None) -> Dict[str, Any]:
+        return self.collection.query(query_embeddings=[query_vector], n_results=n_results, where=self._normalize_where(where), include=chroma_include(include))
 
 class _PGVectorBackend(VectorBackend):
     def __init__(self): pass
@@ -86,7 +99,37 @@ class _PGVectorBackend(VectorBackend):
 class _OpenSearchBackend(VectorBackend):
     def __init__(self): pass
 
-_vector_breaker = CircuitBreaker(failure_threshold=3, recovery_time_sec=20.0)
+_vector_breaker = CircuitBreaker(failure_threshold=3, recovery_time_sec=20.0, name="vector")
+
+def distance_to_score(distance: Optional[float]) -> Optional[float]:
+    # collections use hnsw:space=cosine, so distance is in [0, 2]; map to a similarity in [0, 1] (1 = identical)
+    if distance is None: return None
+    return round(max(0.0, min(1.0, 1.0 - float(distance) / 2.0)), 4)
+
+def _shape_results(res: Dict[str, Any], min_score: Optional[float] = None, query: Optional[str] = None,
+                   snippet_chars: Optional[int] = None, fields: Optional[List[str]] = None) -> Dict[str, Any]:
+    ids = res.get("ids") or [[]]
+    ids0 = ids[0] if ids and isinstance(ids[0], list) else ids
+    docs = res.get("documents"); metas = res.get("metadatas"); dists = res.get("distances")
+    embs = res.get("embeddings")
+    embs0 = embs[0] if embs is not None and len(embs) else None   # only when include asked for them (ndarray rows)
+    docs0 = (docs[0] if docs else None) or [None] * len(ids0)
+    metas0 = (metas[0] if metas else None) or [None] * len(ids0)
+    dists0 = (dists[0] if dists else None) or [None] * len(ids0)
+    scores0 = [distance_to_score(d) for d in dists0]
+    if min_score is not None:
+        keep = [i for i, sc in enumerate(scores0) if sc is None or sc >= min_score]
+        ids0 = [ids0[i] for i in keep]; docs0 = [docs0[i] for i in keep]; metas0 = [metas0[i] for i in keep]
+        dists0 = [dists0[i] for i in keep]; scores0 = [scores0[i] for i in keep]
+        if embs0 is not None: embs0 = [embs0[i] for i in keep]
+    if snippet_chars:
+        docs0 = [extract_snippet(d, query, snippet_chars) if d is not None else None for d in docs0]
+    if fields:
+        metas0 = [project_metadata(m, fields) for m in metas0]
+    out = {"ids": [ids0], "documents": [docs0], "metadatas": [metas0], "distances": [dists0], "scores": [scores0]}
+    if embs0 is not None:
+        out["embeddings"] = [embs0]
+    return out
 
 def _is_retryable_vector(err: Exception) -> bool:
     msg = str(err).lower()
@@ -108,16 +151,22 @@ class VectorDBClient:
         else:
             raise ValueError(f"Unsupported vector backend: {backend}")
         self._backend_name = b
+        self._collection_name = collection_name
         self._embed = _EmbeddingService()
         self._cache: Dict[str, List[float]] = {}
+        memory.track("vector_db_client.query_embeddings", self)
         _logger.info("[VectorDBClient] backend=%s ready", self._backend_name)
 
     # Utilities
     def health(self) -> Dict[str, Any]: return {"status": "ok", "backend": self._backend_name}
     def next_id(self) -> str: return str(uuid4())
+    def memory_info(self) -> Dict[str, Any]:
+        # query -> embedding cache; unbounded, one per client
+        return {"collection": self._collection_name, "entries": len(self._cache), "bytes": memory.approx_size(self._cache)}
 
     # CRUD (sync-safe for indexers/routers calling from request thread)
-    def upsert_items(self, texts: List[str], metadatas: List[Dict[str, Any]], ids: List[str]) -> None: self._backend.upsert_items(texts, metadatas, ids)
+    def upsert_items(self, texts: List[str], metadatas: List[Dict[str, Any]], ids: List[str], embeddings: Optional[List[List[float]]] = None) -> None:
+        self._backend.upsert_items(texts, metadatas, ids, embeddings)
     def get_ids_by_parent(self, parent_id: str) -> List[str]: return self._backend.get_ids_by_parent(parent_id)
     def delete_by_parent(self, parent_id: str) -> int: return self._backend.delete_by_parent(parent_id)
     def delete(self, doc_id: str) -> int: return self._backend.delete(doc_id)
@@ -128,27 +177,39 @@ class VectorDBClient:
     # Embeddings
     def get_query_embedding(self, query: str) -> List[float]:
         if query in self._cache: return self._cache[query]
-        vec = self._embed.embed_one(query); self._cache[query] = vec; return vec
-
-    # Async search; callers must await
-    async def search_async(self, query: str, top_k: int = 5, where: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
-        vec = self.get_query_embedding(query)
+        with metrics.EMBED_SECONDS.time(kind="query"):
+            vec = self._embed.embed_one(query)
+        self._cache[query] = vec; return vec
+    def embed_many(self, texts: List[str]) -> List[List[float]]:
+        # Same embedding function as the collection, so precomputed vectors can be upserted directly
+        with metrics.EMBED_SECONDS.time(kind="batch"):
+            return self._embed.embed_many(texts)
+
+    # Async search; callers must await. Results carry Chroma distances plus normalized similarity "scores";
+    # hits scoring below min_score are dropped.
+    # Projection: include=[...] limits what Chroma returns, snippet_chars replaces each document with a
+    # query-centred snippet, fields=[...] keeps only those metadata keys (plus parent_id).
+    async def search_async(self, query: str, top_k: int = 5, where: Optional[Dict[str, Any]] = None, min_score: Optional[float] = None,
+                           include: Optional[List[str]] = None, snippet_chars: Optional[int] = None,
+                           fields: Optional[List[str]] = None) -> Dict[str, Any]:
+        # embedding (ONNX) and the Chroma query are blocking; keep them off the event loop
+        vec = await asyncio.to_thread(self.get_query_embedding, query)
         async def _op():
-            return self._backend.query_by_vector(query_vector=vec, n_results=top_k, where=where)
-        res = await with_retries_async(_op, _is_retryable_vector, _vector_breaker, max_attempts=3, base_backoff=0.5)
-        ids = res.get("ids"); docs = res.get("documents"); metas = res.get("metadatas")
-        if ids is None or docs is None or metas is None:
-            ids = [res.get("ids", [])]; docs = [res.get("documents", [])]; metas = [res.get("metadatas", [])]
-        return {"ids": ids, "documents": docs, "metadatas": metas}
+            return await asyncio.to_thread(self._backend.query_by_vector, query_vector=vec, n_results=top_k, where=where, include=include)
+        with metrics.VECTOR_QUERY_SECONDS.time(collection=self._collection_name, outcome="error") as lab:
+            res = await with_retries_async(_op, _is_retryable_vector, _vector_breaker, max_attempts=3, base_backoff=0.5)
+            lab["outcome"] = "ok"
+        return _shape_results(res, min_score, query, snippet_chars, fields)
 
     # Provide a familiar name; still async; always await this in async contexts
-    async def search(self, query: str, top_k: int = 5, where: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
-        return await self.search_async(query, top_k, where)
+    async def search(self, query: str, top_k: int = 5, where: Optional[Dict[str, Any]] = None, min_score: Optional[float] = None,
+                     include: Optional[List[str]] = None, snippet_chars: Optional[int] = None,
+                     fields: Optional[List[str]] = None) -> Dict[str, Any]:
+        return await self.search_async(query, top_k, where, min_score, include, snippet_chars, fields)
 
     # Optional: text path (sync-friendly), used in scripts/tests
-    def search_text(self, query_text: str, top_k: int = 5, where: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
-        res = self._backend.query_by_text(query_text=query_text, n_results=top_k, where=where)
-        ids = res.get("ids"); docs = res.get("documents"); metas = res.get("metadatas")
-        if ids is None or docs is None or metas is None:
-            ids = [res.get("ids", [])]; docs = [res.get("documents", [])]; metas = [res.get("metadatas", [])]
-        return {"ids": ids, "documents": docs, "metadatas": metas}
+    def search_text(self, query_text: str, top_k: int = 5, where: Optional[Dict[str, Any]] = None, min_score: Optional[float] = None,
+                    include: Optional[List[str]] = None, snippet_chars: Optional[int] = None,
+                    fields: Optional[List[str]] = None) -> Dict[str, Any]:
+        res = self._backend.query_by_text(query_text=query_text, n_results=top_k, where=where, include=include)
+        return _shape_results(res, min_score, query_text, snippet_chars, fields)
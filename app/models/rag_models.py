@@ -15,6 +15,8 @@ class RetrieveResponseHit(BaseModel):
 class RetrieveResponse(BaseModel):
     query: str
     hits: List[RetrieveResponseHit] = Field(default_factory=list)
+    retrieval_lapse_time: Optional[float] = None
+    file_error_info: Optional[Dict[str, Any]] = None
 
 class RetrievedChunk(BaseModel):
     id: str
@@ -26,11 +28,17 @@ class RetrievedChunk(BaseModel):
 # ---------- Simple QA (legacy-safe) ----------
 class QARequest(BaseModel):
     question: str
+    n_results: int = 8
+    top_k_ctx: int = 4
 
 class QAResponse(BaseModel):
     question: str
     answer: str
     citations: List[str] = Field(default_factory=list)
+    retrieval_lapse_time: Optional[float] = None
+    llm_lapse_time: Optional[float] = None
+    file_llm_status: Optional[str] = None             # success | failed
+    file_error_info: Optional[Dict[str, Any]] = None
 
 # ---------- Agent request ----------
 class RAGQueryRequest(BaseModel):
@@ -42,6 +50,7 @@ class RAGQueryRequest(BaseModel):
     scoring_model: str = "heuristic_v1"
     self_reflection_iterations: int = 3
     execution_mode: str = "async"  # "async" | "sequential"
+    min_score: Optional[float] = None  # drop retrieval hits below this normalized similarity
 
 # ---------- Shared ----------
 class TokenUsage(BaseModel):
@@ -62,6 +71,7 @@ class IterationRetrieval(BaseModel):
     tool_name: Optional[str] = None           # "retrieval.vector_search", etc.
     source_name: Optional[str] = None         # "chroma", "snowflake", etc.
     tool_latency_ms: Optional[int] = None
+    top_score: Optional[float] = None            # best normalized similarity (0..1) among hits
 
 class IterationRecord(BaseModel):
     iteration: int
@@ -8,11 +8,11 @@ import chromadb
 import logging as pylogging
 pylogging.getLogger("chromadb").setLevel(pylogging.CRITICAL)
 
-# OpenAI SDK
+# OpenAI SDK (shared AsyncOpenAI client)
 try:
-    from openai import OpenAI
+    from app.config.llm_client import get_llm_client, llm_timeout, llm_limiter
 except Exception:
-    OpenAI = None
+    get_llm_client = None
 
 # router = APIRouter(tags=["clients"])
 # cfg = AppConfig()
@@ -28,13 +28,15 @@ async def health():
 
 @router.post("/openai/heartbeat", summary="Connectivity check using config (no payload)")
 async def test_openai_client():
-    if OpenAI is None:
+    if get_llm_client is None:
         logger.error("Failed to connect to OpenAI: SDK import not available")
         raise HTTPException(status_code=500, detail="OpenAI SDK not available")
     logger.info("Trying to connect with OpenAI")
     try:
-        client = OpenAI(api_key=cfg.openai_api_key, base_url=cfg.openai_base_url)
-        models = client.models.list()
+        client = get_llm_client()
+        if client is None:
+            raise RuntimeError("OPENAI_API_KEY not configured")
+        models = await client.models.list(timeout=llm_timeout(10.0))
         model_ids: List[str] = [m.id for m in getattr(models, "data", [])][:10]
         logger.info("Successfully connected to OpenAI")
         return {
@@ -46,6 +48,19 @@ async def test_openai_client():
         logger.exception("Failed to connect to OpenAI")
         raise HTTPException(status_code=502, detail=f"OpenAI connectivity failed")
 
+@router.get("/openai/limiter", summary="Global LLM limiter state: concurrency cap, buckets, queue wait")
+async def openai_limiter_stats():
+    if get_llm_client is None:
+        raise HTTPException(status_code=500, detail="OpenAI SDK not available")
+    return llm_limiter.stats()
+
+@router.get("/openai/fake", summary="In-process OpenAI stand-in: settings and injected latency/errors (LLM_BACKEND=fake)")
+async def fake_openai_stats():
+    if cfg.llm_backend != "fake":
+        raise HTTPException(status_code=404, detail="LLM_BACKEND is not 'fake'")
+    from app.config.fake_openai import get_fake_openai
+    return get_fake_openai().info()
+
 @router.get("/chroma/heartbeat", summary="Chroma heartbeat using configured persistence path")
 async def chroma_heartbeat():
     logger.info("Trying to connect with Chroma DB")
@@ -0,0 +1,117 @@
+# app/router/debug_router.py
+# Diagnostics for a running worker. /debug/trace renders the span tree of a sampled run (app/utils/tracing.py);
+# /debug/profile samples the worker's stacks (app/utils/profiler.py); /debug/memory breaks down where memory goes
+# (app/utils/memory.py).
+
+import asyncio
+import tracemalloc
+from typing import Optional
+from fastapi import APIRouter, Header, HTTPException, Query
+from fastapi.responses import PlainTextResponse
+from app.config.app_config import AppConfigSingleton
+from app.utils import memory, tracing
+from app.utils.profiler import profiles
+
+debug_router = APIRouter(prefix="/debug", tags=["debug"])
+cfg = AppConfigSingleton.instance()
+
+def _profiling_guard(token: Optional[str]) -> None:
+    # traces carry question text and profiles the code's hot paths, so both sit behind the profiling token
+    if not cfg.profiling_enabled:
+        raise HTTPException(status_code=404, detail="profiling disabled (PROFILING_ENABLED=false)")
+    if not profiles.allowed(token):
+        raise HTTPException(status_code=403, detail="profiling token required (X-Profile header or ?token=)")
+
+@debug_router.get("/trace", summary="Recently sampled traces (newest first)")
+async def list_traces(limit: int = Query(50, ge=1, le=1000), token: Optional[str] = None,
+                      x_profile: Optional[str] = Header(None)):
+    _profiling_guard(token or x_profile)
+    return {"sample_rate": cfg.trace_sample_rate, "exporter": cfg.trace_exporter, "traces": tracing.recent_traces()[:limit]}
+
+@debug_router.get("/trace/{run_id}", summary="Critical path and span tree of a sampled run (run_id or trace id)")
+async def get_trace(run_id: str, format: str = Query("json", pattern="^(json|text)$"), tree: bool = True,
+                    token: Optional[str] = None, x_profile: Optional[str] = Header(None)):
+    _profiling_guard(token or x_profile)
+    if not cfg.tracing_enabled:
+        raise HTTPException(status_code=404, detail="tracing disabled (TRACING_ENABLED=false)")
+    # falls back to scanning the JSONL file (and its rotated copy), which is blocking file I/O
+    spans = await asyncio.to_thread(tracing.find_trace, run_id)
+    if not spans:
+        raise HTTPException(status_code=404, detail=f"no trace for {run_id} (not sampled at TRACE_SAMPLE_RATE={cfg.trace_sample_rate}, "
+                                                    f"or no longer retained)")
+    report = tracing.critical_path(spans)
+    if format == "text":
+        return PlainTextResponse(tracing.render_text(report))
+    if not tree:
+        report.pop("tree", None)
+    return report
+
+def _profile_response(report: dict, format: str, top: int):
+    if format == "collapsed":
+        return PlainTextResponse(report["collapsed"] + "\n")
+    out = {k: v for k, v in report.items() if k != "collapsed"}
+    out["top_self"], out["top_total"] = out["top_self"][:top], out["top_total"][:top]
+    return out
+
+@debug_router.get("/profile", summary="Sample every thread of this worker for N seconds")
+async def profile_worker(seconds: float = Query(10.0, gt=0), format: str = Query("top", pattern="^(top|collapsed)$"),
+                         top: int = Query(30, ge=1, le=500), token: Optional[str] = None,
+                         x_profile: Optional[str] = Header(None)):
+    _profiling_guard(token or x_profile)
+    seconds = min(seconds, cfg.profiling_max_seconds)
+    sampler = profiles.begin()
+    if sampler is None:
+        raise HTTPException(status_code=409, detail="another profile is running")
+    try:
+        await asyncio.sleep(seconds)
+    finally:
+        report = profiles.end(sampler, target=f"worker {seconds:g}s")
+    return _profile_response(report, format, top)
+
+@debug_router.get("/profiles", summary="Recent profiles (per-request and worker)")
+async def list_profiles(token: Optional[str] = None, x_profile: Optional[str] = Header(None)):
+    _profiling_guard(token or x_profile)
+    return {"profiles": profiles.list()}
+
+@debug_router.get("/profile/{profile_id}", summary="Stored profile: top-N functions, or folded stacks for a flame graph")
+async def get_profile(profile_id: str, format: str = Query("top", pattern="^(top|collapsed)$"),
+                      top: int = Query(30, ge=1, le=500), token: Optional[str] = None,
+                      x_profile: Optional[str] = Header(None)):
+    _profiling_guard(token or x_profile)
+    report = profiles.get(profile_id)
+    if report is None:
+        raise HTTPException(status_code=404, detail=f"no profile {profile_id}")
+    return _profile_response(report, format, top)
+
+_tracemalloc_window = asyncio.Lock()
+
+@debug_router.get("/memory", summary="Process RSS, per-cache sizes, loaded vector indexes / embedding sessions, top allocators")
+async def memory_report(vector_store: bool = True, allocations: int = Query(0, ge=0, le=200),
+                        trace_seconds: float = Query(0.0, ge=0), frames: int = Query(1, ge=1, le=25),
+                        token: Optional[str] = None, x_profile: Optional[str] = Header(None)):
+    comps = memory.components()
+    report = {"process": memory.process_memory(),
+              "components_bytes": sum(c.get("bytes") or 0 for c in comps.values()),
+              "components": dict(sorted(comps.items(), key=lambda kv: -(kv[1].get("bytes") or 0)))}
+    if vector_store:
+        # gc heap scan plus a sqlite count per collection
+        report["vector_store"] = await asyncio.to_thread(memory.vector_store)
+    if allocations:
+        if tracemalloc.is_tracing():
+            # already on (PYTHONTRACEMALLOC or a window in progress): everything live since it started
+            report["tracemalloc"] = memory.top_allocations(tracemalloc.take_snapshot(), allocations)
+        elif trace_seconds:
+            # tracing slows every allocation, so it only runs for a bounded window and only for profiling callers
+            _profiling_guard(token or x_profile)
+            seconds = min(trace_seconds, cfg.profiling_max_seconds)
+            async with _tracemalloc_window:
+                tracemalloc.start(frames)
+                try:
+                    await asyncio.sleep(seconds)
+                    snap = tracemalloc.take_snapshot()
+                finally:
+                    tracemalloc.stop()
+            report["tracemalloc"] = {"window_s": seconds, **memory.top_allocations(snap, allocations, "traceback" if frames > 1 else "lineno")}
+        else:
+            report["tracemalloc"] = {"error": "tracemalloc is off; pass trace_seconds=N to record allocations made (and still live) over N seconds"}
+    return report
@@ -20,7 +20,8 @@ Path(cfg.documents_dir).mkdir(parents=True, exist_ok=True)
 
 # Initialize vector DB client and indexer
 vdb = VectorDBClient(backend="chroma")
-indexer = ChunkedIndexerService(vdb)
+parent_vdb = VectorDBClient(backend="chroma", collection_name=cfg.parent_collection_name)
+indexer = ChunkedIndexerService(vdb, parent_vdb)
 
 indexing_router = APIRouter(prefix="/doc-indexing", tags=["doc-indexing"])
 
@@ -45,16 +46,15 @@ def _collection_count() -> int:
 
 def _get_ids_by_parent(parent_id: str) -> List[str]:
     try:
-        res = vdb.get(where={"parent_id": parent_id})
-        ids = res.get("ids", [[]])
-        return ids[0] if ids and isinstance(ids[0], list) else (ids or [])
+        return vdb.get_ids_by_parent(parent_id)
     except Exception as e:
         logger.error("[Indexing] get_ids_by_parent failed: %s", e)
         return []
 
 def _delete_by_parent(parent_id: str) -> int:
     try:
-        return vdb.delete(where={"parent_id": parent_id})
+        # purge chunks and the parent summary vectors together
+        return indexer.purge_parent(parent_id)
     except Exception as e:
         logger.error("[Indexing] delete_by_parent failed: %s", e)
         return 0
@@ -0,0 +1,68 @@
+import os
+from pathlib import PurePosixPath, PureWindowsPath
+from fastapi import APIRouter, HTTPException, Path as FPath
+from typing import Optional, Tuple
+from pydantic import BaseModel
+from app.utils.app_logging import get_logger
+from app.config.app_config import AppConfigSingleton
+from app.service.eval.batch_runner import BatchRun, batch_jobs
+
+cfg = AppConfigSingleton.instance()
+logger = get_logger(cfg)
+eval_router = APIRouter(prefix="/eval", tags=["eval"])
+
+class BatchEvalRequest(BaseModel):
+    agent: str
+    input_path: str
+    output_path: Optional[str] = None
+    concurrency: Optional[int] = None
+    resume: bool = True
+    limit: Optional[int] = None
+    format: str = "jsonl"
+
+def _confined_path(name: str, root: str, suffixes: Tuple[str, ...], what: str) -> str:
+    # request paths are relative to a fixed root: no drive/anchor, no "..", and no symlink out of it
+    if not name or PureWindowsPath(name).anchor or PurePosixPath(name).is_absolute() or ".." in PureWindowsPath(name).parts:
+        raise HTTPException(status_code=400, detail=f"{what} must be a relative path under {os.path.basename(root)}/")
+    if not name.lower().endswith(suffixes):
+        raise HTTPException(status_code=400, detail=f"{what} must end with {' or '.join(suffixes)}")
+    base = os.path.realpath(root)
+    full = os.path.realpath(os.path.join(base, name))
+    if os.path.commonpath([full, base]) != base:
+        raise HTTPException(status_code=400, detail=f"{what} must stay under {os.path.basename(root)}/")
+    return full
+
+@eval_router.post("/batch", status_code=202)
+async def start_batch(req: BatchEvalRequest):
+    # runs in the background; poll GET /eval/batch/{run_id}
+    # input_path is relative to data/ (e.g. documents/questions.jsonl), output_path to eval_output_dir
+    input_path = _confined_path(req.input_path, cfg.data_dir, (".jsonl",), "input_path")
+    output_path = _confined_path(req.output_path, cfg.eval_output_dir, (".jsonl", ".parquet"), "output_path") \
+        if req.output_path else None
+    try:
+        run = BatchRun(req.agent, input_path, output_path, concurrency=req.concurrency, resume=req.resume,
+                       limit=req.limit, output_format=req.format)
+    except FileNotFoundError:
+        raise HTTPException(status_code=404, detail=f"input not found: {req.input_path}")
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    logger.info("[Eval] batch start run_id=%s agent=%s input=%s", run.run_id, req.agent, req.input_path)
+    return batch_jobs.start(run).summary()
+
+@eval_router.get("/batch")
+async def list_batches():
+    return {"runs": batch_jobs.list()}
+
+@eval_router.get("/batch/{run_id}")
+async def batch_status(run_id: str = FPath(...)):
+    run = batch_jobs.get(run_id)
+    if run is None:
+        raise HTTPException(status_code=404, detail="run not found")
+    return run.summary()
+
+@eval_router.delete("/batch/{run_id}")
+async def cancel_batch(run_id: str = FPath(...)):
+    # finished questions stay in the checkpoint; start again with resume=true to continue
+    if batch_jobs.get(run_id) is None:
+        raise HTTPException(status_code=404, detail="run not found")
+    return {"run_id": run_id, "cancelled": batch_jobs.cancel(run_id)}
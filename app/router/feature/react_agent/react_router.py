@@ -67,7 +67,7 @@ def _fallback(payload: dict, diagram: Optional[str], endpoint: str, title: str)
 async def react_ask(req: AskRequest, include_diagram: Optional[bool] = Query(False)):
     logger.info("[V2] /react/ask q='%s'", req.question)
     try:
-        out = react_agent.run(req.question)
+        out = await react_agent.run(req.question)
         if not out:
             return _fallback(req.model_dump(), _react_agent_mermaid() if include_diagram else None, "/rag/react-agent/react/ask", "ReAct Agent Flow")
         if include_diagram:
@@ -88,7 +88,7 @@ async def react_ask(req: AskRequest, include_diagram: Optional[bool] = Query(Fal
 async def functions_ask(req: AskRequest, include_diagram: Optional[bool] = Query(False)):
     logger.info("[V2] /functions/ask q='%s'", req.question)
     try:
-        out = func_agent.run(req.question)
+        out = await func_agent.run(req.question)
         if not out:
             return _fallback(req.model_dump(), _functions_calling_mermaid() if include_diagram else None, "/rag/react-agent/functions_calling/ask", "Function-Calling Flow")
         if include_diagram:
@@ -1,37 +1,51 @@
-from fastapi import APIRouter
-from fastapi.responses import JSONResponse
+from fastapi import APIRouter, Query, Request
+from fastapi.responses import JSONResponse, StreamingResponse
 from app.service.feature.react_single_agent.functions_service import ReactFunctionCallingAgent
 from app.service.feature.react_single_agent.base.react_base import AgentError
+from app.utils.event_stream import EventStream
+from app.utils.deadline import Deadline
 
 router = APIRouter()
 agent = ReactFunctionCallingAgent()
 
+def _run_kwargs(payload: dict, headers=None) -> dict:
+    return dict(
+        question=payload["question"],
+        scoring_model=payload.get("scoring_model","heuristic_v1"),
+        emit_traces=payload.get("emit_traces", True),
+        enable_query_variants=payload.get("enable_query_variants", True),
+        enable_output_scoring=payload.get("enable_output_scoring", True),
+        max_variants=payload.get("max_variants", 3),
+        self_reflection_iterations=payload.get("self_reflection_iterations", 3),
+        agent_graph_id=payload.get("agent_graph_id","react-single-agent-functions"),
+        agent_descriptor={
+            "agent_id":"react-single-agent-functions",
+            "agent_name":"Financial Filings Analyst (FC)",
+            "agent_role":"researcher",
+            "agent_goal":"Retrieve and verify filing facts."
+        },
+        execution_mode="async",
+        preferred_year=payload.get("preferred_year"),
+        top_k=payload.get("top_k"),
+        retrieval_filters=payload.get("retrieval_filters"),
+        min_score=payload.get("min_score"),
+        # payload deadline_ms wins over the X-Request-Deadline-Ms header; neither -> AppConfig.agent_deadline_ms
+        deadline_ms=Deadline.from_request(payload, headers)
+    )
+
 @router.post("/rag/react-single-agent/function-calling/ask")
-async def react_function_calling(payload: dict):
+async def react_function_calling(payload: dict, request: Request):
     try:
-        return await agent.run(
-            question=payload["question"],
-            scoring_model=payload.get("scoring_model","heuristic_v1"),
-            emit_traces=payload.get("emit_traces", True),
-            enable_query_variants=payload.get("enable_query_variants", True),
-            enable_output_scoring=payload.get("enable_output_scoring", True),
-            max_variants=payload.get("max_variants", 3),
-            self_reflection_iterations=payload.get("self_reflection_iterations", 3),
-            agent_graph_id=payload.get("agent_graph_id","react-single-agent-functions"),
-            agent_descriptor={
-                "agent_id":"react-single-agent-functions",
-                "agent_name":"Financial Filings Analyst (FC)",
-                "agent_role":"researcher",
-                "agent_goal":"Retrieve and verify filing facts."
-            },
-            execution_mode="async",
-            preferred_year=payload.get("preferred_year"),
-            top_k=payload.get("top_k"),
-            retrieval_filters=payload.get("retrieval_filters")
-        )
+        return await agent.run_coalesced(**_run_kwargs(payload, request.headers))
     except AgentError as e:
         return JSONResponse(status_code=e.http_status, content={
             "error_code": e.code,
             "message": e.message,
             "details": e.details
         })
+
+@router.post("/rag/react-single-agent/function-calling/ask/stream")
+async def react_function_calling_stream(payload: dict, request: Request, format: str = Query("ndjson", pattern="^(ndjson|sse)$")):
+    # hits, LLM tokens and loop/variant traces as they happen; final "result" event carries the full response
+    events = EventStream(format)
+    return StreamingResponse(events.iter_encoded(agent.run(**_run_kwargs(payload, request.headers), events=events)), media_type=events.media_type)
@@ -1,38 +1,57 @@
 # app/router/feature/react_single_agent/react_tool_router.py
-from fastapi import APIRouter
-from fastapi.responses import JSONResponse
+from fastapi import APIRouter, Query, Request
+from fastapi.responses import JSONResponse, StreamingResponse
 from app.service.feature.react_single_agent.react_service import ReactToolCallingAgent
-from app.service.feature.react_single_agent.base.react_base import AgentError
+from app.service.feature.react_single_agent.base.react_base import AgentError, agent_flights
+from app.utils.event_stream import EventStream
+from app.utils.deadline import Deadline
 
 router = APIRouter()
 agent = ReactToolCallingAgent()
 
+def _run_kwargs(payload: dict, headers=None) -> dict:
+    return dict(
+        question=payload["question"],
+        scoring_model=payload.get("scoring_model","heuristic_v1"),
+        emit_traces=payload.get("emit_traces", True),
+        enable_query_variants=payload.get("enable_query_variants", True),
+        enable_output_scoring=payload.get("enable_output_scoring", True),
+        max_variants=payload.get("max_variants", 3),
+        self_reflection_iterations=payload.get("self_reflection_iterations", 3),
+        agent_graph_id=payload.get("agent_graph_id","react-single-agent"),
+        agent_descriptor={
+            "agent_id":"react-single-agent",
+            "agent_name":"Financial Filings Analyst",
+            "agent_role":"researcher",
+            "agent_goal":"Retrieve and verify filing facts."
+        },
+        execution_mode="async",
+        preferred_year=payload.get("preferred_year"),
+        top_k=payload.get("top_k"),
+        retrieval_filters=payload.get("retrieval_filters"),
+        min_score=payload.get("min_score"),
+        # payload deadline_ms wins over the X-Request-Deadline-Ms header; neither -> AppConfig.agent_deadline_ms
+        deadline_ms=Deadline.from_request(payload, headers)
+    )
+
 @router.post("/rag/react-single-agent/tool-calling/ask")
-async def react_tool_calling(payload: dict):
+async def react_tool_calling(payload: dict, request: Request):
     try:
-        return await agent.run(
-            question=payload["question"],
-            scoring_model=payload.get("scoring_model","heuristic_v1"),
-            emit_traces=payload.get("emit_traces", True),
-            enable_query_variants=payload.get("enable_query_variants", True),
-            enable_output_scoring=payload.get("enable_output_scoring", True),
-            max_variants=payload.get("max_variants", 3),
-            self_reflection_iterations=payload.get("self_reflection_iterations", 3),
-            agent_graph_id=payload.get("agent_graph_id","react-single-agent"),
-            agent_descriptor={
-                "agent_id":"react-single-agent",
-                "agent_name":"Financial Filings Analyst",
-                "agent_role":"researcher",
-                "agent_goal":"Retrieve and verify filing facts."
-            },
-            execution_mode="async",
-            preferred_year=payload.get("preferred_year"),
-            top_k=payload.get("top_k"),
-            retrieval_filters=payload.get("retrieval_filters")
-        )
+        return await agent.run_coalesced(**_run_kwargs(payload, request.headers))
     except AgentError as e:
         return JSONResponse(status_code=e.http_status, content={
             "error_code": e.code,
             "message": e.message,
             "details": e.details
         })
+
+@router.post("/rag/react-single-agent/tool-calling/ask/stream")
+async def react_tool_calling_stream(payload: dict, request: Request, format: str = Query("ndjson", pattern="^(ndjson|sse)$")):
+    # hits, LLM tokens and loop/variant traces as they happen; final "result" event carries the full response
+    events = EventStream(format)
+    return StreamingResponse(events.iter_encoded(agent.run(**_run_kwargs(payload, request.headers), events=events)), media_type=events.media_type)
+
+@router.get("/rag/react-single-agent/single-flight/stats")
+async def single_flight_stats():
+    # leaders = runs executed, coalesced = requests that joined an in-flight run instead of starting their own
+    return agent_flights.info()
@@ -0,0 +1,16 @@
+# app/router/metrics_router.py
+# Prometheus scrape endpoint; the registry and the metric definitions live in app/utils/metrics.py.
+
+from fastapi import APIRouter, HTTPException
+from fastapi.responses import Response
+from app.config.app_config import AppConfigSingleton
+from app.utils import metrics
+
+metrics_router = APIRouter(tags=["metrics"])
+cfg = AppConfigSingleton.instance()
+
+@metrics_router.get("/metrics", summary="Prometheus metrics (text exposition format)")
+async def get_metrics():
+    if not cfg.metrics_enabled:
+        raise HTTPException(status_code=404, detail="metrics disabled (METRICS_ENABLED=false)")
+    return Response(content=metrics.registry.render(), media_type=metrics.CONTENT_TYPE)
@@ -1,4 +1,5 @@
 from fastapi import APIRouter, Query, HTTPException, Path as FPath
+from fastapi.responses import StreamingResponse
 from typing import Optional, Dict, Any, List
 import time
 from pydantic import BaseModel
@@ -6,8 +7,8 @@ from app.utils.app_logging import get_logger
 from app.config.app_config import AppConfigSingleton
 from app.config.chroma_client_service import ChromaClientService
 from app.models.rag_models import RetrieveResponse, RetrieveResponseHit, QARequest, QAResponse
-from app.models.rag_models import RAGQueryRequest, RAGAnswer
 from app.service.rag.rag_search_service import RAGSearchService
+from app.utils.event_stream import EventStream
 
 cfg = AppConfigSingleton.instance()
 logger = get_logger(cfg)
@@ -20,25 +21,17 @@ class BatchQARequest(BaseModel):
     n_results: int = 8
     top_k_ctx: int = 4
 
-class UserQueryRequest(BaseModel):
-    question: str
-enable_query_variants: bool = False
-enable_output_scoring: bool = False
-emit_debug: bool = False
-max_variants: int = 3
-
-@rag_router.post("/user_query", response_model=RAGAnswer)
-async def user_query(req: UserQueryRequest):
-    rag_req = RAGQueryRequest(**req.dict())
-    return ragService.answer(rag_req)
-
-@rag_router.get("/search")
-async def rag_search(q: str = Query(...), n: int = Query(5)):
-    return ragService.retrieve(q, n)
+@rag_router.get("/search", response_model=RetrieveResponse)
+async def rag_search(q: str = Query(...), n: int = Query(5, ge=1, le=25), min_score: Optional[float] = Query(None, ge=0.0, le=1.0)):
+    return await ragService.retrieve(q, n, min_score=min_score)
 
 @rag_router.get("/retrieve", response_model=RetrieveResponse)
 async def retrieve(query: str = Query(...), n_results: int = Query(8, ge=1, le=25),
-                   advisor_id: Optional[str] = None, client_id: Optional[str] = None, doc_type: Optional[str] = None):
+                   advisor_id: Optional[str] = None, client_id: Optional[str] = None, doc_type: Optional[str] = None,
+                   min_score: Optional[float] = Query(None, ge=0.0, le=1.0),
+                   snippet_chars: int = Query(600, ge=0, le=5000, description="0 returns full chunk text"),
+                   fields: Optional[List[str]] = Query(None, description="metadata keys to return (parent_id always kept)"),
+                   include: Optional[List[str]] = Query(None, description="Chroma include, e.g. metadatas to skip documents")):
     t0 = time.perf_counter()
     where: Dict[str, Any] = {}
     if advisor_id: where["advisor_id"] = advisor_id
@@ -46,18 +39,9 @@ async def retrieve(query: str = Query(...), n_results: int = Query(8, ge=1, le=2
     if doc_type: where["doc_type"] = doc_type
     logger.info("[RAG] Retrieve begin query='%s' where=%s", query, where or None)
     try:
-        res = chromaClientService.query(query_text=query, n_results=n_results, where=where or None)
-        ids = res.get("ids", [[]])[0]
-        docs = res.get("documents", [[]])[0]
-        metas = res.get("metadatas", [[]])[0]
-        hits: List[RetrieveResponseHit] = []
-        for i, _id in enumerate(ids):
-            hits.append(RetrieveResponseHit(
-                id=_id,
-                parent_id=(metas[i] or {}).get("parent_id"),
-                text=(docs[i] or "")[:600],
-                metadata=metas[i]
-            ))
+        out = await ragService.retrieve(query, n=n_results, where=where or None, min_score=min_score,
+                                        include=include, snippet_chars=snippet_chars or None, fields=fields)
+        hits: List[RetrieveResponseHit] = out.hits
         lapse = round((time.perf_counter() - t0) * 1000, 2)
         logger.info("[RAG] Retrieve ok hits=%d lapse_ms=%.2f", len(hits), lapse)
         return RetrieveResponse(query=query, hits=hits, retrieval_lapse_time=lapse)
@@ -67,6 +51,18 @@ async def retrieve(query: str = Query(...), n_results: int = Query(8, ge=1, le=2
         return RetrieveResponse(query=query, hits=[], retrieval_lapse_time=lapse,
                                 file_error_info={"stage":"retrieve","type":e.__class__.__name__,"message":str(e)})
 
+@rag_router.get("/retrieve/stream")
+async def retrieve_stream(query: str = Query(...), n_results: int = Query(8, ge=1, le=25),
+                          advisor_id: Optional[str] = None, client_id: Optional[str] = None, doc_type: Optional[str] = None,
+                          min_score: Optional[float] = Query(None, ge=0.0, le=1.0),
+                          format: str = Query("ndjson", pattern="^(ndjson|sse)$")):
+    events = EventStream(format)
+    async def _run():
+        out = await retrieve(query, n_results, advisor_id, client_id, doc_type, min_score, 600, None, None)
+        await events.emit("hits", stage="retrieve", hits=[h.model_dump() for h in out.hits])
+        return {"query": query, "retrieval_lapse_time": out.retrieval_lapse_time, "file_error_info": out.file_error_info}
+    return StreamingResponse(events.iter_encoded(_run()), media_type=events.media_type)
+
 @rag_router.get("/get_full_text/{id}")
 async def get_full_text(id: str = FPath(...)) -> dict:
     logger.info("[RAG] Get full text id=%s", id)
@@ -80,7 +76,7 @@ async def get_full_text(id: str = FPath(...)) -> dict:
 @rag_router.post("/user_query", response_model=QAResponse)
 async def user_query(req: QARequest):
     logger.info("[RAG] QA begin question='%s' n_results=%d top_k=%d", req.question, req.n_results, req.top_k_ctx)
-    out = ragService.ask(question=req.question, n_results=req.n_results, top_k_ctx=req.top_k_ctx)
+    out = await ragService.ask(question=req.question, n_results=req.n_results, top_k_ctx=req.top_k_ctx)
     if out.get("file_llm_status") == "success":
         logger.info("[RAG] QA ok citations=%s llm_ms=%.2f", out.get("citations"), out.get("llm_lapse_time", 0.0))
     else:
@@ -88,12 +84,22 @@ async def user_query(req: QARequest):
     # FastAPI will validate against QAResponse model
     return out
 
+@rag_router.post("/user_query/stream")
+async def user_query_stream(req: QARequest, format: str = Query("ndjson", pattern="^(ndjson|sse)$")):
+    # hits event after retrieval, then LLM token events, then the QAResponse-shaped result
+    logger.info("[RAG] QA stream begin n_results=%d top_k=%d", req.n_results, req.top_k_ctx)
+    events = EventStream(format)
+    return StreamingResponse(
+        events.iter_encoded(ragService.ask(question=req.question, n_results=req.n_results, top_k_ctx=req.top_k_ctx, events=events)),
+        media_type=events.media_type
+    )
+
 @rag_router.post("/user_query_debug")
 async def user_query_debug(req: QARequest):
     logger.info("[RAG] user_query_debug q='%s'", req.question)
-    return ragService.ask_with_debug(question=req.question, n_results=req.n_results, top_k_ctx=req.top_k_ctx)
+    return await ragService.ask_with_debug(question=req.question, n_results=req.n_results, top_k_ctx=req.top_k_ctx)
 
 @rag_router.post("/user_query_eval")
 async def user_query_eval(req: BatchQARequest):
     logger.info("[RAG] user_query_eval n=%d", len(req.questions))
-    return ragService.ask_batch(questions=req.questions, n_results=req.n_results, top_k_ctx=req.top_k_ctx)
\ No newline at end of file
+    return await ragService.ask_batch(questions=req.questions, n_results=req.n_results, top_k_ctx=req.top_k_ctx)
\ No newline at end of file
@@ -0,0 +1,206 @@
+# app/service/cache/answer_cache.py
+# Two-tier cache in front of the react agents' final synthesis call.
+#  - exact: sha256 of model + prompt + context + temperature -> (answer, llm meta)
+#  - semantic: question embedding -> answer, reused when cosine >= threshold and every parent the cached answer
+#    cites is also allowed in the current context; the scope pins the question's years/figures and retrieval filters,
+#    so "revenue in 2022" never reuses the answer to "revenue in 2023"
+# Both tiers are LRU-bounded in memory and written through to a small sqlite file so they survive restarts.
+# Entries record the parent ids they depend on and are dropped when any of those parents is (re)indexed or purged.
+
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+import numpy as np
+from app.config.app_config import AppConfigSingleton
+from app.utils.app_logging import get_logger
+from app.utils import memory, metrics
+
+_cfg = AppConfigSingleton.instance()
+_logger = get_logger(_cfg)
+
+def exact_key(model: str, prompt: str, context: str, temperature: Optional[float]) -> str:
+    ctx_hash = hashlib.sha256((context or "").encode("utf-8")).hexdigest()
+    raw = json.dumps([model, prompt, ctx_hash, temperature], separators=(",", ":"))
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+_FIGURE_RE = re.compile(r"\d+(?:[.,]\d+)*%?")
+
+def semantic_scope(model: str, prompt: str, temperature: Optional[float], question: str,
+                   where: Optional[Dict[str, Any]] = None) -> str:
+    figures = sorted({f.replace(",", "") for f in _FIGURE_RE.findall(question or "")})
+    raw = json.dumps([model, prompt, temperature, figures, where or {}], sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+class AnswerCache:
+    def __init__(self, path: Optional[str], max_entries: int = 2000, semantic_threshold: float = 0.95):
+        self.path = path
+        self.max_entries = max(1, max_entries)
+        self.semantic_threshold = semantic_threshold
+        self._exact: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._semantic: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._matrix: Dict[str, Tuple[List[str], np.ndarray]] = {}  # scope -> (keys, unit vectors), rebuilt lazily
+        self._lock = threading.Lock()
+        self._db: Optional[sqlite3.Connection] = None
+        self.stats = {"exact_hits": 0, "semantic_hits": 0, "misses": 0, "invalidated": 0}
+        if path:
+            self._open(path)
+
+    # ---------------- persistence ----------------
+
+    def _open(self, path: str) -> None:
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("CREATE TABLE IF NOT EXISTS entries (tier TEXT, key TEXT, used REAL, body TEXT, PRIMARY KEY (tier, key))")
+            rows = self._db.execute("SELECT tier, key, body FROM entries ORDER BY used").fetchall()
+            for tier, key, body in rows:
+                entry = json.loads(body)
+                if tier == "semantic":
+                    entry["embedding"] = np.asarray(entry["embedding"], dtype=np.float32)
+                (self._semantic if tier == "semantic" else self._exact)[key] = entry
+            self._evict()
+            _logger.info("[AnswerCache] loaded exact=%d semantic=%d path=%s", len(self._exact), len(self._semantic), path)
+        except Exception as e:
+            _logger.warning("[AnswerCache] persistence disabled (%s): %s", path, e)
+            self._db = None
+
+    def _write(self, tier: str, key: str, entry: Dict[str, Any]) -> None:
+        if self._db is None:
+            return
+        body = dict(entry)
+        if "embedding" in body:
+            body["embedding"] = [round(float(x), 6) for x in body["embedding"]]
+        with self._lock:
+            self._db.execute("INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?)", (tier, key, time.time(), json.dumps(body)))
+
+    def _delete(self, tier: str, keys: Iterable[str]) -> None:
+        keys = list(keys)
+        if self._db is None or not keys:
+            return
+        with self._lock:
+            self._db.executemany("DELETE FROM entries WHERE tier = ? AND key = ?", [(tier, k) for k in keys])
+
+    def _evict(self) -> None:
+        for tier, store in (("exact", self._exact), ("semantic", self._semantic)):
+            dropped = []
+            while len(store) > self.max_entries:
+                dropped.append(store.popitem(last=False)[0])
+            self._delete(tier, dropped)
+            if dropped and tier == "semantic":
+                self._matrix.clear()
+
+    # ---------------- exact tier ----------------
+
+    def get_exact(self, key: str) -> Optional[Dict[str, Any]]:
+        entry = self._exact.get(key)
+        if entry is None:
+            return None
+        self._exact.move_to_end(key)
+        self.stats["exact_hits"] += 1
+        return entry
+
+    def put_exact(self, key: str, answer: str, meta: Dict[str, Any], parent_ids: List[str]) -> None:
+        entry = {"answer": answer, "meta": meta, "parent_ids": list(parent_ids), "created": time.time()}
+        self._exact[key] = entry
+        self._exact.move_to_end(key)
+        self._write("exact", key, entry)
+        self._evict()
+
+    # ---------------- semantic tier ----------------
+
+    def get_semantic(self, scope: str, embedding: List[float], allowed_parent_ids: Iterable[str]) -> Optional[Tuple[Dict[str, Any], float]]:
+        keys, mat = self._scope_matrix(scope)
+        if not keys:
+            return None
+        q = np.asarray(embedding, dtype=np.float32)
+        q = q / (np.linalg.norm(q) or 1.0)
+        sims = mat @ q
+        allowed = set(allowed_parent_ids)
+        for i in np.argsort(-sims):
+            if sims[i] < self.semantic_threshold:
+                break
+            entry = self._semantic.get(keys[i])
+            # only reuse an answer whose citations are all valid for the current context
+            if entry is not None and set(entry["parent_ids"]) <= allowed:
+                self._semantic.move_to_end(keys[i])
+                self.stats["semantic_hits"] += 1
+                return entry, float(sims[i])
+        return None
+
+    def put_semantic(self, scope: str, question: str, embedding: List[float], answer: str, meta: Dict[str, Any],
+                     parent_ids: List[str]) -> None:
+        if not parent_ids:
+            return
+        key = hashlib.sha256(json.dumps([scope, question]).encode("utf-8")).hexdigest()
+        entry = {"scope": scope, "question": question, "embedding": np.asarray(embedding, dtype=np.float32),
+                 "answer": answer, "meta": meta, "parent_ids": list(parent_ids), "created": time.time()}
+        self._semantic[key] = entry
+        self._semantic.move_to_end(key)
+        self._matrix.pop(scope, None)
+        self._write("semantic", key, entry)
+        self._evict()
+
+    def _scope_matrix(self, scope: str) -> Tuple[List[str], np.ndarray]:
+        cached = self._matrix.get(scope)
+        if cached is None:
+            keys = [k for k, e in self._semantic.items() if e["scope"] == scope]
+            if keys:
+                mat = np.stack([self._semantic[k]["embedding"] for k in keys])
+                mat = mat / np.clip(np.linalg.norm(mat, axis=1, keepdims=True), 1e-12, None)
+            else:
+                mat = np.zeros((0, 0), dtype=np.float32)
+            cached = self._matrix[scope] = (keys, mat)
+        return cached
+
+    # ---------------- maintenance ----------------
+
+    def record_miss(self) -> None:
+        self.stats["misses"] += 1
+
+    def invalidate_parents(self, parent_ids: Iterable[str]) -> int:
+        targets = set(parent_ids)
+        dropped = 0
+        for tier, store in (("exact", self._exact), ("semantic", self._semantic)):
+            keys = [k for k, e in store.items() if targets.intersection(e.get("parent_ids") or [])]
+            for k in keys:
+                store.pop(k, None)
+            self._delete(tier, keys)
+            dropped += len(keys)
+        if dropped:
+            self._matrix.clear()
+            self.stats["invalidated"] += dropped
+            _logger.info("[AnswerCache] invalidated entries=%d parents=%s", dropped, sorted(targets))
+        return dropped
+
+    def clear(self) -> None:
+        self._exact.clear(); self._semantic.clear(); self._matrix.clear()
+        if self._db is not None:
+            with self._lock:
+                self._db.execute("DELETE FROM entries")
+
+    def info(self) -> Dict[str, Any]:
+        return {"exact_entries": len(self._exact), "semantic_entries": len(self._semantic),
+                "max_entries": self.max_entries, "semantic_threshold": self.semantic_threshold, **self.stats}
+
+    def memory_info(self) -> Dict[str, Any]:
+        matrix = sum(m.nbytes for _, m in list(self._matrix.values()))
+        exact, semantic = memory.approx_size(self._exact), memory.approx_size(self._semantic)
+        return {"entries": len(self._exact) + len(self._semantic), "bytes": exact + semantic + matrix,
+                "exact_entries": len(self._exact), "exact_bytes": exact, "semantic_entries": len(self._semantic),
+                "semantic_bytes": semantic, "matrix_bytes": matrix, "max_entries": self.max_entries}
+
+answer_cache = AnswerCache(
+    path=_cfg.answer_cache_path if _cfg.feature_flags.get("answer_cache") else None,
+    max_entries=_cfg.answer_cache_max_entries,
+    semantic_threshold=_cfg.answer_cache_semantic_threshold,
+)
+memory.register("answer_cache", answer_cache.memory_info)
+metrics.registry.gauge("rag_answer_cache_entries", "Answer cache entries per tier.", ("tier",),
+                       fn=lambda: {("exact",): len(answer_cache._exact), ("semantic",): len(answer_cache._semantic)})
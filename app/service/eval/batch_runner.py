@@ -0,0 +1,363 @@
+# app/service/eval/batch_runner.py
+# Runs a JSONL question set through one of the agents with bounded concurrency.
+#  - input lines: {"id"?, "question", ...agent payload fields} or a bare JSON string; ids default to the line number
+#  - output JSONL gets one record per finished question (answer, citations, score, token usage, latency), flushed as
+#    it goes, so the output doubles as the checkpoint: a resumed run skips ids that already have an "ok" record;
+#    a run that doesn't resume never touches an existing output, it writes a run-stamped file next to it
+#  - Parquet output (needs pyarrow) is written from the JSONL checkpoint once the run completes; if that export
+#    fails the run still completes with the JSONL as its output and the reason in summary()["parquet_error"]
+# Runs in-process, so the answer cache, single-flight table and LLM limiter are shared across questions.
+#
+# CLI: python -m app.service.eval.batch_runner --agent react_tool --input questions.jsonl [--output runs/x.jsonl]
+#      [--concurrency 16] [--limit N] [--no-resume] [--format jsonl|parquet]
+
+import argparse
+import asyncio
+import datetime
+import json
+import os
+import time
+import uuid
+from functools import lru_cache
+from typing import Any, Awaitable, Callable, Dict, Iterator, List, Optional, Set
+from app.config.app_config import AppConfigSingleton
+from app.config.llm_client import close_llm_client, track_usage
+from app.service.variants.variant_output_score_service import VariantOutputScoreService
+from app.utils.app_logging import get_logger
+from app.utils import memory
+
+_cfg = AppConfigSingleton.instance()
+_logger = get_logger(_cfg)
+
+AGENTS = ("rag", "react_tool", "react_functions", "react_agent", "functions_calling")
+FORMATS = ("jsonl", "parquet")
+
+# ---------------- agents ----------------
+
+def _react_single_kwargs(rec: Dict[str, Any]) -> Dict[str, Any]:
+    return dict(
+        question=rec["question"],
+        scoring_model=rec.get("scoring_model", "heuristic_v1"),
+        emit_traces=False,
+        enable_query_variants=rec.get("enable_query_variants", True),
+        enable_output_scoring=rec.get("enable_output_scoring", True),
+        max_variants=rec.get("max_variants", 3),
+        self_reflection_iterations=rec.get("self_reflection_iterations", 3),
+        agent_graph_id="batch-eval",
+        agent_descriptor={"agent_id": "batch-eval", "agent_name": "Batch evaluation", "agent_role": "researcher",
+                          "agent_goal": "Answer the question set."},
+        execution_mode="async",
+        preferred_year=rec.get("preferred_year"),
+        top_k=rec.get("top_k"),
+        retrieval_filters=rec.get("retrieval_filters"),
+        min_score=rec.get("min_score"),
+        deadline_ms=rec.get("deadline_ms"),
+    )
+
+@lru_cache(maxsize=None)
+def agent_runner(name: str) -> Callable[[Dict[str, Any]], Awaitable[Dict[str, Any]]]:
+    """Coroutine function answering one question record with the named agent (also used by the benchmark suite)."""
+    # imported lazily: each agent pulls in its own clients and prompts
+    if name == "rag":
+        from app.service.rag.rag_search_service import RAGSearchService
+        svc = RAGSearchService()
+        return lambda rec: svc.ask(rec["question"], n_results=rec.get("n_results", 8), top_k_ctx=rec.get("top_k_ctx", 4),
+                                   where=rec.get("where"))
+    if name == "react_tool":
+        from app.service.feature.react_single_agent.react_service import ReactToolCallingAgent
+        agent = ReactToolCallingAgent()
+        return lambda rec: agent.run_coalesced(**_react_single_kwargs(rec))
+    if name == "react_functions":
+        from app.service.feature.react_single_agent.functions_service import ReactFunctionCallingAgent
+        agent = ReactFunctionCallingAgent()
+        return lambda rec: agent.run_coalesced(**_react_single_kwargs(rec))
+    if name == "react_agent":
+        from app.service.feature.react_agent.react_service import ReactAgent
+        agent = ReactAgent(max_steps=4)
+        return lambda rec: agent.run(rec["question"])
+    if name == "functions_calling":
+        from app.service.feature.react_agent.functions_service import FunctionCalling
+        agent = FunctionCalling()
+        return lambda rec: agent.run(rec["question"])
+    raise ValueError(f"unknown agent {name!r}; expected one of {', '.join(AGENTS)}")
+
+def _error_of(out: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    if out.get("file_llm_status") == "failed":
+        return out.get("file_error_info") or {"type": "LLMFailed"}
+    return out.get("error_info") or None
+
+# ---------------- I/O ----------------
+
+def read_questions(path: str, limit: Optional[int] = None) -> Iterator[Dict[str, Any]]:
+    with open(path, "r", encoding="utf-8") as f:
+        n = 0
+        for lineno, line in enumerate(f, 1):
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            rec = json.loads(line)
+            if isinstance(rec, str):
+                rec = {"question": rec}
+            if not (rec.get("question") or "").strip():
+                _logger.warning("[BatchEval] %s:%d has no question, skipped", path, lineno)
+                continue
+            rec["id"] = str(rec.get("id") or lineno)
+            yield rec
+            n += 1
+            if limit and n >= limit:
+                return
+
+def _load_records(path: str) -> Dict[str, Dict[str, Any]]:
+    """Last record per id from a JSONL checkpoint (a re-run error or retry overwrites the earlier line)."""
+    records: Dict[str, Dict[str, Any]] = {}
+    if not os.path.exists(path):
+        return records
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                rec = json.loads(line)
+            except json.JSONDecodeError:
+                continue  # torn last line from an interrupted run
+            records[str(rec.get("id"))] = rec
+    return records
+
+def _float_or_none(value: Any) -> Optional[float]:
+    try:
+        return float(value) if value is not None else None
+    except (TypeError, ValueError):
+        return None
+
+def _parquet_rows(records: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Checkpoint records with one type per column: caller-supplied and nested fields are JSON-encoded."""
+    return [{**r, "citations": [str(c) for c in r.get("citations") or []],
+             "agent_score": _float_or_none(r.get("agent_score")),
+             "expected": json.dumps(r.get("expected"), ensure_ascii=False, default=str) if r.get("expected") is not None else None,
+             "usage": json.dumps(r.get("usage")), "error": json.dumps(r.get("error"), default=str) if r.get("error") else None}
+            for r in records]
+
+def _write_parquet(records: List[Dict[str, Any]], path: str) -> None:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    pq.write_table(pa.Table.from_pylist(_parquet_rows(records)), path)
+
+def _percentile(values: List[float], q: float) -> float:
+    if not values:
+        return 0.0
+    s = sorted(values)
+    return s[min(len(s) - 1, int(q * len(s)))]
+
+# ---------------- runner ----------------
+
+class BatchRun:
+    def __init__(self, agent: str, input_path: str, output_path: Optional[str] = None, concurrency: Optional[int] = None,
+                 resume: bool = True, limit: Optional[int] = None, output_format: str = "jsonl"):
+        if agent not in AGENTS:
+            raise ValueError(f"unknown agent {agent!r}; expected one of {', '.join(AGENTS)}")
+        if output_format not in FORMATS:
+            raise ValueError(f"unknown format {output_format!r}; expected one of {', '.join(FORMATS)}")
+        if not os.path.exists(input_path):
+            raise FileNotFoundError(input_path)
+        self.run_id = f"eval_{datetime.datetime.utcnow().strftime('%Y%m%d_%H%M%S')}_{uuid.uuid4().hex[:4]}"
+        self.agent = agent
+        self.input_path = input_path
+        stem = os.path.splitext(os.path.basename(input_path))[0]
+        self.output_path = output_path or os.path.join(_cfg.eval_output_dir, f"{stem}.{agent}.jsonl")
+        if self.output_path.endswith(".parquet"):
+            self.output_path = self.output_path[:-len(".parquet")] + ".jsonl"
+            output_format = "parquet"
+        if not resume and os.path.exists(self.output_path):
+            stem, ext = os.path.splitext(self.output_path)
+            self.output_path = f"{stem}.{self.run_id}{ext}"
+        if output_format == "parquet":
+            try:
+                import pyarrow  # noqa: F401
+            except ImportError as e:
+                raise ValueError("parquet output needs pyarrow (pip install pyarrow)") from e
+        self.output_format = output_format
+        self.concurrency = max(1, concurrency or _cfg.eval_concurrency)
+        self.resume = resume
+        self.limit = limit
+        self.state = "pending"
+        self.error: Optional[str] = None
+        self.parquet_error: Optional[str] = None
+        self.counts = {"done": 0, "ok": 0, "errors": 0, "skipped": 0}
+        self._latencies: List[float] = []
+        self._tokens = 0
+        self._scores: List[float] = []
+        self._t0: Optional[float] = None
+        self._elapsed = 0.0
+
+    async def _one(self, rec: Dict[str, Any]) -> Dict[str, Any]:
+        question = rec["question"]
+        t0 = time.perf_counter()
+        out: Dict[str, Any] = {}
+        error = None
+        with track_usage() as usage:
+            try:
+                out = await agent_runner(self.agent)(rec) or {}
+                error = _error_of(out)
+            except Exception as e:
+                _logger.warning("[BatchEval] id=%s failed: %s", rec["id"], e)
+                error = {"type": e.__class__.__name__, "message": str(e), "code": getattr(e, "code", None)}
+        answer = out.get("final_response") or out.get("answer") or ""
+        citations = list(out.get("citations") or [])
+        return {
+            "id": rec["id"],
+            "question": question,
+            "agent": self.agent,
+            "status": "error" if error or not answer else "ok",
+            "answer": answer,
+            "citations": citations,
+            "score": VariantOutputScoreService.score_scalar(answer, citations, question=question) if answer else 0.0,
+            "agent_score": out.get("selected_score"),
+            "usage": usage,
+            "latency_ms": round((time.perf_counter() - t0) * 1000, 2),
+            "cache_hit": bool(out.get("cache_hit")),
+            "coalesced": bool(out.get("coalesced")),
+            "expected": rec.get("expected"),
+            "error": error,
+        }
+
+    def _record(self, result: Dict[str, Any]) -> None:
+        self.counts["done"] += 1
+        self.counts["ok" if result["status"] == "ok" else "errors"] += 1
+        self._latencies.append(result["latency_ms"])
+        self._tokens += result["usage"]["total_tokens"]
+        if result["status"] == "ok":
+            self._scores.append(result["score"])
+        if self.counts["done"] % 50 == 0:
+            _logger.info("[BatchEval] %s progress done=%d ok=%d errors=%d", self.run_id, self.counts["done"],
+                         self.counts["ok"], self.counts["errors"])
+
+    async def run(self) -> Dict[str, Any]:
+        self.state = "running"
+        self._t0 = time.perf_counter()
+        os.makedirs(os.path.dirname(os.path.abspath(self.output_path)), exist_ok=True)
+        done: Set[str] = set()
+        if self.resume:
+            done = {rid for rid, r in _load_records(self.output_path).items() if r.get("status") == "ok"}
+        _logger.info("[BatchEval] %s start agent=%s input=%s concurrency=%d resume_skip=%d", self.run_id, self.agent,
+                     self.input_path, self.concurrency, len(done))
+
+        # bounded queue: thousands of questions never sit in memory as pending tasks
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self.concurrency * 2)
+        try:
+            with open(self.output_path, "a", encoding="utf-8") as sink:
+                async def produce():
+                    for rec in read_questions(self.input_path, self.limit):
+                        if rec["id"] in done:
+                            self.counts["skipped"] += 1
+                            continue
+                        await queue.put(rec)
+                    for _ in range(self.concurrency):
+                        await queue.put(None)
+
+                async def work():
+                    while (rec := await queue.get()) is not None:
+                        result = await self._one(rec)
+                        sink.write(json.dumps(result, ensure_ascii=False, default=str) + "\n")
+                        sink.flush()
+                        self._record(result)
+
+                async with asyncio.TaskGroup() as tg:
+                    tg.create_task(produce())
+                    for _ in range(self.concurrency):
+                        tg.create_task(work())
+            if self.output_format == "parquet":
+                try:
+                    _write_parquet(list(_load_records(self.output_path).values()), self.parquet_path)
+                except Exception as e:
+                    # every question has run: keep the JSONL as the result rather than failing the whole run
+                    _logger.warning("[BatchEval] %s parquet export failed, results stay in %s: %s", self.run_id, self.output_path, e)
+                    self.parquet_error = f"{e.__class__.__name__}: {e}"
+            self.state = "completed"
+        except BaseException as e:
+            self.state = "cancelled" if isinstance(e, asyncio.CancelledError) else "failed"
+            self.error = f"{e.__class__.__name__}: {e}"
+            raise
+        finally:
+            self._elapsed = time.perf_counter() - self._t0
+            _logger.info("[BatchEval] %s %s %s", self.run_id, self.state, self.summary())
+        return self.summary()
+
+    @property
+    def parquet_path(self) -> str:
+        return os.path.splitext(self.output_path)[0] + ".parquet"
+
+    def summary(self) -> Dict[str, Any]:
+        elapsed = (time.perf_counter() - self._t0) if self.state == "running" else self._elapsed
+        lat = self._latencies
+        return {
+            "run_id": self.run_id,
+            "agent": self.agent,
+            "state": self.state,
+            "input_path": self.input_path,
+            "output_path": self.parquet_path if self.output_format == "parquet" and not self.parquet_error else self.output_path,
+            "checkpoint_path": self.output_path,
+            "concurrency": self.concurrency,
+            **self.counts,
+            "elapsed_s": round(elapsed, 2),
+            "questions_per_s": round(self.counts["done"] / elapsed, 2) if elapsed else 0.0,
+            "latency_ms": {"p50": _percentile(lat, 0.50), "p95": _percentile(lat, 0.95), "max": max(lat) if lat else 0.0},
+            "total_tokens": self._tokens,
+            "avg_score": round(sum(self._scores) / len(self._scores), 3) if self._scores else None,
+            "error": self.error,
+            "parquet_error": self.parquet_error,
+        }
+
+class BatchJobs:
+    """Background batch runs started from the API, kept in memory for status polling."""
+
+    def __init__(self, keep: int = 20):
+        self._runs: Dict[str, BatchRun] = {}
+        self._tasks: Dict[str, asyncio.Task] = {}
+        self._keep = keep
+
+    def start(self, run: BatchRun) -> BatchRun:
+        task = asyncio.create_task(run.run())
+        task.add_done_callback(lambda t: t.cancelled() or t.exception())  # failures are on run.state / run.error
+        self._runs[run.run_id], self._tasks[run.run_id] = run, task
+        for old in list(self._runs)[:-self._keep]:
+            if self._tasks[old].done():
+                self._runs.pop(old); self._tasks.pop(old)
+        return run
+
+    def get(self, run_id: str) -> Optional[BatchRun]:
+        return self._runs.get(run_id)
+
+    def cancel(self, run_id: str) -> bool:
+        task = self._tasks.get(run_id)
+        if task is None or task.done():
+            return False
+        return task.cancel()
+
+    def list(self) -> List[Dict[str, Any]]:
+        return [r.summary() for r in self._runs.values()]
+
+    def memory_info(self) -> Dict[str, Any]:
+        return {"entries": len(self._runs), "bytes": memory.approx_size(self._runs), "keep": self._keep}
+
+batch_jobs = BatchJobs()
+memory.register("batch_jobs", batch_jobs.memory_info)
+
+# ---------------- CLI ----------------
+
+async def _main(args: argparse.Namespace) -> Dict[str, Any]:
+    run = BatchRun(args.agent, args.input, args.output, concurrency=args.concurrency, resume=not args.no_resume,
+                   limit=args.limit, output_format=args.format)
+    try:
+        return await run.run()
+    finally:
+        await close_llm_client()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run a JSONL question set through an agent.")
+    parser.add_argument("--agent", required=True, choices=AGENTS)
+    parser.add_argument("--input", required=True, help="JSONL: {\"id\", \"question\", ...} per line")
+    parser.add_argument("--output", help="JSONL checkpoint/output path (default EVAL_OUTPUT_DIR/<input>.<agent>.jsonl)")
+    parser.add_argument("--concurrency", type=int, default=None, help="questions in flight (default EVAL_CONCURRENCY)")
+    parser.add_argument("--limit", type=int, default=None)
+    parser.add_argument("--no-resume", action="store_true",
+                        help="start over instead of skipping finished ids (an existing output is kept; a run-stamped file is written)")
+    parser.add_argument("--format", choices=FORMATS, default="jsonl")
+    print(json.dumps(asyncio.run(_main(parser.parse_args())), indent=2))
@@ -0,0 +1,277 @@
+# app/service/eval/benchmark.py
+# End-to-end benchmark suite over the Tesla 10-K PDFs in data/documents:
+#  - indexing: PDF extraction pages/s, chunking, embedding and upsert chunks/s (into a scratch index under bench_dir)
+#  - retrieval: GET /rag-search/retrieve p50/p95/p99 and throughput at several concurrency levels (in-process ASGI)
+#  - agent: react-single-agent end-to-end latency, LLM calls and tokens per question
+# The LLM is the deterministic stand-in (app/config/fake_openai.py) unless --real-llm is given, and the answer cache is
+# off, so numbers move only when the code (or the machine) does. Results are written as JSON and compared metric by
+# metric against a stored baseline; anything worse than bench_regression_tolerance is flagged (exit code 1).
+#
+# CLI: python -m app.service.eval.benchmark [--stages indexing,retrieval,agent] [--max-pages 40] [--concurrency 1,4,16]
+#      [--requests 64] [--agent-questions 8] [--baseline PATH] [--save-baseline] [--real-llm]
+
+import argparse
+import asyncio
+import datetime
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+from app.config.app_config import AppConfigSingleton
+from app.utils.app_logging import get_logger
+
+_cfg = AppConfigSingleton.instance()
+_logger = get_logger(_cfg)
+
+STAGES = ("indexing", "retrieval", "agent")
+
+QUESTIONS = [
+    "What was Tesla's total revenue in 2019?",
+    "How did automotive gross margin change year over year?",
+    "Report cash and cash equivalents at year end.",
+    "What were the primary drivers of revenue growth this year?",
+    "Summarize key risk factors mentioned in the filing.",
+    "Summarize notable legal proceedings disclosed.",
+    "List major segments and briefly describe what they include.",
+    "Provide a brief overview of risks related to supply chain or manufacturing.",
+    "What guidance or outlook did the company provide?",
+    "How much did Tesla spend on capital expenditures?",
+    "How many vehicles were delivered during the year?",
+    "What was the net income attributable to common stockholders?",
+]
+
+def _percentile(values: List[float], q: float) -> float:
+    if not values:
+        return 0.0
+    s = sorted(values)
+    return round(s[min(len(s) - 1, int(q * len(s)))], 2)
+
+class Results:
+    def __init__(self):
+        self.metrics: Dict[str, Dict[str, Any]] = {}
+
+    def add(self, name: str, value: float, unit: str, better: str) -> None:
+        """better: "higher" (throughput) or "lower" (latency, tokens)."""
+        self.metrics[name] = {"value": round(float(value), 3), "unit": unit, "better": better}
+        _logger.info("[Bench] %s = %.3f %s", name, value, unit)
+
+# ---------------- stages ----------------
+
+def _extract(path: Path, max_pages: int) -> Tuple[str, int]:
+    from app.utils.pdf_text_extract import extract_text_from_pdf
+    if not max_pages:
+        return extract_text_from_pdf(path)
+    from pypdf import PdfReader
+    pages = PdfReader(str(path)).pages[:max_pages]
+    return "\n".join(p.extract_text() or "" for p in pages).strip(), len(pages)
+
+def bench_indexing(res: Results, docs: List[Path], max_pages: int) -> None:
+    from app.config.vector_db_client import VectorDBClient
+    from app.service.indexing.chunked_indexer_service import ChunkedIndexerService, _year_from_filename
+    from app.utils.doc_chunking import sliding_window_chunks
+
+    db = VectorDBClient()
+    indexer = ChunkedIndexerService(db, VectorDBClient(collection_name=_cfg.parent_collection_name))
+    t = {"extract": 0.0, "chunk": 0.0, "embed": 0.0, "upsert": 0.0}
+    pages = n_chunks = chars = 0
+    for path in docs:
+        t0 = time.perf_counter()
+        text, n_pages = _extract(path, max_pages)
+        t1 = time.perf_counter()
+        chunks = sliding_window_chunks(text)
+        t2 = time.perf_counter()
+        vectors = db.embed_many(chunks) if chunks else []
+        t3 = time.perf_counter()
+        ids = [f"{path.stem}::chunk::{i:04d}" for i in range(len(chunks))]
+        metas = [{"parent_id": path.stem, "chunk_id": cid, "filename": path.name, "pages": n_pages,
+                  "year": _year_from_filename(path.name), "doc_type": "10-k"} for cid in ids]
+        if chunks:
+            db.upsert_items(chunks, metas, ids, embeddings=vectors)
+            indexer.upsert_parent_summary(path.stem, chunks, vectors, metas[0])
+        t4 = time.perf_counter()
+        for k, dt in zip(t, (t1 - t0, t2 - t1, t3 - t2, t4 - t3)):
+            t[k] += dt
+        pages += n_pages; n_chunks += len(chunks); chars += len(text)
+    res.add("extract_pages_per_s", pages / t["extract"] if t["extract"] else 0.0, "pages/s", "higher")
+    res.add("chunk_mb_per_s", chars / 1e6 / t["chunk"] if t["chunk"] else 0.0, "MB/s", "higher")
+    res.add("embed_chunks_per_s", n_chunks / t["embed"] if t["embed"] else 0.0, "chunks/s", "higher")
+    res.add("upsert_chunks_per_s", n_chunks / t["upsert"] if t["upsert"] else 0.0, "chunks/s", "higher")
+    res.add("index_chunks", n_chunks, "chunks", "higher")
+
+async def bench_retrieval(res: Results, levels: List[int], requests: int, questions: List[str]) -> None:
+    import httpx
+    from app.api.main import app
+
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench") as client:
+        async def one(i: int) -> float:
+            t0 = time.perf_counter()
+            r = await client.get("/rag-search/retrieve", params={"query": questions[i % len(questions)], "n_results": 8})
+            r.raise_for_status()
+            return (time.perf_counter() - t0) * 1000
+
+        await one(0)  # warm-up: embedder and HNSW load
+        for level in levels:
+            sem = asyncio.Semaphore(level)
+
+            async def bounded(i: int) -> float:
+                async with sem:
+                    return await one(i)
+
+            t0 = time.perf_counter()
+            lat = await asyncio.gather(*(bounded(i) for i in range(requests)))
+            wall = time.perf_counter() - t0
+            for q, label in ((0.50, "p50"), (0.95, "p95"), (0.99, "p99")):
+                res.add(f"retrieve_c{level}_{label}_ms", _percentile(lat, q), "ms", "lower")
+            res.add(f"retrieve_c{level}_qps", requests / wall, "req/s", "higher")
+
+async def bench_agent(res: Results, questions: List[str]) -> None:
+    from app.config.llm_client import track_usage
+    from app.service.eval.batch_runner import agent_runner
+
+    run = agent_runner("react_tool")
+    latencies, tokens, calls = [], [], []
+    for i, q in enumerate(questions):
+        with track_usage() as usage:
+            t0 = time.perf_counter()
+            await run({"id": str(i), "question": q})
+            latencies.append((time.perf_counter() - t0) * 1000)
+        tokens.append(usage["total_tokens"])
+        calls.append(usage["calls"])
+    res.add("agent_p50_ms", _percentile(latencies, 0.50), "ms", "lower")
+    res.add("agent_p95_ms", _percentile(latencies, 0.95), "ms", "lower")
+    res.add("agent_tokens_per_question", sum(tokens) / len(tokens), "tokens", "lower")
+    res.add("agent_llm_calls_per_question", sum(calls) / len(calls), "calls", "lower")
+
+# ---------------- baseline ----------------
+
+def compare(current: Dict[str, Dict[str, Any]], baseline: Dict[str, Dict[str, Any]], tolerance: float) -> List[Dict[str, Any]]:
+    """Per-metric relative change vs baseline; regressed marks a move in the wrong direction beyond tolerance."""
+    rows = []
+    for name, cur in current.items():
+        base = baseline.get(name)
+        if not base or not base.get("value"):
+            continue
+        change = (cur["value"] - base["value"]) / abs(base["value"])
+        worse = -change if cur["better"] == "higher" else change
+        rows.append({"metric": name, "baseline": base["value"], "current": cur["value"], "unit": cur["unit"],
+                     "change_pct": round(change * 100, 1), "regressed": worse > tolerance})
+    return rows
+
+def _embedding_function() -> str:
+    # the embedder dominates indexing and retrieval numbers: a baseline is only comparable under the same one
+    from chromadb.utils import embedding_functions
+    return type(embedding_functions.DefaultEmbeddingFunction()).__name__
+
+def _git_sha() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, timeout=5,
+                              cwd=os.path.dirname(__file__)).stdout.strip() or None
+    except Exception:
+        return None
+
+# ---------------- CLI ----------------
+
+async def run_suite(args: argparse.Namespace) -> Dict[str, Any]:
+    stages = [s.strip() for s in args.stages.split(",") if s.strip()]
+    unknown = set(stages) - set(STAGES)
+    if unknown:
+        raise ValueError(f"unknown stages {sorted(unknown)}; expected {', '.join(STAGES)}")
+
+    # Scratch index + stand-in LLM + no answer cache; must be set before the services (and their clients) are imported
+    bench_dir = Path(_cfg.bench_dir)
+    scratch = bench_dir / "chroma"
+    if "indexing" in stages and scratch.exists():
+        shutil.rmtree(scratch)
+    scratch.mkdir(parents=True, exist_ok=True)
+    _cfg.chroma_dir = str(scratch)
+    _cfg.feature_flags["answer_cache"] = False
+    if not args.real_llm:
+        _cfg.llm_backend = "fake"
+
+    docs = sorted(Path(_cfg.documents_dir).glob("*.pdf"))[:args.docs or None]
+    questions = QUESTIONS
+    if args.questions:
+        from app.service.eval.batch_runner import read_questions
+        questions = [r["question"] for r in read_questions(args.questions)]
+    levels = [int(x) for x in args.concurrency.split(",") if x.strip()]
+
+    res = Results()
+    t0 = time.perf_counter()
+    try:
+        if "indexing" in stages:
+            bench_indexing(res, docs, args.max_pages)
+        if "retrieval" in stages:
+            await bench_retrieval(res, levels, args.requests, questions)
+        if "agent" in stages:
+            await bench_agent(res, questions[:args.agent_questions])
+    finally:
+        from app.config.llm_client import close_llm_client
+        await close_llm_client()
+
+    report = {
+        "meta": {
+            "timestamp": datetime.datetime.utcnow().strftime("%Y-%m-%dT%H:%M:%SZ"),
+            "git_sha": _git_sha(),
+            "python": sys.version.split()[0],
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "stages": stages,
+            "documents": [d.name for d in docs],
+            "max_pages": args.max_pages,
+            "concurrency": levels,
+            "requests": args.requests,
+            "agent_questions": args.agent_questions,
+            "embedding_function": _embedding_function(),
+            "llm_backend": _cfg.llm_backend,
+            "fake_llm": {"latency_ms": _cfg.fake_llm_latency_ms, "dist": _cfg.fake_llm_latency_dist, "seed": _cfg.fake_llm_seed},
+            "elapsed_s": round(time.perf_counter() - t0, 2),
+        },
+        "metrics": res.metrics,
+    }
+
+    baseline_path = Path(args.baseline or bench_dir / "baseline.json")
+    if baseline_path.exists():
+        baseline = json.loads(baseline_path.read_text())
+        report["comparison"] = {"baseline": str(baseline_path), "baseline_meta": baseline.get("meta"),
+                                "tolerance": args.tolerance,
+                                "rows": compare(res.metrics, baseline.get("metrics", {}), args.tolerance)}
+    out_path = Path(args.output or bench_dir / f"results-{datetime.datetime.utcnow().strftime('%Y%m%d_%H%M%S')}.json")
+    out_path.parent.mkdir(parents=True, exist_ok=True)
+    out_path.write_text(json.dumps(report, indent=2))
+    if args.save_baseline:
+        baseline_path.write_text(json.dumps({"meta": report["meta"], "metrics": res.metrics}, indent=2))
+    report["output_path"] = str(out_path)
+    return report
+
+def _print_report(report: Dict[str, Any]) -> None:
+    rows = {r["metric"]: r for r in (report.get("comparison") or {}).get("rows", [])}
+    print(f"{'metric':34} {'value':>12} {'unit':8} {'baseline':>12} {'change':>8}")
+    for name, m in report["metrics"].items():
+        r = rows.get(name)
+        base = f"{r['baseline']:12.3f} {r['change_pct']:+7.1f}%{'  REGRESSED' if r['regressed'] else ''}" if r else ""
+        print(f"{name:34} {m['value']:12.3f} {m['unit']:8} {base}")
+    print(f"results: {report['output_path']}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Indexing / retrieval / agent benchmark suite.")
+    parser.add_argument("--stages", default=",".join(STAGES))
+    parser.add_argument("--docs", type=int, default=0, help="number of PDFs from data/documents (0 = all)")
+    parser.add_argument("--max-pages", type=int, default=0, help="pages per PDF to extract (0 = all)")
+    parser.add_argument("--concurrency", default="1,4,16", help="retrieval concurrency levels")
+    parser.add_argument("--requests", type=int, default=64, help="retrieval requests per concurrency level")
+    parser.add_argument("--agent-questions", type=int, default=8)
+    parser.add_argument("--questions", help="JSONL question set (default: built-in Tesla questions)")
+    parser.add_argument("--baseline", help="baseline JSON (default BENCH_DIR/baseline.json)")
+    parser.add_argument("--save-baseline", action="store_true", help="store this run as the new baseline")
+    parser.add_argument("--tolerance", type=float, default=_cfg.bench_regression_tolerance)
+    parser.add_argument("--output", help="results JSON path (default BENCH_DIR/results-<timestamp>.json)")
+    parser.add_argument("--real-llm", action="store_true", help="use openai_base_url instead of the local stand-in")
+    report = asyncio.run(run_suite(parser.parse_args()))
+    _print_report(report)
+    rows = (report.get("comparison") or {}).get("rows", [])
+    sys.exit(1 if any(r["regressed"] for r in rows) else 0)
@@ -0,0 +1,286 @@
+# app/service/eval/retrieval_quality.py
+# Retrieval quality harness: golden set + recall@k / hit@k / MRR / nDCG next to latency, context tokens and index size,
+# so retrieval knobs can be chosen on evidence (Pareto front over quality vs cost).
+#  - bootstrap: samples indexed chunks and turns one sentence of each into a keyword query; the expected evidence is a
+#    short phrase around a figure in that sentence. A hit is relevant when its text contains the phrase, which keeps
+#    the golden set valid across re-chunking (compare chunk sizes by evaluating against each index's chroma dir).
+#    Hand-written items may give chunk_ids / parent_ids instead of an evidence phrase.
+#  - recall@k is the share of an item's relevant chunks (its chunk_ids, or its parents for parent-only items) found in
+#    the top k; hit@k is 1 when at least one is. data/bench/golden_retrieval.jsonl is the committed golden set.
+#  - evaluate: runs every configuration through RetrievalTools.vector_search (the agent retrieval path, including the
+#    two-stage parent search) and the synthesis context packer.
+#
+# CLI: python -m app.service.eval.retrieval_quality bootstrap [--n 200] [--seed 0] [--out golden.jsonl]
+#      python -m app.service.eval.retrieval_quality evaluate [--golden golden.jsonl] [--configs configs.json]
+#      (--out / --golden default to BENCH_DIR/golden_retrieval.jsonl)
+
+import argparse
+import asyncio
+import datetime
+import json
+import math
+import os
+import random
+import re
+import time
+from typing import Any, Dict, List, Optional, Tuple
+from app.config.app_config import AppConfigSingleton
+from app.utils.app_logging import get_logger
+
+_cfg = AppConfigSingleton.instance()
+_logger = get_logger(_cfg)
+
+CHUNK_COLLECTION = "documents_collection"
+GOLDEN_PATH = os.path.join(_cfg.bench_dir, "golden_retrieval.jsonl")
+
+DEFAULT_CONFIGS: List[Dict[str, Any]] = [
+    {"name": "k5", "n_results": 5},
+    {"name": "k8", "n_results": 8},
+    {"name": "k12", "n_results": 12},
+    {"name": "k8_two_stage", "n_results": 8, "parent_k": _cfg.rag_parent_top_k},
+    {"name": "k8_min_score_0.3", "n_results": 8, "min_score": 0.3},
+    {"name": "k8_snippet_600", "n_results": 8, "snippet_chars": 600},
+    {"name": "k8_budget_600", "n_results": 8, "context_token_budget": 600},
+]
+
+_SENT = re.compile(r"(?<=[.!?;])\s+|\n+")
+_WORD = re.compile(r"[A-Za-z][A-Za-z\-']+|\$?\d[\d,.]*%?")
+_FIGURE = re.compile(r"\$?\d[\d,.]*%?")
+_YEAR = re.compile(r"(19|20)\d\d")
+_STOP = frozenset("""a an the and or of to in on for by with as at from that this these those is are was were be been
+being it its our we us their they which who whom such other than also not no may any all each into over under
+per about more less same including include includes included""".split())
+
+def _norm(text: str) -> str:
+    return " ".join((text or "").lower().split())
+
+# ---------------- golden set ----------------
+
+def _all_chunks() -> List[Dict[str, Any]]:
+    import chromadb
+    col = chromadb.PersistentClient(path=_cfg.chroma_dir).get_collection(CHUNK_COLLECTION)
+    res = col.get(include=["documents", "metadatas"])
+    return [{"id": i, "text": d or "", "meta": m or {}} for i, d, m in zip(res["ids"], res["documents"], res["metadatas"])]
+
+def _question_from(sentence: str) -> Optional[Dict[str, str]]:
+    words = _WORD.findall(sentence)
+    if not 8 <= len(words) <= 45:
+        return None
+    figures = [i for i, w in enumerate(words) if _FIGURE.fullmatch(w) and not _YEAR.fullmatch(w)]
+    if not figures:
+        return None
+    # evidence: up to 8 words around the first figure, taken verbatim from the sentence
+    start = max(0, figures[0] - 4)
+    span = words[start:start + 8]
+    m = re.search(r"\s+".join(re.escape(w) for w in span), sentence)
+    if m is None:
+        return None
+    # query: the sentence's content words without its figures (years kept), so the answer isn't in the question
+    terms = [w for w in words if w.lower() not in _STOP and (not _FIGURE.fullmatch(w) or _YEAR.fullmatch(w))]
+    if len(terms) < 4:
+        return None
+    return {"question": " ".join(terms[:14]), "evidence": " ".join(m.group(0).split())}
+
+def bootstrap(n: int = 200, seed: int = 0) -> List[Dict[str, Any]]:
+    chunks = sorted(_all_chunks(), key=lambda c: c["id"])
+    normed = [_norm(c["text"]) for c in chunks]
+    rng = random.Random(seed)
+    order = list(range(len(chunks)))
+    rng.shuffle(order)
+    items: List[Dict[str, Any]] = []
+    seen_parents: Dict[str, int] = {}
+    for idx in order:
+        if len(items) >= n:
+            break
+        c = chunks[idx]
+        pid = c["meta"].get("parent_id") or c["id"].split("::chunk::")[0]
+        # spread the set across filings instead of letting the largest one dominate
+        if seen_parents.get(pid, 0) > n // 2:
+            continue
+        sentences = [s.strip() for s in _SENT.split(c["text"]) if s.strip()]
+        rng.shuffle(sentences)
+        for s in sentences:
+            q = _question_from(s)
+            if q is None:
+                continue
+            ev = _norm(q["evidence"])
+            holders = [chunks[j]["id"] for j, t in enumerate(normed) if ev in t]
+            # ambiguous phrases (boilerplate repeated across filings) make a poor known-item query
+            if not 1 <= len(holders) <= 3:
+                continue
+            items.append({"id": f"g{len(items) + 1:04d}", "question": q["question"], "evidence": q["evidence"],
+                          "parent_id": pid, "chunk_ids": holders})
+            seen_parents[pid] = seen_parents.get(pid, 0) + 1
+            break
+    _logger.info("[RetrievalQuality] bootstrapped items=%d from chunks=%d", len(items), len(chunks))
+    return items
+
+def load_golden(path: str) -> List[Dict[str, Any]]:
+    with open(path, "r", encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+# ---------------- metrics ----------------
+
+def _relevant(item: Dict[str, Any], hit: Dict[str, Any]) -> bool:
+    if item.get("evidence"):
+        return _norm(item["evidence"]) in _norm(hit.get("text"))
+    if item.get("chunk_ids"):
+        return hit.get("id") in item["chunk_ids"]
+    return hit.get("parent_id") in (item.get("parent_ids") or [item.get("parent_id")])
+
+def judge(item: Dict[str, Any], hits: List[Dict[str, Any]]) -> Tuple[List[bool], int]:
+    """Relevance of each ranked hit and the item's number of relevant units (chunks, or parents for parent-only items).
+    A unit counts once: later hits of the same chunk / parent are not relevant again."""
+    by_chunk = bool(item.get("evidence") or item.get("chunk_ids"))
+    n_relevant = len(item.get("chunk_ids") or []) if by_chunk else len(item.get("parent_ids") or [item.get("parent_id")])
+    seen = set()
+    rels: List[bool] = []
+    for h in hits:
+        unit = h.get("id") if by_chunk else h.get("parent_id")
+        rel = unit not in seen and _relevant(item, h)
+        if rel:
+            seen.add(unit)
+        rels.append(rel)
+    return rels, max(1, n_relevant)
+
+def score_ranking(rels: List[bool], n_relevant: int, ks: List[int]) -> Dict[str, float]:
+    out: Dict[str, float] = {}
+    first = next((i for i, r in enumerate(rels) if r), None)
+    for k in ks:
+        # capped: an evidence phrase can turn up in more chunks than the golden set listed
+        out[f"recall@{k}"] = min(1.0, sum(rels[:k]) / max(1, n_relevant))
+        out[f"hit@{k}"] = 1.0 if first is not None and first < k else 0.0
+    out["mrr"] = 1.0 / (first + 1) if first is not None else 0.0
+    dcg = sum(1.0 / math.log2(i + 2) for i, r in enumerate(rels) if r)
+    ideal = sum(1.0 / math.log2(i + 2) for i in range(min(len(rels), max(1, n_relevant, sum(rels)))))
+    out["ndcg"] = dcg / ideal if ideal else 0.0
+    return out
+
+def _percentile(values: List[float], q: float) -> float:
+    if not values:
+        return 0.0
+    s = sorted(values)
+    return round(s[min(len(s) - 1, int(q * len(s)))], 2)
+
+def _dir_bytes(path: str) -> int:
+    return sum(os.path.getsize(os.path.join(root, f)) for root, _, files in os.walk(path) for f in files)
+
+def pareto(rows: List[Dict[str, Any]], maximize=("recall", "mrr"), minimize=("latency_p50_ms", "context_tokens")) -> None:
+    """Mark rows no other row beats on every axis (and strictly on one)."""
+    def dominates(a, b):
+        ge = all(a[m] >= b[m] for m in maximize) and all(a[m] <= b[m] for m in minimize)
+        gt = any(a[m] > b[m] for m in maximize) or any(a[m] < b[m] for m in minimize)
+        return ge and gt
+    for r in rows:
+        r["pareto"] = not any(dominates(o, r) for o in rows if o is not r)
+
+# ---------------- evaluation ----------------
+
+async def evaluate(golden: List[Dict[str, Any]], configs: List[Dict[str, Any]]) -> Dict[str, Any]:
+    from app.adapters.feature.react_single_agent.tool_adapters import RetrievalTools
+    from app.utils.context_packer import pack_context
+    from app.utils.snippets import extract_snippet
+
+    # embed every query once up front so configurations compare search cost, not who paid for the embedding
+    for item in golden:
+        await RetrievalTools.embed_query(item["question"])
+
+    rows: List[Dict[str, Any]] = []
+    for conf in configs:
+        n = int(conf.get("n_results", 8))
+        ks = sorted({k for k in (1, 3, 5, 10) if k < n} | {n})
+        sums: Dict[str, float] = {}
+        latencies: List[float] = []
+        tokens: List[int] = []
+        parent_hits = context_hits = 0
+        for item in golden:
+            t0 = time.perf_counter()
+            res = await RetrievalTools.vector_search(item["question"], n_results=n, where=item.get("where"),
+                                                     parent_k=conf.get("parent_k"), min_score=conf.get("min_score"))
+            latencies.append((time.perf_counter() - t0) * 1000)
+            hits = res.get("hits", [])
+            rels, n_relevant = judge(item, hits)
+            for name, v in score_ranking(rels, n_relevant, ks).items():
+                sums[name] = sums.get(name, 0.0) + v
+            expected_parents = item.get("parent_ids") or [item.get("parent_id")]
+            parent_hits += any(h.get("parent_id") in expected_parents for h in hits)
+
+            # what the synthesis call would actually see: snippets (if configured) packed to the token budget
+            snip = conf.get("snippet_chars")
+            cands = [{"id": h.get("id"), "parent_id": h.get("parent_id"), "score": h.get("score"),
+                      "text": extract_snippet(h.get("text") or "", item["question"], snip) if snip else h.get("text") or ""}
+                     for h in hits]
+            packed = pack_context(cands, budget_tokens=conf.get("context_token_budget"),
+                                  max_per_parent=conf.get("context_max_per_parent"),
+                                  dedupe_threshold=conf.get("context_dedupe_threshold"))
+            tokens.append(packed.tokens)
+            if item.get("evidence"):
+                context_hits += _norm(item["evidence"]) in _norm(" ".join(packed.texts()))
+        total = max(1, len(golden))
+        row = {"config": conf.get("name") or json.dumps(conf, sort_keys=True), "settings": conf,
+               **{k: round(v / total, 4) for k, v in sums.items()},
+               "recall": round(sums.get(f"recall@{n}", 0.0) / total, 4),
+               "hit": round(sums.get(f"hit@{n}", 0.0) / total, 4),
+               "parent_hit": round(parent_hits / total, 4),
+               "context_recall": round(context_hits / total, 4),
+               "latency_p50_ms": _percentile(latencies, 0.50),
+               "latency_p95_ms": _percentile(latencies, 0.95),
+               "context_tokens": round(sum(tokens) / total, 1)}
+        rows.append(row)
+        _logger.info("[RetrievalQuality] %s recall@%d=%.3f mrr=%.3f p50=%.1fms tokens=%.0f", row["config"], n,
+                     row["recall"], row["mrr"], row["latency_p50_ms"], row["context_tokens"])
+    pareto(rows)
+    from app.config.vector_db_client import VectorDBClient
+    return {
+        "timestamp": datetime.datetime.utcnow().strftime("%Y-%m-%dT%H:%M:%SZ"),
+        "golden_items": len(golden),
+        "index": {"chroma_dir": _cfg.chroma_dir, "chunks": VectorDBClient().count(), "disk_bytes": _dir_bytes(_cfg.chroma_dir)},
+        "results": rows,
+    }
+
+# ---------------- CLI ----------------
+
+def _print_rows(report: Dict[str, Any]) -> None:
+    cols = ("recall", "hit", "mrr", "ndcg", "parent_hit", "context_recall", "latency_p50_ms", "latency_p95_ms", "context_tokens")
+    print(f"{'config':22} " + " ".join(f"{c:>14}" for c in cols) + "  pareto")
+    for r in report["results"]:
+        print(f"{r['config']:22} " + " ".join(f"{r[c]:14.3f}" for c in cols) + ("  *" if r["pareto"] else ""))
+    idx = report["index"]
+    print(f"index: {idx['chunks']} chunks, {idx['disk_bytes'] / 1e6:.1f} MB at {idx['chroma_dir']}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Retrieval quality vs cost harness.")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    b = sub.add_parser("bootstrap", help="build a golden set from the indexed filings")
+    b.add_argument("--n", type=int, default=200)
+    b.add_argument("--seed", type=int, default=0)
+    b.add_argument("--out", default=GOLDEN_PATH)
+    b.add_argument("--chroma-dir", help="index to sample (default: the configured chroma_dir)")
+    e = sub.add_parser("evaluate", help="score retrieval configurations against a golden set")
+    e.add_argument("--golden", default=GOLDEN_PATH)
+    e.add_argument("--configs", help="JSON list of configurations (default: built-in top_k / two-stage / budget grid)")
+    e.add_argument("--chroma-dir", help="evaluate another index, e.g. one built with a different chunk size")
+    e.add_argument("--out", help="report JSON (default EVAL_OUTPUT_DIR/retrieval_quality-<timestamp>.json)")
+    args = parser.parse_args()
+    if args.chroma_dir:
+        _cfg.chroma_dir = args.chroma_dir
+
+    if args.cmd == "bootstrap":
+        items = bootstrap(args.n, args.seed)
+        os.makedirs(os.path.dirname(os.path.abspath(args.out)), exist_ok=True)
+        with open(args.out, "w", encoding="utf-8") as f:
+            f.writelines(json.dumps(i, ensure_ascii=False) + "\n" for i in items)
+        print(f"{len(items)} golden items -> {args.out}")
+    else:
+        configs = DEFAULT_CONFIGS
+        if args.configs:
+            with open(args.configs, "r", encoding="utf-8") as f:
+                configs = json.load(f)
+        report = asyncio.run(evaluate(load_golden(args.golden), configs))
+        out = args.out or os.path.join(_cfg.eval_output_dir,
+                                       f"retrieval_quality-{datetime.datetime.utcnow().strftime('%Y%m%d_%H%M%S')}.json")
+        os.makedirs(os.path.dirname(os.path.abspath(out)), exist_ok=True)
+        with open(out, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        _print_rows(report)
+        print(f"report: {out}")
@@ -1,13 +1,14 @@
 from typing import Dict, Any, List
-import json
-from openai import OpenAI
+import json, asyncio, time
 from app.utils.app_logging import get_logger
 from app.config.app_config import AppConfig, AppConfigSingleton
+from app.config.llm_client import chat_completion, get_llm_client, llm_timeout
 from app.adapters.feature.fin_analysis_agent.tool_adapters import RetrievalTools
+from app.utils.snippets import extract_snippet
+from app.utils import metrics, tracing
 
 cfg = AppConfigSingleton.instance()
 logger = get_logger(cfg)
-client = OpenAI(api_key=cfg.openai_api_key, base_url=cfg.openai_base_url)
 model = cfg.openai_llm_model
 
 FUNCTIONS: List[Dict[str, Any]] = [
@@ -59,73 +60,132 @@ def _call_tool(name: str, arguments: Dict[str, Any]) -> Dict[str, Any]:
         return RetrievalTools.get_chunk(**arguments)
     return {"error": f"unknown tool {name}"}
 
+async def _run_tool(name: str, arguments: Dict[str, Any]) -> Dict[str, Any]:
+    # the worker thread can't be interrupted; on timeout the model gets an error and the thread finishes in the background
+    with tracing.span("tool.call", tool=name, k=arguments.get("n_results")) as sp:
+        try:
+            return await asyncio.wait_for(asyncio.to_thread(_call_tool, name, arguments), timeout=cfg.functions_tool_timeout_sec)
+        except asyncio.TimeoutError:
+            logger.warning("[FunctionsV2] tool %s timed out after %.1fs", name, cfg.functions_tool_timeout_sec)
+            tracing.set_attributes(sp, error="timeout")
+            return {"error": f"{name} timed out"}
+        except Exception as e:
+            logger.warning("[FunctionsV2] tool %s failed: %s", name, e)
+            tracing.set_attributes(sp, error=e.__class__.__name__)
+            return {"error": f"{e.__class__.__name__}: {e}"}
+
+def _compact(name: str, arguments: Dict[str, Any], result: Dict[str, Any], question: str) -> Dict[str, Any]:
+    """Only what the model needs to answer and cite: id, parent_id and a query-centred snippet."""
+    if "error" in result:
+        return {"error": result["error"]}
+    limit = cfg.functions_tool_snippet_chars
+    snip = lambda text, query: " ".join(extract_snippet(text or "", query, limit).split())
+    if name == "vector_search":
+        query = arguments.get("query") or question
+        return {"hits": [{"id": h.get("id"), "parent_id": h.get("parent_id"),
+                          "snippet": snip(h.get("text"), query)} for h in result.get("hits", [])]}
+    if name == "get_chunk":
+        if not result.get("found"):
+            return {"id": result.get("id"), "found": False}
+        meta = result.get("metadata") or {}
+        return {"id": result.get("id"), "parent_id": meta.get("parent_id") or str(result.get("id", "")).split("::chunk::")[0],
+                "snippet": snip(result.get("text"), question)}
+    return result
+
+def _to_json(obj: Any) -> str:
+    return json.dumps(obj, separators=(",", ":"), ensure_ascii=False, default=str)
+
+def _collect_citations(name: str, result: Dict[str, Any], citations: List[str]) -> None:
+    if name == "vector_search":
+        pids = [h.get("parent_id") for h in result.get("hits", [])[:3]]
+    elif name == "get_chunk":
+        pids = [(result.get("metadata") or {}).get("parent_id")]
+    else:
+        pids = []
+    for pid in pids:
+        if pid and pid not in citations:
+            citations.append(pid)
+
 class FunctionCalling:
-    def run(self, question: str) -> Dict[str, Any]:
+    @metrics.agent_run()
+    @tracing.traced("functions_calling.run")
+    async def run(self, question: str) -> Dict[str, Any]:
         logger.info("[FunctionsV2] begin q='%s'", question)
+        client = get_llm_client()
+        if client is None:
+            raise RuntimeError("LLM client not initialized; set OPENAI_API_KEY/base_url/model.")
         messages: List[Dict[str, Any]] = [
             {"role": "system", "content": "You are a structured financial assistant. Use functions when available."},
             {"role": "user", "content": f"Question: {question}"}
         ]
-
-        # First model turn permitting function calls
-        first = client.chat.completions.create(
-            model=model,
-            messages=messages,
-            tools=[{"type": "function", "function": f} for f in FUNCTIONS],
-            tool_choice="auto",
-            temperature=0.2,
-            top_p=1.0,
-            max_tokens=256
-        )
+        tools = [{"type": "function", "function": f} for f in FUNCTIONS]
 
         tool_results: List[Dict[str, Any]] = []
         citations: List[str] = []
+        answer = None
+        rounds = 0
 
-        # Append the assistant message that requested tools (required for pairing)
-        assistant_msg = first.choices[0].message
-        messages.append({"role": "assistant", "content": assistant_msg.content or "", "tool_calls": assistant_msg.tool_calls or []})
-
-        # For each tool_call in this assistant message, execute and append a paired tool message
-        for tc in assistant_msg.tool_calls or []:
-            name = tc.function.name
-            raw_args = tc.function.arguments
-            args = _to_kwargs(raw_args)
-            logger.info("[FunctionsV2] tool_call name=%s args=%s", name, args)
+        # Tool rounds: the model may call tools again after seeing results, up to functions_max_tool_rounds
+        for rounds in range(1, max(1, cfg.functions_max_tool_rounds) + 1):
+            resp = await chat_completion(
+                client,
+                model=model,
+                messages=messages,
+                tools=tools,
+                tool_choice="auto",
+                temperature=0.2,
+                top_p=1.0,
+                max_tokens=256,
+                timeout=llm_timeout()
+            )
+            choice = resp.choices[0]
+            calls = choice.message.tool_calls or []
+            if not calls:
+                # answered without (further) tools; only re-ask when the reply was cut by the tool-turn token cap
+                if choice.finish_reason != "length":
+                    answer = choice.message.content or ""
+                break
 
-            result = _call_tool(name, args)
-            tool_results.append({"name": name, "args": args, "result_keys": list(result.keys())})
+            # Append the assistant message that requested tools (required for pairing)
+            messages.append({"role": "assistant", "content": choice.message.content or "",
+                             "tool_calls": [tc.model_dump(exclude_none=True) for tc in calls]})
 
-            if name == "vector_search":
-                for h in result.get("hits", [])[:3]:
-                    pid = h.get("parent_id")
-                    if pid and pid not in citations:
-                        citations.append(pid)
-            elif name == "get_chunk":
-                meta = result.get("metadata", {})
-                pid = meta.get("parent_id")
-                if pid and pid not in citations:
-                    citations.append(pid)
+            # All tool calls of this turn run concurrently; results come back in call order
+            parsed = [(tc, tc.function.name, _to_kwargs(tc.function.arguments)) for tc in calls]
+            logger.info("[FunctionsV2] round=%d tool_calls=%s", rounds, [(name, args) for _, name, args in parsed])
+            t0 = time.perf_counter()
+            results = await asyncio.gather(*(_run_tool(name, args) for _, name, args in parsed))
+            elapsed_ms = round((time.perf_counter() - t0) * 1000, 2)
 
-            messages.append({
-                "role": "tool",
-                "tool_call_id": tc.id,
-                "name": name,
-                "content": str(result)[:3500]
-            })
+            for (tc, name, args), result in zip(parsed, results):
+                tool_results.append({"round": rounds, "name": name, "args": args, "result_keys": list(result.keys()),
+                                     "error": result.get("error")})
+                _collect_citations(name, result, citations)
+                messages.append({
+                    "role": "tool",
+                    "tool_call_id": tc.id,
+                    "name": name,
+                    "content": _to_json(_compact(name, args, result, question))
+                })
+            logger.info("[FunctionsV2] round=%d tools=%d elapsed_ms=%.1f", rounds, len(parsed), elapsed_ms)
 
-        # Final answer turn (now that tool messages are paired with the assistant that called them)
-        final = client.chat.completions.create(
-            model=model,
-            messages=messages,
-            temperature=0.2,
-            top_p=1.0,
-            max_tokens=512
-        )
-        answer = final.choices[0].message.content or ""
-        logger.info("[FunctionsV2] done citations=%s", citations[:3])
+        if answer is None:
+            # Final answer turn without tools (rounds exhausted, or the direct reply was truncated)
+            final = await chat_completion(
+                client,
+                model=model,
+                messages=messages,
+                temperature=0.2,
+                top_p=1.0,
+                max_tokens=512,
+                timeout=llm_timeout()
+            )
+            answer = final.choices[0].message.content or ""
+        logger.info("[FunctionsV2] done rounds=%d citations=%s", rounds, citations[:3])
         return {
             "question": question,
             "answer": answer,
             "citations": citations[:5],
-            "tool_results": tool_results
+            "tool_results": tool_results,
+            "tool_rounds": rounds
         }
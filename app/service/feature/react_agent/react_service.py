@@ -1,8 +1,10 @@
 from typing import Dict, Any, List
-import time
-from openai import OpenAI
+import time, asyncio
 from app.utils.app_logging import get_logger
 from app.config.app_config import AppConfig, AppConfigSingleton
+from app.config.llm_client import chat_completion, get_llm_client, llm_timeout
+from app.utils.context_packer import pack_context
+from app.utils import metrics, tracing
 from app.adapters.feature.fin_analysis_agent.tool_adapters import RetrievalTools
 from app.prompts.feature.fin_analysis_agent import fin_analysis_agent_react_prompt
 from app.prompts.registry.prompt_registry import PromptRegistry, PromptBundle
@@ -10,8 +12,7 @@ from app.prompts.registry.prompt_registry import PromptRegistry, PromptBundle
 cfg = AppConfigSingleton.instance()
 logger = get_logger(cfg)
 
-# Reuse singleton OpenAI client/model from config
-client = OpenAI(api_key=cfg.openai_api_key, base_url=cfg.openai_base_url)
+# Shared AsyncOpenAI client (app.config.llm_client); model from config
 model = cfg.openai_llm_model
 
 registry = PromptRegistry(
@@ -27,10 +28,15 @@ class ReactAgent:
     def __init__(self, max_steps: int = 4):
         self.max_steps = max_steps
 
-    def run(self, question: str) -> Dict[str, Any]:
+    @metrics.agent_run()
+    @tracing.traced("react_agent.run")
+    async def run(self, question: str) -> Dict[str, Any]:
         logger.info("[ReActV2] begin q='%s'", question)
+        client = get_llm_client()
+        if client is None:
+            raise RuntimeError("LLM client not initialized; set OPENAI_API_KEY/base_url/model.")
         traces: List[Dict[str, Any]] = []
-        context_notes: List[str] = []
+        context_notes: List[Dict[str, Any]] = []
         citations: List[str] = []
 
         # Seed messages
@@ -42,8 +48,8 @@ class ReactAgent:
         for step in range(self.max_steps):
             # Ask the model what to do next (no tools here; we parse its suggestion)
             start = time.perf_counter()
-            resp = client.chat.completions.create(
-                model=model, messages=messages, temperature=0.2, top_p=1.0, max_tokens=256
+            resp = await chat_completion(
+                client, model=model, messages=messages, temperature=0.2, top_p=1.0, max_tokens=256, timeout=llm_timeout()
             )
             thought = resp.choices[0].message.content or ""
             traces.append({"step": step+1, "thought": thought})
@@ -67,18 +73,18 @@ class ReactAgent:
                         args["parent_id"] = token.strip("[](),.")
                         break
                 args.setdefault("parent_id", "tesla-2023")
-                result = RetrievalTools.index_lookup(**args)
+                result = await asyncio.to_thread(RetrievalTools.index_lookup, **args)
             elif action == "get_chunk":
                 for token in thought.split():
                     if "::chunk::" in token:
                         args["id"] = token.strip("[](),.")
                         break
                 args.setdefault("id", "tesla-2023::chunk::0000")
-                result = RetrievalTools.get_chunk(**args)
+                result = await asyncio.to_thread(RetrievalTools.get_chunk, **args)
             else:
                 args["query"] = question
                 args["n_results"] = 5
-                result = RetrievalTools.vector_search(**args)
+                result = await asyncio.to_thread(RetrievalTools.vector_search, **args)
 
             traces[-1]["action"] = {"name": action, "args": args}
             traces[-1]["observation"] = {"summary": f"keys={list(result.keys())}", "n_hits": len(result.get("hits", [])) if isinstance(result.get("hits"), list) else 1}
@@ -86,13 +92,13 @@ class ReactAgent:
             # Collect small context from hits or chunk
             if action == "vector_search":
                 for h in result.get("hits", [])[:3]:
-                    context_notes.append(h.get("text","")[:400])
+                    context_notes.append({"id": h.get("id"), "parent_id": h.get("parent_id"), "text": h.get("text", ""), "score": h.get("score")})
                     pid = h.get("parent_id")
                     if pid and pid not in citations:
                         citations.append(pid)
             elif action == "get_chunk" and result.get("found"):
-                context_notes.append(result.get("text","")[:600])
                 meta = result.get("metadata", {})
+                context_notes.append({"id": result.get("id"), "parent_id": meta.get("parent_id"), "text": result.get("text", "")})
                 pid = meta.get("parent_id")
                 if pid and pid not in citations:
                     citations.append(pid)
@@ -105,12 +111,14 @@ class ReactAgent:
             messages.append({"role":"assistant", "content": thought})
             messages.append({"role":"user", "content": f"Observation: received {traces[-1]['observation']}. Continue."})
 
-        # Final answer with gathered notes
+        # Final answer with gathered notes, packed to the context token budget
+        packed = pack_context(context_notes)
         final_messages = [
             {"role":"system", "content": registry.react.system},
-            {"role":"user", "content": f"{registry.react.user_template.format(question=question)}\n\nContext:\n" + "\n---\n".join(context_notes)}
+            {"role":"user", "content": f"{registry.react.user_template.format(question=question)}\n\nContext:\n" + "\n---\n".join(packed.texts())}
         ]
-        final_resp = client.chat.completions.create(model=model, messages=final_messages, temperature=0.2, top_p=1.0, max_tokens=512)
+        final_resp = await chat_completion(client, model=model, messages=final_messages, temperature=0.2, top_p=1.0,
+                                           max_tokens=512, timeout=llm_timeout())
         answer = final_resp.choices[0].message.content or ""
         logger.info("[ReActV2] done citations=%s", citations[:3])
         return {"question": question, "answer": answer, "citations": citations[:5], "traces": traces}
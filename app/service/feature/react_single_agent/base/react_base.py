@@ -1,13 +1,31 @@
-from typing import List, Dict, Any, Optional, Tuple
-import time, uuid, datetime, re, asyncio
+from typing import List, Dict, Any, Optional, Tuple, Callable, Awaitable
+import time, uuid, datetime, re, asyncio, hashlib, json, copy
 from app.config.app_config import AppConfigSingleton
 from app.utils.app_logging import get_logger
 from app.adapters.feature.react_single_agent.tool_adapters import RetrievalTools
 from app.service.variants.variant_output_score_service import VariantOutputScoreService
+from app.utils.event_stream import EventStream, emit
+from app.utils.deadline import Deadline, StageTimings
+from app.utils.single_flight import SingleFlight
+from app.utils.context_packer import pack_context
+from app.service.cache.answer_cache import answer_cache, exact_key, semantic_scope
+from app.utils import memory, metrics, tracing
 
 _cfg = AppConfigSingleton.instance()
 _logger = get_logger(_cfg)
 
+# Identical concurrent /ask requests (same agent, question and every param that shapes the response) share one run
+agent_flights = SingleFlight()
+memory.register("agent_flights", agent_flights.memory_info)
+_COALESCE_PARAMS = ("scoring_model", "enable_query_variants", "enable_output_scoring", "max_variants",
+                    "self_reflection_iterations", "preferred_year", "top_k", "retrieval_filters", "min_score", "execution_mode",
+                    "deadline_ms", "emit_traces", "agent_graph_id", "agent_descriptor")
+SINGLE_FLIGHT_RUNS = metrics.registry.counter("rag_agent_single_flight_total",
+                                              "Coalescable agent runs by role (leader ran it, coalesced shared it).",
+                                              ("endpoint", "agent", "role"))
+metrics.registry.gauge("rag_agent_single_flight_state", "Agent runs in flight and callers waiting on them.", ("field",),
+                       fn=lambda: {(k,): v for k, v in agent_flights.info().items() if k in ("in_flight", "waiting")})
+
 class AgentError(RuntimeError):
     def __init__(self, code: str, http_status: int, message: str, details: Dict[str, Any] = None):
         super().__init__(message)
@@ -80,10 +98,78 @@ def _extract_parent_ids(text: str) -> List[str]:
 def _contains_placeholder_pid(text: str) -> bool:
     return "[parent-id]" in (text or "")
 
+def _coalesce_key(agent_name: str, run_kwargs: Dict[str, Any]) -> str:
+    question = _normalize_whitespace(run_kwargs.get("question") or "").lower().rstrip("?.! ")
+    params = {p: run_kwargs.get(p) for p in _COALESCE_PARAMS}
+    raw = json.dumps([agent_name, question, params], sort_keys=True, default=str)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+class _Scoreboard:
+    """
+    Best score per variant, shared by the variant tasks of one run. A variant that is still open (more loops to go)
+    could at most reach max_score; once the leader's score is out of reach for every other open variant, those tasks
+    are cancelled, which also aborts their in-flight LLM calls.
+    """
+    def __init__(self, max_score: Optional[float]):
+        self.max_score = max_score
+        self.best: Dict[str, float] = {}
+        self.open: set = set()
+        self.tasks: Dict[str, asyncio.Task] = {}
+        self.cancelled: Dict[str, Dict[str, Any]] = {}
+
+    def register(self, variant_id: str, task: Optional[asyncio.Task] = None) -> None:
+        self.open.add(variant_id)
+        if task is not None:
+            self.tasks[variant_id] = task
+
+    def leader(self) -> Optional[Tuple[str, float]]:
+        if not self.best:
+            return None
+        vid = max(self.best, key=self.best.get)
+        return vid, self.best[vid]
+
+    def can_still_win(self, variant_id: str) -> bool:
+        lead = self.leader()
+        if self.max_score is None or lead is None or lead[0] == variant_id:
+            return True
+        ceiling = self.max_score if variant_id in self.open else self.best.get(variant_id, 0.0)
+        return ceiling > lead[1]
+
+    def report(self, variant_id: str, score: Optional[float], still_open: bool) -> None:
+        if score is not None:
+            self.best[variant_id] = max(score, self.best.get(variant_id, score))
+        if not still_open:
+            self.open.discard(variant_id)
+        lead = self.leader()
+        if lead is None:
+            return
+        for vid, task in self.tasks.items():
+            if vid != lead[0] and not task.done() and vid not in self.cancelled and not self.can_still_win(vid):
+                self.cancelled[vid] = {"reason": "leader_unbeatable", "leader": lead[0], "leader_score": lead[1]}
+                task.cancel()
+
 class ReactBaseAgent:
     def __init__(self, max_steps: int = 4):
         self.max_steps = max_steps
 
+    async def run_coalesced(self, **run_kwargs: Any) -> Dict[str, Any]:
+        """
+        run() behind single-flight: concurrent duplicates await the in-flight run and get their own copy of its result
+        (coalesced=True). Only callers with the same deadline_ms budget and trace/graph params share a run; event streams
+        are per request, so only plain /ask calls go through here.
+        """
+        if not _cfg.feature_flags.get("agent_single_flight"):
+            return await self.run(**run_kwargs)
+        key = _coalesce_key(self.__class__.__name__, run_kwargs)
+        out, shared = await agent_flights.do(key, lambda: self.run(**run_kwargs))
+        SINGLE_FLIGHT_RUNS.inc(endpoint=metrics.current_labels()["endpoint"], agent=self.__class__.__name__, role="coalesced" if shared else "leader")
+        if shared:
+            out = copy.deepcopy(out)
+            _logger.info("[SingleFlight] coalesced run_id=%s", out.get("run_id"))
+        return {**out, "coalesced": shared}
+
+    @metrics.agent_run()
+    @tracing.traced("agent.run")
     async def run(
             self,
             question: str,
@@ -98,25 +184,39 @@ class ReactBaseAgent:
             execution_mode: str = "async",
             preferred_year: Optional[str] = None,
             top_k: Optional[int] = None,
-            retrieval_filters: Optional[Dict[str, Any]] = None
+            retrieval_filters: Optional[Dict[str, Any]] = None,
+            min_score: Optional[float] = None,
+            deadline_ms: Optional[float] = None,
+            events: Optional[EventStream] = None
     ) -> Dict[str, Any]:
         t0 = time.time()
+        deadline = Deadline(deadline_ms if deadline_ms is not None else _cfg.agent_deadline_ms)
+        timings = StageTimings()
         run_id = f"react_{datetime.datetime.utcnow().strftime('%Y%m%d_%H%M%S')}_{uuid.uuid4().hex[:4]}"
+        tracing.annotate(run_id=run_id, agent=self.__class__.__name__, question=question[:200], execution_mode=execution_mode)
 
         k = top_k if top_k is not None else getattr(_cfg, "rag_top_k", 5)
         do_variants = enable_query_variants if enable_query_variants is not None else getattr(_cfg, "rag_enable_query_variants", True)
         loops = self_reflection_iterations if self_reflection_iterations is not None else getattr(_cfg, "rag_self_reflection_iterations", 3)
+        min_sc = min_score if min_score is not None else _cfg.rag_min_score
 
         # Build variants list (original + optional paraphrases via service if enabled)
         variants = [question]
+        if do_variants and deadline.below(_cfg.agent_variants_min_ms):
+            # not enough budget to fan out: answer the original question only
+            deadline.note("variants", "skipped", requested=max_variants)
+            do_variants = False
         if do_variants:
-            try:
-                from app.service.variants.query_variants_service import QueryVariantsService
-                for v in QueryVariantsService.generate(question, max_variants=max_variants):
-                    if v not in variants:
-                        variants.append(v)
-            except Exception as e:
-                _logger.warning("[Variants] generation disabled due to error: %s", e)
+            with timings.measure("variant_generation"):
+                try:
+                    from app.service.variants.query_variants_service import QueryVariantsService
+                    for v in QueryVariantsService.generate(question, max_variants=max_variants):
+                        if v not in variants:
+                            variants.append(v)
+                except Exception as e:
+                    _logger.warning("[Variants] generation disabled due to error: %s", e)
+
+        tracing.annotate(k=k, variants=len(variants), loops=loops, deadline_ms=deadline.budget_ms)
 
         # Persist decomposition per variant
         all_variant_meta: Dict[str, Dict[str, Any]] = {}
@@ -129,19 +229,73 @@ class ReactBaseAgent:
             all_variant_meta[v] = {
                 "sub_questions": subs,                  # <- persist here
                 "data_source_routing": routes,          # <- and here
-                "where": where
+                "where": where,
+                "min_score": min_sc
             }
 
+        await emit(events, "run_started", run_id=run_id, variants=[f"v{i}" for i in range(1, len(variants) + 1)])
+
+        scoreboard = _Scoreboard(VariantOutputScoreService.MAX_SCORE if enable_output_scoring else None)
+        partial: Dict[str, List[Dict[str, Any]]] = {f"v{i}": [] for i in range(1, len(variants) + 1)}
+
         async def _task(idx_v: int, vq: str):
-            meta = all_variant_meta.get(vq, {"sub_questions": [], "data_source_routing": [], "where": {}})
+            meta = all_variant_meta.get(vq, {"sub_questions": [], "data_source_routing": [], "where": {}, "min_score": min_sc})
             return await self._process_variant(
-                vq, idx_v, scoring_model, enable_output_scoring, loops, emit_traces, meta, k
+                vq, idx_v, scoring_model, enable_output_scoring, loops, emit_traces, meta, k, events=events,
+                scoreboard=scoreboard, iterations=partial[f"v{idx_v}"], deadline=deadline
             )
 
-        if execution_mode == "async":
-            results = await asyncio.gather(*[_task(i, v) for i, v in enumerate(variants, start=1)])
-        else:
-            results = [await _task(i, v) for i, v in enumerate(variants, start=1)]
+        outcomes: Dict[str, Optional[Dict[str, Any]]] = {}
+        timed_out = False
+        try:
+            # whatever is unfinished when the deadline hits is cancelled; the best loop so far still answers
+            async with asyncio.timeout(deadline.cap(None, reserve_s=0.1)):
+                if execution_mode == "async":
+                    try:
+                        async with asyncio.TaskGroup() as tg:
+                            for i, v in enumerate(variants, start=1):
+                                scoreboard.register(f"v{i}", tg.create_task(_task(i, v)))
+                    except BaseExceptionGroup as eg:
+                        # keep the single-error contract callers had with gather()
+                        raise eg.exceptions[0]
+                else:
+                    for i in range(1, len(variants) + 1):
+                        scoreboard.register(f"v{i}")
+                    for i, v in enumerate(variants, start=1):
+                        vid = f"v{i}"
+                        if not scoreboard.can_still_win(vid):
+                            lead = scoreboard.leader()
+                            scoreboard.cancelled[vid] = {"reason": "leader_unbeatable", "leader": lead[0], "leader_score": lead[1]}
+                            outcomes[vid] = None
+                            continue
+                        outcomes[vid] = await _task(i, v)
+        except TimeoutError:
+            timed_out = True
+            for i in range(1, len(variants) + 1):
+                if outcomes.get(f"v{i}") is None and f"v{i}" not in scoreboard.cancelled:
+                    scoreboard.cancelled[f"v{i}"] = {"reason": "deadline"}
+            deadline.note("variants", "cancelled_at_deadline", variants=sorted(scoreboard.cancelled))
+        for vid, task in scoreboard.tasks.items():
+            outcomes[vid] = None if task.cancelled() else task.result()
+
+        results: List[Dict[str, Any]] = []
+        for i, v in enumerate(variants, start=1):
+            vid = f"v{i}"
+            if outcomes.get(vid) is not None:
+                results.append(outcomes[vid])
+                continue
+            its = partial[vid]
+            scored = [it["actual_score"] for it in its if it.get("actual_score") is not None]
+            results.append({
+                "variant_id": vid,
+                "query_variant": v,
+                "iterations": its,
+                "variant_score": {"candidate_id": f"{self.__class__.__name__}-cand-{vid}", "actual_score": max(scored) if scored else None},
+                "cancelled": scoreboard.cancelled.get(vid, {"reason": "cancelled"}),
+                "loops_run": len(its),
+                "loops_saved": max(0, loops - len(its))
+            })
+            await emit(events, "variant_cancelled", variant_id=vid, **scoreboard.cancelled.get(vid, {}))
 
         # Select best by score then citations then recency
         best = None
@@ -160,6 +314,9 @@ class ReactBaseAgent:
                 if curr_cites > prev_cites or (curr_cites == prev_cites and curr_best_loop["iteration"] > prev_best_loop["iteration"]):
                     best = r
 
+        if (not best or not best.get("iterations")) and timed_out:
+            raise AgentError("DEADLINE_EXCEEDED", 504, "No candidate answer finished within the request deadline.",
+                             {"deadline": deadline.report()})
         if not best or not best.get("iterations"):
             raise AgentError("RETRIEVAL_EMPTY", 404, "No candidates produced; filters may be too strict.", {"top_k": k, "filters": retrieval_filters or {}})
 
@@ -186,7 +343,17 @@ class ReactBaseAgent:
         completion_tokens = sum((it.get("llm_call", {}).get("usage", {}).get("completion_tokens", 0) for it in best["iterations"]))
         total_tokens = prompt_tokens + completion_tokens
 
+        cache_counts = {"exact": 0, "semantic": 0, "miss": 0}
+        for r in results:
+            for it in r.get("iterations", []):
+                timings.merge(it.get("timings_ms"))
+                tier = (it.get("llm_call") or {}).get("cache")
+                if tier in cache_counts:
+                    cache_counts[tier] += 1
+
         elapsed = int((time.time() - t0) * 1000)
+        tracing.annotate(selected_variant_id=best.get("variant_id"), selected_score=best.get("variant_score", {}).get("actual_score"),
+                         total_tokens=total_tokens, cache_hits=cache_counts["exact"] + cache_counts["semantic"])
         return {
             "run_id": run_id,
             "agent_graph_id": agent_graph_id,
@@ -208,10 +375,16 @@ class ReactBaseAgent:
                 "completion_tokens": completion_tokens,
                 "total_tokens": total_tokens
             },
-            "cache_hit": False,
+            "cache_hit": (best_loop.get("llm_call") or {}).get("cache") in ("exact", "semantic"),
+            "cache": cache_counts,
+            "loops_saved": sum(r.get("loops_saved", 0) for r in results),
+            "variants_cancelled": [r["variant_id"] for r in results if r.get("cancelled")],
+            "stage_timings_ms": {**timings.as_dict(), "total": elapsed},
+            "deadline": deadline.report(),
             "error_info": None
         }
 
+    @tracing.traced("agent.variant")
     async def _process_variant(
             self,
             variant_query: str,
@@ -221,87 +394,187 @@ class ReactBaseAgent:
             self_reflection_iterations: int,
             emit_traces: bool,
             variant_meta: Dict[str, Any],
-            top_k: int
+            top_k: int,
+            events: Optional[EventStream] = None,
+            scoreboard: Optional[_Scoreboard] = None,
+            iterations: Optional[List[Dict[str, Any]]] = None,
+            deadline: Optional[Deadline] = None
     ) -> Dict[str, Any]:
         variant_id = f"v{index}"
-        iterations: List[Dict[str, Any]] = []
+        # caller-owned list, so a cancelled variant still reports the loops it finished
+        iterations = iterations if iterations is not None else []
         citations: List[str] = []
         context_notes: List[str] = []
+        context_candidates: List[Dict[str, Any]] = []
         subs = variant_meta.get("sub_questions", [])  # <- persist into variant output
         routes = variant_meta.get("data_source_routing", [])
         where = variant_meta.get("where") or {}
+        min_score = variant_meta.get("min_score")
+        early_exit: Optional[Dict[str, Any]] = None
+        # grounded scoring compares answer sentences with the stored vectors of the chunks put in context
+        grounded = enable_output_scoring and scoring_model == VariantOutputScoreService.GROUNDED_V1
+        chunk_vectors: Dict[str, Any] = {}
+        best_loop_score: Optional[float] = None
+        prev_fingerprint: Optional[str] = None
+        # Loop N searches each sub-question with N * top_k results and adds the best hits not already in context,
+        # so a refinement loop sees new evidence; the memo covers sub-questions repeated within a variant
+        search_memo: Dict[Tuple[str, int], Dict[str, Any]] = {}
 
         # Build a retrieval plan that tries each sub-question first, then the full query
         subq_order = subs[:] if subs else []
         if variant_query not in subq_order:
             subq_order.append(variant_query)
 
+        # Two-stage retrieval narrows the chunk search to the top parents from the parent summary index
+        parent_k = _cfg.rag_parent_top_k if _cfg.feature_flags.get("parent_two_stage_retrieval") else None
+        tracing.annotate(variant_id=variant_id, sub_questions=len(subq_order), parent_k=parent_k)
+        await emit(events, "variant_started", variant_id=variant_id, query_variant=variant_query, sub_questions=subs)
+
         for loop in range(1, self_reflection_iterations + 1):
-            completed_hits = 0
-            loop_parent_ids: List[str] = []
-            loop_plan: List[Dict[str, Any]] = []
-
-            for sq in subq_order:
-                result = await self.execute_action("vector_search", {"query": sq, "n_results": top_k, "where": where})
-                hits = result.get("hits", [])
-                stage = result.get("stage", "none")
-                top_parents = []
-                for h in hits[:3]:
-                    pid = h.get("parent_id")
-                    if pid and pid not in top_parents:
-                        top_parents.append(pid)
-                        if pid not in citations:
-                            citations.append(pid)
-                        if pid not in loop_parent_ids:
-                            loop_parent_ids.append(pid)
-                    txt = (h.get("text") or "")[:1000]
-                    if txt and txt not in context_notes:
-                        context_notes.append(txt)
-
-                loop_plan.append({
-                    "query": sq,
-                    "hits": len(hits),
-                    "stage": stage,
-                    "top_parent_ids": top_parents,
-                    "action": "vector_search",
-                    "tool_name": "retrieval.vector_search",
-                    "source_name": "vector_db",
-                    "tool_latency_ms": result.get("latency_ms")
+            if loop > 1 and deadline is not None and deadline.below(_cfg.agent_loop_min_ms):
+                deadline.note("loop", "skipped", variant_id=variant_id, loop=loop)
+                early_exit = {"loop": loop, "reason": "deadline"}
+                break
+            with tracing.span("agent.loop", variant_id=variant_id, loop=loop) as loop_span:
+                loop_timings = StageTimings()
+                completed_hits = 0
+                loop_parent_ids: List[str] = []
+                loop_plan: List[Dict[str, Any]] = []
+                loop_confident = 0
+                loop_added = 0
+                loop_k = top_k * loop
+
+                for sq in subq_order:
+                    result = search_memo.get((sq, loop_k))
+                    if result is None:
+                        with loop_timings.measure("retrieval"):
+                            result = search_memo[(sq, loop_k)] = await self.execute_action("vector_search", {
+                                "query": sq, "n_results": loop_k, "where": where, "parent_k": parent_k, "min_score": min_score,
+                                "snippet_chars": 1000, "fields": ["year", "filename"], "deadline": deadline,
+                                "include_embeddings": grounded
+                            })
+                    hits = result.get("hits", [])
+                    scores = [h.get("score") for h in hits if h.get("score") is not None]
+                    loop_confident += sum(1 for sc in scores if sc >= _cfg.rag_confident_score)
+                    await emit(events, "hits", variant_id=variant_id, loop=loop, query=sq, stage=result.get("stage", "none"),
+                               hits=[{"id": h.get("id"), "parent_id": h.get("parent_id"), "score": h.get("score"),
+                                      "text": (h.get("text") or "")[:300]} for h in hits])
+                    stage = result.get("stage", "none")
+                    top_parents = []
+                    # first loop: the top hits as ranked; later loops: the top hits the earlier loops didn't use
+                    picks = hits[:3] if loop == 1 else [h for h in hits if (h.get("text") or "") not in context_notes][:3]
+                    for h in picks:
+                        pid = h.get("parent_id")
+                        if pid and pid not in top_parents:
+                            top_parents.append(pid)
+                            if pid not in citations:
+                                citations.append(pid)
+                            if pid not in loop_parent_ids:
+                                loop_parent_ids.append(pid)
+                        txt = h.get("text") or ""
+                        if txt and txt not in context_notes:
+                            context_notes.append(txt)
+                            loop_added += 1
+                            context_candidates.append({"id": h.get("id"), "parent_id": pid, "text": txt, "score": h.get("score")})
+                            if h.get("embedding") is not None:
+                                chunk_vectors[h.get("id")] = h["embedding"]
+
+                    loop_plan.append({
+                        "query": sq,
+                        "hits": len(hits),
+                        "stage": stage,
+                        "top_parent_ids": top_parents,
+                        "candidate_parent_ids": result.get("parent_ids", []),
+                        "action": "vector_search",
+                        "tool_name": "retrieval.vector_search",
+                        "source_name": "vector_db",
+                        "tool_latency_ms": result.get("latency_ms"),
+                        "top_score": max(scores) if scores else None
+                    })
+                    completed_hits += len(hits)
+
+                    # If we already have enough parents and context (or enough high-confidence hits), stop early this loop
+                    if (len(loop_parent_ids) >= 2 and loop_added >= 3) or loop_confident >= _cfg.rag_confident_hits:
+                        break
+
+                # Whitelist header for the LLM, then the evidence packed to the token budget (stable order for prefix reuse)
+                header = "Allowed citations: " + ", ".join(f"[{c}]" for c in sorted(citations[:8]))
+                packed = pack_context(context_candidates)
+                ctx_lines = [header, *packed.texts()]
+
+                # Nothing new retrieved (corpus exhausted under these filters): another LLM call would only re-roll the answer
+                fingerprint = hashlib.sha1("\n".join(ctx_lines).encode("utf-8")).hexdigest()
+                if fingerprint == prev_fingerprint:
+                    early_exit = {"loop": loop, "reason": "context_unchanged", "skipped_llm": True}
+                    break
+                prev_fingerprint = fingerprint
+
+                on_token = None
+                if events is not None:
+                    async def on_token(delta: str, _loop: int = loop):
+                        await events.emit("token", variant_id=variant_id, loop=_loop, delta=delta)
+
+                with loop_timings.measure("llm"):
+                    answer_loop, llm_meta = await self._synthesize_cached(
+                        variant_query, {"loop_id": loop, "strict_extraction": True, "sub_questions": subs}, ctx_lines, citations,
+                        on_token=on_token, deadline=deadline, where=where
+                    )
+
+                actual_score = None
+                target_score = VariantOutputScoreService.MAX_SCORE
+                if enable_output_scoring:
+                    with loop_timings.measure("scoring"), metrics.SCORING_SECONDS.time(scoring_model=scoring_model), \
+                            tracing.span("agent.scoring", scoring_model=scoring_model) as score_span:
+                        scored = await VariantOutputScoreService.score_async(
+                            answer=answer_loop,
+                            citations=citations,
+                            scoring_model=scoring_model,
+                            allowed_ids=loop_parent_ids,
+                            question=variant_query,
+                            context=[{"id": b.get("id"), "parent_id": b.get("parent_id"), "embedding": chunk_vectors.get(b.get("id"))}
+                                     for b in packed.blocks] if grounded else None,
+                            embed_fn=RetrievalTools.embed_texts if grounded else None
+                        )
+                        actual_score = scored["score"]
+                        # judged against the target of the model that actually scored (grounded_v1 may fall back)
+                        target_score = _cfg.rag_loop_target_score if _cfg.rag_loop_target_score is not None else \
+                            VariantOutputScoreService.target_score(scored.get("scoring_model", scoring_model))
+                        tracing.set_attributes(score_span, score=actual_score, cited_ids=len(scored.get("ids_in_answer") or ()),
+                                               quoted_cites=scored.get("quoted_risk_with_cite_count"),
+                                               grounding=scored.get("grounding"), fallback_from=scored.get("fallback_from"))
+
+                iterations.append({
+                    "iteration": loop,
+                    "thought": f"Loop {loop}: multi-subq retrieval ({len(subq_order)} subqs, k={loop_k}), total_hits={completed_hits}, new_context={loop_added}",
+                    "retrieval_plan": loop_plan,
+                    "output": answer_loop,
+                    "actual_score": actual_score,
+                    "llm_call": llm_meta,
+                    "context_pack": {"tokens": packed.tokens, **packed.stats},
+                    "timings_ms": loop_timings.as_dict(),
+                    "error_info": None
                 })
-                completed_hits += len(hits)
-
-                # If we already have enough parents and context, stop early this loop
-                if len(loop_parent_ids) >= 2 and len(context_notes) >= 3:
+                tracing.set_attributes(loop_span, hits=completed_hits, context_tokens=packed.tokens, score=actual_score)
+                await emit(events, "loop_done", variant_id=variant_id, loop=loop, actual_score=actual_score)
+
+                if loop < self_reflection_iterations:
+                    stop = None
+                    if actual_score is not None and actual_score >= target_score:
+                        stop = {"reason": "score_threshold", "score": actual_score, "target": target_score}
+                    elif actual_score is not None and best_loop_score is not None and actual_score - best_loop_score < _cfg.rag_loop_min_gain:
+                        stop = {"reason": "score_plateau", "score": actual_score, "best_previous": best_loop_score}
+                    elif loop_confident >= _cfg.rag_confident_hits:
+                        # Re-running loops over the same high-confidence context adds cost without new evidence
+                        stop = {"reason": "high_confidence_hits", "confident_hits": loop_confident}
+                    if stop:
+                        early_exit = {"loop": loop, **stop}
+                if actual_score is not None:
+                    best_loop_score = actual_score if best_loop_score is None else max(best_loop_score, actual_score)
+                if scoreboard is not None:
+                    scoreboard.report(variant_id, actual_score, still_open=not early_exit and loop < self_reflection_iterations)
+                if early_exit:
                     break
 
-            # Whitelist header for the LLM
-            header = "Allowed citations: " + ", ".join(f"[{c}]" for c in citations[:8])
-            ctx_lines = [header, *context_notes[:8]]
-
-            answer_loop, llm_meta = await self.synthesize_final_with_meta(
-                variant_query, {"loop_id": loop, "strict_extraction": True, "sub_questions": subs}, ctx_lines, citations
-            )
-
-            actual_score = None
-            if enable_output_scoring:
-                actual_score = VariantOutputScoreService.score_scalar(
-                    answer=answer_loop,
-                    citations=citations,
-                    scoring_model=scoring_model,
-                    allowed_ids=loop_parent_ids,
-                    question=variant_query
-                )
-
-            iterations.append({
-                "iteration": loop,
-                "thought": f"Loop {loop}: multi-subq retrieval ({len(subq_order)} subqs), total_hits={completed_hits}",
-                "retrieval_plan": loop_plan,
-                "output": answer_loop,
-                "actual_score": actual_score,
-                "llm_call": llm_meta,
-                "error_info": None
-            })
-
         # Pick best scored loop inside variant
         scored = [it for it in iterations if it.get("actual_score") is not None]
         best_scored = max(scored, key=lambda x: x["actual_score"]) if scored else None
@@ -310,6 +583,8 @@ class ReactBaseAgent:
             "actual_score": best_scored["actual_score"] if best_scored else None
         }
 
+        tracing.annotate(loops_run=len(iterations), score=variant_score["actual_score"], early_exit=(early_exit or {}).get("reason"))
+        await emit(events, "variant_done", variant_id=variant_id, actual_score=variant_score["actual_score"])
         return {
             "variant_id": variant_id,
             "query_variant": variant_query,
@@ -318,13 +593,72 @@ class ReactBaseAgent:
             "data_source_routing": routes,         # <- persisted routing view
             "iterations": iterations,
             "variant_score": variant_score,
-            "self_reflection": {"critique": "Multi-subq retrieval with scoring", "fixes_applied": [], "passed": True}
+            "self_reflection": {"critique": "Multi-subq retrieval with scoring", "fixes_applied": [], "passed": True},
+            "early_exit": early_exit,
+            "loops_run": len(iterations),
+            "loops_saved": max(0, self_reflection_iterations - len(iterations))
         }
 
-    async def synthesize_final_with_meta(self, variant_query: str, query_context: Dict[str, Any], context_notes: List[str], citations: List[str]) -> Tuple[str, Dict[str, Any]]:
+    async def synthesize_final_with_meta(self, variant_query: str, query_context: Dict[str, Any], context_notes: List[str], citations: List[str],
+                                         on_token: Optional[Callable[[str], Awaitable[None]]] = None,
+                                         deadline: Optional[Deadline] = None) -> Tuple[str, Dict[str, Any]]:
         raise NotImplementedError
 
+    def llm_cache_identity(self) -> Dict[str, Any]:
+        """Model / prompt / temperature that, together with the context, determine the synthesis output."""
+        return {"model": self.__class__.__name__, "prompt": "", "temperature": None}
+
+    @tracing.traced("agent.synthesize")
+    async def _synthesize_cached(self, variant_query: str, query_context: Dict[str, Any], context_notes: List[str], citations: List[str],
+                                 on_token: Optional[Callable[[str], Awaitable[None]]] = None,
+                                 deadline: Optional[Deadline] = None,
+                                 where: Optional[Dict[str, Any]] = None) -> Tuple[str, Dict[str, Any]]:
+        """
+        synthesize_final_with_meta behind the answer cache. Exact tier: same model/prompt/temperature and identical context.
+        Semantic tier (first loop only, later loops exist to refine on new context): a near-identical earlier question
+        with the same years/figures and retrieval filters whose cited parents are all allowed here.
+        Cached answers report zero usage and keep the original under saved_usage.
+        """
+        tracing.annotate(loop=query_context.get("loop_id"), context_blocks=len(context_notes))
+        if not _cfg.feature_flags.get("answer_cache"):
+            return await self.synthesize_final_with_meta(variant_query, query_context, context_notes, citations, on_token=on_token,
+                                                    deadline=deadline)
+
+        ident = self.llm_cache_identity()
+        scope = semantic_scope(ident["model"], ident["prompt"], ident["temperature"], variant_query, where)
+        key = exact_key(ident["model"], ident["prompt"], variant_query + "\n" + "\n".join(context_notes), ident["temperature"])
+        hit, tier, similarity, embedding = answer_cache.get_exact(key), "exact", None, None
+        if hit is None and query_context.get("loop_id") == 1:
+            embedding = await RetrievalTools.embed_query(variant_query)
+            found = answer_cache.get_semantic(scope, embedding, citations)
+            if found:
+                (hit, similarity), tier = found, "semantic"
+
+        if hit is not None:
+            metrics.CACHE_LOOKUPS.inc(result=f"{tier}_hit", **metrics.current_labels())
+            tracing.annotate(cache=tier)
+            if on_token is not None:
+                await on_token(hit["answer"])
+            meta = dict(hit["meta"], status="cache_hit", cache=tier, saved_usage=hit["meta"].get("usage"),
+                        usage={"prompt_tokens": 0, "completion_tokens": 0})
+            if similarity is not None:
+                meta["cache_similarity"] = round(similarity, 4)
+            return hit["answer"], meta
+
+        answer_cache.record_miss()
+        metrics.CACHE_LOOKUPS.inc(result="miss", **metrics.current_labels())
+        tracing.annotate(cache="miss")
+        answer, meta = await self.synthesize_final_with_meta(variant_query, query_context, context_notes, citations, on_token=on_token,
+                                                    deadline=deadline)
+        answer_cache.put_exact(key, answer, meta, citations)
+        cited = [c for c in _extract_parent_ids(answer) if c in citations]
+        if cited:
+            if embedding is None:
+                embedding = await RetrievalTools.embed_query(variant_query)
+            answer_cache.put_semantic(scope, variant_query, embedding, answer, meta, cited)
+        return answer, dict(meta, cache="miss")
+
     async def execute_action(self, action: str, args: Dict[str, Any]) -> Dict[str, Any]:
         if action == "vector_search":
-            res = await RetrievalTools.vector_search(**args); res["latency_ms"] = res.get("latency_ms") or 0; return res
+            return await RetrievalTools.vector_search(**args)
         return {"error": f"unknown action {action}", "latency_ms": 0}
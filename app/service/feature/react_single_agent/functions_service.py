@@ -1,22 +1,24 @@
 # app/service/feature/react_single_agent/functions_service.py
-from typing import Dict, Any, Tuple, List, Optional
-import re, asyncio
-from openai import OpenAI, AuthenticationError, APIConnectionError, RateLimitError
+from typing import Dict, Any, Tuple, List, Optional, Callable, Awaitable
+import re
+from openai import AuthenticationError, APIConnectionError, RateLimitError
 from app.config.app_config import AppConfigSingleton
+from app.config.llm_client import chat_completion, get_llm_client, llm_timeout
 from app.utils.app_logging import get_logger
 from app.prompts.feature.react_single_agent import function_prompts
 from app.service.feature.react_single_agent.base.react_base import ReactBaseAgent, AgentError
 from app.utils.circuit_breaker import CircuitBreaker, with_retries_async
+from app.utils.deadline import Deadline
+from app.utils.event_stream import StreamInterrupted
 
 _cfg = AppConfigSingleton.instance()
 _logger = get_logger(_cfg)
-_client = OpenAI(api_key=_cfg.openai_api_key, base_url=_cfg.openai_base_url) if _cfg.openai_api_key else None
 _MODEL = _cfg.openai_llm_model or _cfg.openai_default_model
 
-_llm_breaker = CircuitBreaker(failure_threshold=3, recovery_time_sec=20.0)
+_llm_breaker = CircuitBreaker(failure_threshold=3, recovery_time_sec=20.0, name="react_functions_llm")
 
 def _is_retryable_llm(err: Exception) -> bool:
-    if isinstance(err, AuthenticationError):
+    if isinstance(err, (AuthenticationError, StreamInterrupted)):
         return False
     if isinstance(err, (APIConnectionError, RateLimitError)):
         return True
@@ -24,6 +26,13 @@ def _is_retryable_llm(err: Exception) -> bool:
     return "timeout" in msg or "connection" in msg or "temporarily" in msg
 
 class ReactFunctionCallingAgent(ReactBaseAgent):
+    def llm_cache_identity(self) -> Dict[str, Any]:
+        return {
+            "model": _MODEL,
+            "prompt": function_prompts.FUNCTION_SYSTEM_STRICT + "\n" + function_prompts.FUNCTION_USER_EXTRACT,
+            "temperature": getattr(_cfg, "openai_llm_temperature", 0.3)
+        }
+
     async def synthesize_final_with_meta(
             self,
             variant_query: str,
@@ -31,9 +40,12 @@ class ReactFunctionCallingAgent(ReactBaseAgent):
             context_notes: List[str],
             citations: List[str],
             temperature: Optional[float] = None,
-            max_tokens: Optional[int] = None
+            max_tokens: Optional[int] = None,
+            on_token: Optional[Callable[[str], Awaitable[None]]] = None,
+            deadline: Optional[Deadline] = None
     ) -> Tuple[str, Dict[str, Any]]:
-        if not _client:
+        client = get_llm_client()
+        if not client:
             raise AgentError("LLM_AUTH", 401, "LLM client not initialized; set OPENAI_API_KEY/base_url/model.")
 
         temp = temperature if temperature is not None else getattr(_cfg, "openai_llm_temperature", 0.3)
@@ -50,13 +62,14 @@ class ReactFunctionCallingAgent(ReactBaseAgent):
         ]
 
         async def _op():
-            return await asyncio.to_thread(
-                _client.chat.completions.create,
-                model=_MODEL, messages=messages, temperature=temp, top_p=1.0, max_tokens=max_toks
-            )
+            # each attempt gets what is left of the request deadline, capped at the normal per-call timeout
+            call_timeout = deadline.cap(_cfg.llm_request_timeout_sec) if deadline is not None else None
+            kwargs = dict(model=_MODEL, messages=messages, temperature=temp, top_p=1.0, max_tokens=max_toks,
+                          timeout=llm_timeout(call_timeout))
+            return await chat_completion(client, on_token, **kwargs)
 
         try:
-            resp = await with_retries_async(_op, _is_retryable_llm, _llm_breaker, max_attempts=3, base_backoff=0.4)
+            resp = await with_retries_async(_op, _is_retryable_llm, _llm_breaker, max_attempts=3, base_backoff=0.4, deadline=deadline)
         except AuthenticationError as e:
             raise AgentError("LLM_AUTH", 401, f"Authentication failed: {str(e)}")
         except RateLimitError as e:
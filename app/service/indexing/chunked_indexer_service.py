@@ -1,27 +1,106 @@
 # app/service/chunked_indexer_service.py
-from typing import List, Dict, Any
+from pathlib import Path
+from typing import List, Dict, Any, Optional, Tuple
+import numpy as np
+from app.config.app_config import AppConfigSingleton
+from app.utils.app_logging import get_logger
 from app.config.vector_db_client import VectorDBClient
+from app.utils.pdf_text_extract import extract_text_from_pdf
+from app.utils.doc_chunking import sliding_window_chunks
+from app.service.cache.answer_cache import answer_cache
+
+_cfg = AppConfigSingleton.instance()
+_logger = get_logger(_cfg)
+
+def _year_from_filename(name: str) -> str:
+    for y in ("2019", "2020", "2021", "2022", "2023", "2024", "2025"):
+        if y in name:
+            return y
+    return ""
+
+def _section_centroids(vectors: List[List[float]], sections: int) -> List[Tuple[int, int, List[float]]]:
+    """Split chunk vectors into contiguous sections; return (start, end, unit-norm centroid) per section."""
+    if not vectors:
+        return []
+    mat = np.asarray(vectors, dtype=np.float32)
+    out: List[Tuple[int, int, List[float]]] = []
+    for part in np.array_split(np.arange(len(mat)), max(1, min(sections, len(mat)))):
+        c = mat[part].mean(axis=0)
+        norm = float(np.linalg.norm(c)) or 1.0
+        out.append((int(part[0]), int(part[-1]), (c / norm).tolist()))
+    return out
 
 class ChunkedIndexerService:
-    def __init__(self, db: VectorDBClient):
+    def __init__(self, db: VectorDBClient, parent_db: Optional[VectorDBClient] = None):
         self.db = db
+        # Optional parent summary index (a few section-centroid vectors per parent document)
+        self.parent_db = parent_db
+
+    def index_pdf_path(self, path: Path, base_meta: Dict[str, Any],
+                       chunk_size: int = 900, overlap: int = 150) -> Tuple[str, int]:
+        _logger.info("[ChunkedIndexer] Extract text path=%s", path)
+        text, pages = extract_text_from_pdf(path)
+        chunks = sliding_window_chunks(text, size=chunk_size, overlap=overlap)
+        parent_id = base_meta.get("parent_id") or base_meta.get("document_id") or path.stem
+        year = _year_from_filename(path.name)
+
+        metas: List[Dict[str, Any]] = []
+        ids: List[str] = []
+        for i in range(len(chunks)):
+            chunk_id = f"{parent_id}::chunk::{i:04d}"
+            meta = dict(base_meta)
+            meta.update({"parent_id": parent_id, "chunk_id": chunk_id, "filename": path.name, "pages": pages, "year": year})
+            metas.append(meta)
+            ids.append(chunk_id)
+
+        # Embed once; the same vectors feed the chunk upsert and the parent centroids
+        vectors = self.db.embed_many(chunks) if chunks else []
+        _logger.info("[ChunkedIndexer] Upserting chunks n=%d parent=%s", len(ids), parent_id)
+        self.db.upsert_items(chunks, metas, ids, embeddings=vectors or None)
+        self.upsert_parent_summary(parent_id, chunks, vectors, metas[0] if metas else dict(base_meta))
+        answer_cache.invalidate_parents([parent_id])
+        _logger.info("[ChunkedIndexer] Upsert complete parent=%s", parent_id)
+        return parent_id, len(chunks)
+
+    def upsert_parent_summary(self, parent_id: str, chunks: List[str], vectors: List[List[float]], meta: Dict[str, Any]) -> int:
+        if self.parent_db is None or not chunks:
+            return 0
+        sections = _section_centroids(vectors, _cfg.parent_sections_per_doc)
+        texts: List[str] = []
+        metas: List[Dict[str, Any]] = []
+        ids: List[str] = []
+        for s_idx, (start, end, _) in enumerate(sections):
+            pmeta = {k: v for k, v in meta.items() if k != "chunk_id"}
+            pmeta.update({"parent_id": parent_id, "section": s_idx, "chunk_start": start, "chunk_end": end})
+            texts.append((chunks[start] or "")[:500])
+            metas.append(pmeta)
+            ids.append(f"{parent_id}::section::{s_idx:02d}")
+        self.parent_db.delete_by_parent(parent_id)
+        self.parent_db.upsert_items(texts, metas, ids, embeddings=[c for _, _, c in sections])
+        _logger.info("[ChunkedIndexer] Parent summary upserted parent=%s sections=%d", parent_id, len(ids))
+        return len(ids)
 
     def upsert_chunks(self, chunks: List[str], metadatas: List[Dict[str, Any]], ids: List[str]) -> int:
         self.db.upsert_items(chunks, metadatas, ids)
         return len(ids)
 
     def reindex_parent(self, parent_id: str, chunks: List[str], metadatas: List[Dict[str, Any]], ids: List[str]) -> int:
-        self.db.delete_by_parent(parent_id)
-        self.db.upsert_items(chunks, metadatas, ids)
+        self.purge_parent(parent_id)
+        vectors = self.db.embed_many(chunks) if chunks else []
+        self.db.upsert_items(chunks, metadatas, ids, embeddings=vectors or None)
+        self.upsert_parent_summary(parent_id, chunks, vectors, metadatas[0] if metadatas else {})
+        answer_cache.invalidate_parents([parent_id])
         return len(ids)
 
     def purge_parent(self, parent_id: str) -> int:
+        answer_cache.invalidate_parents([parent_id])
+        if self.parent_db is not None:
+            self.parent_db.delete_by_parent(parent_id)
         return self.db.delete_by_parent(parent_id)
 
     def count(self) -> int:
         return self.db.count()
 
-
 # from pathlib import Path
 # from typing import Dict, Any, List, Tuple
 # from app.utils.app_logging import get_logger
@@ -1,18 +1,49 @@
 # app/service/rag_search_service.py
-from typing import List
+# Plain RAG path: retrieve -> pack context -> single LLM call, fully async.
+# Per-process semaphores bound in-flight retrievals and LLM calls so this lightweight path can absorb high-QPS lookups.
+from typing import List, Dict, Any, Optional, Tuple, Callable, Awaitable
+import asyncio, re, time
+from openai import AuthenticationError, APIConnectionError, RateLimitError
 from app.config.app_config import AppConfigSingleton
+from app.config.llm_client import chat_completion, get_llm_client, llm_timeout
 from app.utils.app_logging import get_logger
+from app.utils.circuit_breaker import CircuitBreaker, with_retries_async
 from app.config.vector_db_client import VectorDBClient
 from app.models.rag_models import RetrieveResponseHit, RetrieveResponse
+from app.prompts.lab_prompts import LAB_SYSTEM_PROMPT, LAB_USER_TEMPLATE
+from app.utils.event_stream import EventStream, StreamInterrupted, emit
+from app.utils.context_packer import pack_context
+from app.utils import metrics, tracing
 
 _cfg = AppConfigSingleton.instance()
 _logger = get_logger(_cfg)
 _vdb = VectorDBClient(backend="chroma")
+_MODEL = _cfg.openai_llm_model or _cfg.openai_default_model
+
+_retrieval_sem = asyncio.Semaphore(_cfg.rag_max_concurrent_retrievals)
+_llm_sem = asyncio.Semaphore(_cfg.rag_max_concurrent_llm)
+_llm_breaker = CircuitBreaker(failure_threshold=3, recovery_time_sec=20.0, name="rag_llm")
+
+def _is_retryable_llm(err: Exception) -> bool:
+    if isinstance(err, (AuthenticationError, StreamInterrupted)):
+        return False
+    if isinstance(err, (APIConnectionError, RateLimitError)):
+        return True
+    msg = str(err).lower()
+    return "timeout" in msg or "connection" in msg or "temporarily" in msg
+
+def _ms_since(t0: float) -> float:
+    return round((time.perf_counter() - t0) * 1000, 2)
 
 class RAGSearchService:
-    def retrieve(self, query: str, n: int = 5) -> RetrieveResponse:
-        res = _vdb.search(query=query, top_k=n)
+    async def retrieve(self, query: str, n: int = 5, where: Optional[Dict[str, Any]] = None,
+                       min_score: Optional[float] = None, include: Optional[List[str]] = None,
+                       snippet_chars: Optional[int] = None, fields: Optional[List[str]] = None) -> RetrieveResponse:
+        async with _retrieval_sem:
+            res = await _vdb.search(query=query, top_k=n, where=where, min_score=min_score,
+                                    include=include, snippet_chars=snippet_chars, fields=fields)
         ids = res.get("ids", [[]])[0]; docs = res.get("documents", [[]])[0]; metas = res.get("metadatas", [[]])[0]
+        scores = (res.get("scores") or [[]])[0] or [None] * len(ids)
         hits: List[RetrieveResponseHit] = []
         for i, _id in enumerate(ids):
             meta = metas[i] or {}
@@ -21,6 +52,88 @@ class RAGSearchService:
                 parent_id=meta.get("parent_id") or (_id.split("::chunk::")[0] if "::chunk::" in _id else _id),
                 text=docs[i] or "",
                 metadata=meta,
-                score=meta.get("score")
+                score=scores[i]
             ))
         return RetrieveResponse(query=query, hits=hits)
+
+    @staticmethod
+    def _pack_context(hits: List[RetrieveResponseHit], top_k_ctx: int) -> Tuple[str, List[Dict[str, Any]], List[str]]:
+        top = hits[:max(1, top_k_ctx)]
+        packed = pack_context({"id": h.id, "parent_id": h.parent_id, "text": h.text, "score": h.score} for h in top)
+        blocks = [{"id": b["id"], "parent_id": b["parent_id"], "snippet": b["text"]} for b in packed.blocks]
+        # allowed citations keep retrieval rank order
+        allowed = [pid for pid in dict.fromkeys(h.parent_id for h in top) if pid in packed.parent_ids]
+        context = "\n---\n".join(f"[{b['parent_id']}] {b['snippet']}" for b in blocks)
+        return context, blocks, allowed
+
+    async def _complete(self, question: str, context: str,
+                        on_token: Optional[Callable[[str], Awaitable[None]]] = None) -> Tuple[str, Dict[str, int]]:
+        client = get_llm_client()
+        if not client:
+            raise RuntimeError("LLM client not initialized; set OPENAI_API_KEY/base_url/model.")
+        messages = [
+            {"role": "system", "content": LAB_SYSTEM_PROMPT},
+            {"role": "user", "content": LAB_USER_TEMPLATE.format(question=question, context=context)}
+        ]
+        async def _op():
+            kwargs = dict(model=_MODEL, messages=messages, temperature=0.2, top_p=1.0, max_tokens=512, timeout=llm_timeout())
+            return await chat_completion(client, on_token, **kwargs)
+        async with _llm_sem:
+            resp = await with_retries_async(_op, _is_retryable_llm, _llm_breaker, max_attempts=3, base_backoff=0.4)
+        text, usage = resp.choices[0].message.content or "", getattr(resp, "usage", None)
+        return text.strip(), {
+            "prompt_tokens": getattr(usage, "prompt_tokens", 0) or 0,
+            "completion_tokens": getattr(usage, "completion_tokens", 0) or 0
+        }
+
+    @metrics.agent_run()
+    @tracing.traced("rag.ask")
+    async def ask_with_debug(self, question: str, n_results: int = 8, top_k_ctx: int = 4,
+                             where: Optional[Dict[str, Any]] = None, events: Optional[EventStream] = None) -> Dict[str, Any]:
+        out: Dict[str, Any] = {"question": question, "answer": "", "citations": [], "context_blocks": []}
+        t0 = time.perf_counter()
+        try:
+            retrieved = await self.retrieve(question, n=n_results, where=where, snippet_chars=1000, fields=["year", "filename"])
+        except Exception as e:
+            _logger.exception("[RAG] ask retrieve failed: %s", e)
+            out.update(retrieval_lapse_time=_ms_since(t0), llm_lapse_time=0.0, file_llm_status="failed",
+                       file_error_info={"stage": "retrieve", "type": e.__class__.__name__, "message": str(e)})
+            return out
+        out["retrieval_lapse_time"] = _ms_since(t0)
+        await emit(events, "hits", stage="retrieve", hits=[h.model_dump(include={"id", "parent_id", "score"}) for h in retrieved.hits])
+
+        context, blocks, allowed = self._pack_context(retrieved.hits, top_k_ctx)
+        out["context_blocks"] = blocks
+        if not blocks:
+            out.update(llm_lapse_time=0.0, file_llm_status="failed",
+                       file_error_info={"stage": "retrieve", "type": "RetrievalEmpty", "message": "No hits for question"})
+            return out
+
+        t1 = time.perf_counter()
+        try:
+            on_token = None
+            if events is not None:
+                async def on_token(delta: str):
+                    await events.emit("token", delta=delta)
+            answer, usage = await self._complete(question, context, on_token=on_token)
+        except Exception as e:
+            _logger.exception("[RAG] ask llm failed: %s", e)
+            out.update(llm_lapse_time=_ms_since(t1), file_llm_status="failed",
+                       file_error_info={"stage": "llm", "type": e.__class__.__name__, "message": str(e)})
+            return out
+
+        cited = [c for c in dict.fromkeys(re.findall(r"\[([^\[\]]+?)\]", answer)) if c in allowed]
+        out.update(answer=answer, citations=cited or allowed, llm_lapse_time=_ms_since(t1),
+                   file_llm_status="success", token_usage=usage)
+        return out
+
+    async def ask(self, question: str, n_results: int = 8, top_k_ctx: int = 4,
+                  where: Optional[Dict[str, Any]] = None, events: Optional[EventStream] = None) -> Dict[str, Any]:
+        out = await self.ask_with_debug(question, n_results=n_results, top_k_ctx=top_k_ctx, where=where, events=events)
+        out.pop("context_blocks", None)
+        return out
+
+    async def ask_batch(self, questions: List[str], n_results: int = 8, top_k_ctx: int = 4) -> Dict[str, Any]:
+        # Fan out; the module semaphores bound the actual concurrency
+        results = await asyncio.gather(*[self.ask(q, n_results=n_results, top_k_ctx=top_k_ctx) for q in questions])
+        return {"results": list(results)}
@@ -1,6 +1,58 @@
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Sequence, Tuple, Callable
+from functools import lru_cache
+import asyncio
 import re
-import math
+import numpy as np
+from app.config.app_config import AppConfigSingleton
+
+_cfg = AppConfigSingleton.instance()
+
+EmbedFn = Callable[[List[str]], Sequence[Sequence[float]]]
+
+# Compiled once; every rubric feature is read off these in a single _features() call per answer
+_ID_RE = re.compile(r"\[([^\[\]]+?)\]")
+_DIGIT_RE = re.compile(r"\d")
+_QUOTE_CITE_RE = re.compile(r"\"([^\"]+?)\"\s*\[[^\[\]]+?\]")   # "quoted sentence" [doc-id]
+_DELTA_RE = re.compile("|".join(re.escape(kw) for kw in (
+    "increase", "decrease", "delta", "change", "rose", "declined", "up ", "down ", "grew", "reduction", "∆")))
+_QTERM_RE = re.compile(r"[A-Za-z]{4,}")
+_QTERM_IGNORE = frozenset({"with", "from", "that", "this", "those", "these", "which", "about", "into", "over", "under",
+                           "between", "among", "total", "year", "years"})
+
+# grounded_v1: answer sentences, with the [ids] they cite; fragments shorter than this are headings / cite tails
+_SENT_SPLIT = re.compile(r"(?<=[.!?])\s+|\n+")
+_WORDS = re.compile(r"[A-Za-z0-9$%]+")
+_LEADING_CITES = re.compile(r"^(?:\s*\[[^\[\]]+?\])+")
+_MIN_SENTENCE_WORDS = 4
+_GROUNDING_WEIGHT = 0.7
+_CITATION_WEIGHT = 0.3
+
+@lru_cache(maxsize=1024)
+def _question_terms(question: Optional[str]) -> Tuple[str, ...]:
+    if not question:
+        return ()
+    return tuple(t for t in _QTERM_RE.findall(question.lower()) if t not in _QTERM_IGNORE)[:8]
+
+def _answer_sentences(answer: str) -> List[Tuple[str, List[str]]]:
+    out: List[Tuple[str, List[str]]] = []
+    for frag in _SENT_SPLIT.split(answer):
+        lead = _LEADING_CITES.match(frag)
+        if lead and out:
+            # "... in 2020. [doc-id] Next ..." splits the cite off the sentence it belongs to
+            out[-1][1].extend(_ID_RE.findall(lead.group()))
+            frag = frag[lead.end():]
+        cites = _ID_RE.findall(frag)
+        text = " ".join(_ID_RE.sub(" ", frag).split())
+        if len(_WORDS.findall(text)) < _MIN_SENTENCE_WORDS:
+            if cites and out:
+                out[-1][1].extend(cites)
+            continue
+        out.append((text, cites))
+    return out[:max(1, _cfg.grounded_max_sentences)]
+
+def _unit_rows(vectors: Any) -> np.ndarray:
+    mat = np.asarray(vectors, dtype=np.float32)
+    return mat / np.clip(np.linalg.norm(mat, axis=1, keepdims=True), 1e-12, None)
 
 class VariantOutputScoreService:
     """
@@ -27,120 +79,190 @@ class VariantOutputScoreService:
        - +1 if at least one of the key terms from question appears
 
     Final score = round((rubric_total / 10.0) * 5.0, 3)
+
+    score() / score_batch() return the breakdown with the score from one feature pass; score_scalar() and
+    score_breakdown() are the same computation. A batch shares the question terms across its answers.
+
+    scoring_model="grounded_v1" scores evidence instead of surface features. The answer is split into sentences
+    (cites attached), all sentences of the batch are embedded in one call with the chunk collection's model, and each
+    is compared by cosine with the stored embeddings of the context chunks it cites (every chunk when it cites none).
+    Per sentence, support rises linearly from 0 at grounded_similarity_floor to 1 at grounded_similarity_full.
+        score = 5 * (0.7 * mean support + 0.3 * share of sentences whose cites are all allowed)
+    It needs context=[{id, parent_id, embedding}] and embed_fn; without them it falls back to heuristic_v1.
+    The embedding call blocks, so async callers use score_async().
     """
 
+    MAX_SCORE = 5.0
+    HEURISTIC_V1 = "heuristic_v1"
+    GROUNDED_V1 = "grounded_v1"
+
     # ---------- Helpers ----------
     @staticmethod
-    def _extract_ids(text: str) -> List[str]:
-        if not text:
-            return []
-        return list(dict.fromkeys(re.findall(r"\[([^\[\]]+?)\]", text)))
+    def _features(answer: str, q_terms: Tuple[str, ...]) -> Dict[str, Any]:
+        lower = answer.lower()
+        ids_in_answer = list(dict.fromkeys(_ID_RE.findall(answer)))
+        return {
+            "ids_in_answer": ids_in_answer,
+            "distinct_parent_ids": len(ids_in_answer),
+            "has_numbers": _DIGIT_RE.search(answer) is not None,
+            # crude signal that both 2019 and 2018 figures appear
+            "has_year_pair": "2019" in answer and "2018" in answer,
+            "has_delta_language": _DELTA_RE.search(lower) is not None,
+            "quoted_risk_with_cite_count": len(_QUOTE_CITE_RE.findall(answer)),
+            "length": len(answer),
+            # at least 3 periods as crude fluency proxy
+            "sentence_like": answer.count(".") >= 3,
+            "question_terms_overlap": list(q_terms),
+            "question_overlap": any(t in lower for t in q_terms),
+        }
 
     @staticmethod
-    def _numbers(text: str) -> List[str]:
-        if not text:
-            return []
-        return re.findall(r"\d[\d,\.]*", text)
+    def _rubric(f: Dict[str, Any]) -> float:
+        n_ids = len(f["ids_in_answer"])
+        qcount = f["quoted_risk_with_cite_count"]
+        total = (
+            (n_ids >= 1) + (n_ids >= 2)                                    # (1) citations coverage
+            + (f["distinct_parent_ids"] >= 2)                              # (2) distinct parent ids
+            + f["has_numbers"] + f["has_year_pair"]                        # (3) numeric completeness
+            + f["has_delta_language"]                                      # (4) delta expression
+            + (qcount >= 1) + (qcount >= 2)                                # (5) risk quotes
+            + 0.5 * (200 <= f["length"] <= 1400) + 0.5 * f["sentence_like"]  # (6) length and fluency
+            + f["question_overlap"]                                        # (7) question overlap
+        )
+        # Normalize to 0..5
+        return max(0.0, min(5.0, round((total / 10.0) * 5.0, 3)))
 
     @staticmethod
-    def _has_year_pair(text: str) -> bool:
-        if not text:
-            return False
-        # crude signals that both 2019 and 2018 numbers likely appear
-        has_2019 = "2019" in text
-        has_2018 = "2018" in text
-        return has_2019 and has_2018 and bool(re.search(r"\d", text))
+    def _grounded_batch(
+            answers: Sequence[str],
+            allowed_ids: Optional[List[str]],
+            context: Sequence[Dict[str, Any]],
+            embed_fn: EmbedFn
+    ) -> List[Dict[str, Any]]:
+        chunks = [c for c in context if c.get("embedding") is not None]
+        parsed = [_answer_sentences(a or "") for a in answers]
+        flat = [text for sents in parsed for text, _ in sents]
+        chunk_mat = _unit_rows([c["embedding"] for c in chunks])
+        # one embedding call and one matrix product for every sentence of every answer
+        sims = _unit_rows(embed_fn(flat)) @ chunk_mat.T if flat else np.zeros((0, len(chunks)), dtype=np.float32)
+        chunk_parents = np.array([str(c.get("parent_id")) for c in chunks])
+        chunk_ids = np.array([str(c.get("id")) for c in chunks])
+        # a cite is valid when it names a parent in the context (or one the caller allows)
+        allowed = set(allowed_ids or ()) | set(chunk_parents.tolist()) | set(chunk_ids.tolist())
+        lo, hi = _cfg.grounded_similarity_floor, _cfg.grounded_similarity_full
 
+        out: List[Dict[str, Any]] = []
+        row = 0
+        for sents in parsed:
+            block = sims[row:row + len(sents)]
+            row += len(sents)
+            cited = [c for _, cs in sents for c in cs]
+            result: Dict[str, Any] = {"scoring_model": VariantOutputScoreService.GROUNDED_V1, "sentences": len(sents),
+                                      "ids_in_answer": list(dict.fromkeys(cited)),
+                                      "invalid_citations": sorted({c for c in cited if c not in allowed})}
+            if not sents:
+                out.append({**result, "grounding": 0.0, "citation_coverage": 0.0, "score": 0.0})
+                continue
+            mask = np.ones(block.shape, dtype=bool)
+            for i, (_, cs) in enumerate(sents):
+                if cs:
+                    # a cited sentence only counts as supported by the chunks it cites
+                    mask[i] = np.isin(chunk_parents, cs) | np.isin(chunk_ids, cs)
+            best = np.where(mask, block, -1.0).max(axis=1)
+            support = np.clip((best - lo) / max(hi - lo, 1e-6), 0.0, 1.0)
+            grounding = float(support.mean())
+            coverage = sum(1 for _, cs in sents if cs and all(c in allowed for c in cs)) / len(sents)
+            weakest = np.argsort(best)[:3]
+            out.append({**result,
+                        "supported_sentences": int((best >= hi).sum()),
+                        "unsupported_sentences": int((best < lo).sum()),
+                        "mean_similarity": round(float(best.clip(min=0.0).mean()), 4),
+                        "grounding": round(grounding, 4),
+                        "citation_coverage": round(coverage, 4),
+                        "weakest": [{"sentence": sents[i][0][:160], "similarity": round(max(float(best[i]), 0.0), 4)}
+                                    for i in weakest if best[i] < hi],
+                        "score": round(VariantOutputScoreService.MAX_SCORE *
+                                       (_GROUNDING_WEIGHT * grounding + _CITATION_WEIGHT * coverage), 3)})
+        return out
+
+    # ---------- Public API ----------
     @staticmethod
-    def _has_delta_language(text: str) -> bool:
-        if not text:
-            return False
-        t = text.lower()
-        return any(kw in t for kw in ["increase", "decrease", "delta", "change", "rose", "declined", "up ", "down " , "grew", "reduction", "∆"])
+    def target_score(scoring_model: str) -> float:
+        """
+        Score at which a variant stops looping: MAX_SCORE, or for grounded_v1 the opt-in grounded_target_score (grounded
+        scores rarely reach the maximum). Pass the model that actually scored: a heuristic fallback gets MAX_SCORE.
+        """
+        if scoring_model == VariantOutputScoreService.GROUNDED_V1 and _cfg.grounded_target_score is not None:
+            return min(_cfg.grounded_target_score, VariantOutputScoreService.MAX_SCORE)
+        return VariantOutputScoreService.MAX_SCORE
 
     @staticmethod
-    def _quoted_segments_with_cites(text: str) -> int:
-        if not text:
-            return 0
-        # Count quoted segments that also have a citation nearby
-        # e.g., "...." [doc-id]
-        matches = re.findall(r"\"([^\"]+?)\"\s*\[[^\[\]]+?\]", text)
-        return len(matches)
+    def score_batch(
+            answers: Sequence[str],
+            citations: Optional[List[str]] = None,
+            scoring_model: str = "heuristic_v1",
+            allowed_ids: Optional[List[str]] = None,
+            question: Optional[str] = None,
+            context: Optional[Sequence[Dict[str, Any]]] = None,
+            embed_fn: Optional[EmbedFn] = None
+    ) -> List[Dict[str, Any]]:
+        """Breakdown plus "score" for each candidate answer to the same question."""
+        if scoring_model == VariantOutputScoreService.GROUNDED_V1:
+            if embed_fn is not None and any(c.get("embedding") is not None for c in context or ()):
+                return VariantOutputScoreService._grounded_batch(answers, allowed_ids, context, embed_fn)
+            fallback = VariantOutputScoreService.score_batch(answers, citations, VariantOutputScoreService.HEURISTIC_V1,
+                                                             allowed_ids, question)
+            return [{**r, "scoring_model": VariantOutputScoreService.HEURISTIC_V1, "fallback_from": scoring_model}
+                    for r in fallback]
+        q_terms = _question_terms(question)
+        out = []
+        for answer in answers:
+            f = VariantOutputScoreService._features(answer or "", q_terms)
+            f["score"] = VariantOutputScoreService._rubric(f) if answer else 0.0
+            out.append(f)
+        return out
 
     @staticmethod
-    def _sentence_like(text: str) -> bool:
-        if not text:
-            return False
-        # at least 3 periods as crude fluency proxy
-        return text.count(".") >= 3
+    def score(
+            answer: str,
+            citations: List[str],
+            scoring_model: str = "heuristic_v1",
+            allowed_ids: Optional[List[str]] = None,
+            question: Optional[str] = None,
+            context: Optional[Sequence[Dict[str, Any]]] = None,
+            embed_fn: Optional[EmbedFn] = None
+    ) -> Dict[str, Any]:
+        return VariantOutputScoreService.score_batch([answer], citations, scoring_model, allowed_ids, question, context, embed_fn)[0]
 
     @staticmethod
-    def _question_terms(question: Optional[str]) -> List[str]:
-        if not question:
-            return []
-        terms = re.findall(r"[A-Za-z]{4,}", question.lower())
-        ignore = {"with","from","that","this","those","these","which","about","into","over","under","between","among","total","year","years"}
-        return [t for t in terms if t not in ignore][:8]
+    async def score_async(
+            answer: str,
+            citations: List[str],
+            scoring_model: str = "heuristic_v1",
+            allowed_ids: Optional[List[str]] = None,
+            question: Optional[str] = None,
+            context: Optional[Sequence[Dict[str, Any]]] = None,
+            embed_fn: Optional[EmbedFn] = None
+    ) -> Dict[str, Any]:
+        if scoring_model == VariantOutputScoreService.GROUNDED_V1 and embed_fn is not None:
+            # sentence embedding (ONNX) blocks; the heuristic is a few microseconds and stays inline
+            return await asyncio.to_thread(VariantOutputScoreService.score, answer, citations, scoring_model, allowed_ids,
+                                           question, context, embed_fn)
+        return VariantOutputScoreService.score(answer, citations, scoring_model, allowed_ids, question, context, embed_fn)
 
-    # ---------- Public API ----------
     @staticmethod
     def score_scalar(
             answer: str,
             citations: List[str],
             scoring_model: str = "heuristic_v1",
             allowed_ids: Optional[List[str]] = None,
-            question: Optional[str] = None
+            question: Optional[str] = None,
+            context: Optional[Sequence[Dict[str, Any]]] = None,
+            embed_fn: Optional[EmbedFn] = None
     ) -> float:
         if not answer:
             return 0.0
-
-        total = 0.0
-
-        # (1) Citations coverage (0..2)
-        ids_in_answer = VariantOutputScoreService._extract_ids(answer)
-        if len(ids_in_answer) >= 1:
-            total += 1.0
-        if len(ids_in_answer) >= 2:
-            total += 1.0
-
-        # (2) Distinct parent ids (0..1)
-        if len(set(ids_in_answer)) >= 2:
-            total += 1.0
-
-        # (3) Numeric completeness (0..2)
-        if VariantOutputScoreService._numbers(answer):
-            total += 1.0
-        if VariantOutputScoreService._has_year_pair(answer):
-            total += 1.0
-
-        # (4) Delta expression (0..1)
-        if VariantOutputScoreService._has_delta_language(answer):
-            total += 1.0
-
-        # (5) Risk quotes (0..2)
-        qcount = VariantOutputScoreService._quoted_segments_with_cites(answer)
-        if qcount >= 1:
-            total += 1.0
-        if qcount >= 2:
-            total += 2.0 - 1.0  # add another +1 (keep additive explicit)
-
-        # (6) Length and fluency (0..1)
-        L = len(answer or "")
-        if 200 <= L <= 1400:
-            total += 0.5
-        if VariantOutputScoreService._sentence_like(answer):
-            total += 0.5
-
-        # (7) Question overlap (0..1)
-        q_terms = VariantOutputScoreService._question_terms(question)
-        if q_terms and any(t in (answer.lower()) for t in q_terms):
-            total += 1.0
-
-        # Normalize to 0..5
-        score = round((total / 10.0) * 5.0, 3)
-        # guardrails
-        score = max(0.0, min(5.0, score))
-        return score
+        return VariantOutputScoreService.score(answer, citations, scoring_model, allowed_ids, question, context, embed_fn)["score"]
 
     @staticmethod
     def score_breakdown(
@@ -148,25 +270,8 @@ class VariantOutputScoreService:
             citations: List[str],
             scoring_model: str = "heuristic_v1",
             allowed_ids: Optional[List[str]] = None,
-            question: Optional[str] = None
+            question: Optional[str] = None,
+            context: Optional[Sequence[Dict[str, Any]]] = None,
+            embed_fn: Optional[EmbedFn] = None
     ) -> Dict[str, Any]:
-        ids_in_answer = VariantOutputScoreService._extract_ids(answer)
-        breakdown: Dict[str, Any] = {
-            "ids_in_answer": ids_in_answer,
-            "distinct_parent_ids": len(set(ids_in_answer)),
-            "has_numbers": bool(VariantOutputScoreService._numbers(answer)),
-            "has_year_pair": VariantOutputScoreService._has_year_pair(answer),
-            "has_delta_language": VariantOutputScoreService._has_delta_language(answer),
-            "quoted_risk_with_cite_count": VariantOutputScoreService._quoted_segments_with_cites(answer),
-            "length": len(answer or ""),
-            "sentence_like": VariantOutputScoreService._sentence_like(answer),
-            "question_terms_overlap": VariantOutputScoreService._question_terms(question),
-        }
-        breakdown["score"] = VariantOutputScoreService.score_scalar(
-            answer=answer,
-            citations=citations,
-            scoring_model=scoring_model,
-            allowed_ids=allowed_ids,
-            question=question
-        )
-        return breakdown
+        return VariantOutputScoreService.score(answer, citations, scoring_model, allowed_ids, question, context, embed_fn)
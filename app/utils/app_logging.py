@@ -1,19 +1,103 @@
 # app/utils/app_logging.py
-# Restored, previously-working rotating file + console logger using provided AppConfig.
-# No behavior change; only ensures log directory exists.
+# Process-wide "gl_rag_app" logger (rotating file + console) using the provided AppConfig.
+# Records go through a QueueHandler; a QueueListener thread formats and writes them, so file I/O and rotation never
+# run on the event loop. A full queue drops the record (counted) instead of blocking the caller.
+#  - LOG_LEVEL sets the level
+#  - LOG_JSON=true writes one JSON object per line instead of LOG_FORMAT
+#  - INFO/DEBUG records are rate limited per message template (LOG_RATE_LIMIT per second, burst of the same size), so
+#    per-call hot-path lines can't flood the log; the next one let through reports how many were suppressed.
+#    Warnings and errors always pass.
 
+import atexit
+import copy
+import json
 import logging
-from logging.handlers import RotatingFileHandler
+import queue
+import threading
+import time
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
 from pathlib import Path
+from typing import Dict, List
 from app.config.app_config import AppConfig
 
 LOG_FORMAT = "%(asctime)s [%(levelname)s] %(name)s: %(message)s"
+_MAX_TEMPLATES = 2000
+_plain = logging.Formatter()
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        out = {
+            "ts": self.formatTime(record),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+            "thread": record.threadName,
+        }
+        if getattr(record, "suppressed", 0):
+            out["suppressed"] = record.suppressed
+        if record.exc_info or record.exc_text:
+            out["exc"] = record.exc_text or self.formatException(record.exc_info)
+        return json.dumps(out, ensure_ascii=False, default=str)
+
+class RateLimitFilter(logging.Filter):
+    """Token bucket per (logger, message template) for records below WARNING."""
+    def __init__(self, per_second: float):
+        super().__init__()
+        self.rate = per_second
+        self.burst = max(1.0, per_second)
+        self._buckets: Dict[tuple, List[float]] = {}   # key -> [tokens, last refill, suppressed]
+        self._lock = threading.Lock()
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if self.rate <= 0 or record.levelno >= logging.WARNING:
+            return True
+        key = (record.name, record.msg if isinstance(record.msg, str) else type(record.msg).__name__)
+        now = time.monotonic()
+        with self._lock:
+            b = self._buckets.get(key)
+            if b is None:
+                if len(self._buckets) >= _MAX_TEMPLATES:
+                    self._buckets.clear()
+                b = self._buckets[key] = [self.burst, now, 0]
+            b[0] = min(self.burst, b[0] + (now - b[1]) * self.rate)
+            b[1] = now
+            if b[0] < 1.0:
+                b[2] += 1
+                return False
+            b[0] -= 1.0
+            suppressed, b[2] = b[2], 0
+        if suppressed:
+            record.suppressed = suppressed
+            if isinstance(record.msg, str):
+                record.msg = record.msg + f" [+{suppressed} similar suppressed]"
+        return True
+
+class _DroppingQueueHandler(QueueHandler):
+    def __init__(self, q: "queue.Queue"):
+        super().__init__(q)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # interpolate here (args may not survive the thread hop) but keep the traceback apart for the JSON formatter
+        record = copy.copy(record)
+        record.msg = record.message = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = record.exc_text or _plain.formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
 
 def get_logger(cfg: AppConfig) -> logging.Logger:
     logger = logging.getLogger("gl_rag_app")
     if logger.handlers:
         return logger
-    logger.setLevel(logging.INFO)
+    logger.setLevel(getattr(logging, str(cfg.log_level or "INFO").upper(), logging.INFO))
 
     # Ensure directories exist
     Path(cfg.data_dir).mkdir(parents=True, exist_ok=True)
@@ -22,12 +106,17 @@ def get_logger(cfg: AppConfig) -> logging.Logger:
     file_handler = RotatingFileHandler(cfg.log_file, maxBytes=2_000_000, backupCount=3, encoding="utf-8")
     stream_handler = logging.StreamHandler()
 
-    formatter = logging.Formatter(LOG_FORMAT)
+    formatter = JsonFormatter() if cfg.log_json else logging.Formatter(LOG_FORMAT)
     file_handler.setFormatter(formatter)
     stream_handler.setFormatter(formatter)
 
-    logger.addHandler(file_handler)
-    logger.addHandler(stream_handler)
+    queue_handler = _DroppingQueueHandler(queue.Queue(maxsize=max(1, cfg.log_queue_size)))
+    queue_handler.addFilter(RateLimitFilter(cfg.log_rate_limit))
+    listener = QueueListener(queue_handler.queue, file_handler, stream_handler, respect_handler_level=True)
+    listener.start()
+    atexit.register(listener.stop)   # drains what is still queued
+
+    logger.addHandler(queue_handler)
     return logger
 
 
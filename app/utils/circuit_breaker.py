@@ -3,22 +3,37 @@
 
 import time
 import asyncio
-from typing import Callable, Awaitable, Optional
+from typing import Callable, Awaitable, Dict, Optional
+from app.utils import metrics
+
+_STATE_VALUE = {"closed": 0, "half_open": 1, "open": 2}
+_breakers: Dict[str, "CircuitBreaker"] = {}
 
 class CircuitBreaker:
-    def __init__(self, failure_threshold: int = 3, recovery_time_sec: float = 30.0):
+    def __init__(self, failure_threshold: int = 3, recovery_time_sec: float = 30.0, name: str = "default"):
         self.failure_threshold = failure_threshold
         self.recovery_time_sec = recovery_time_sec
+        self.name = name
         self._failures = 0
         self._state = "closed"  # closed|open|half_open
         self._opened_at: Optional[float] = None
+        _breakers[name] = self
+
+    @property
+    def state(self) -> str:
+        return self._state
+
+    def _set_state(self, state: str) -> None:
+        if state != self._state:
+            self._state = state
+            metrics.BREAKER_TRANSITIONS.inc(breaker=self.name, state=state)
 
     def can_attempt(self) -> bool:
         if self._state == "closed":
             return True
         if self._state == "open":
             if (time.time() - (self._opened_at or 0)) >= self.recovery_time_sec:
-                self._state = "half_open"
+                self._set_state("half_open")
                 return True
             return False
         if self._state == "half_open":
@@ -27,23 +42,28 @@ class CircuitBreaker:
 
     def on_success(self):
         self._failures = 0
-        self._state = "closed"
+        self._set_state("closed")
         self._opened_at = None
 
     def on_failure(self):
         self._failures += 1
         if self._failures >= self.failure_threshold:
-            self._state = "open"
+            self._set_state("open")
             self._opened_at = time.time()
 
+metrics.registry.gauge("rag_circuit_breaker_state", "Circuit breaker state (0 closed, 1 half-open, 2 open).", ("breaker",),
+                       fn=lambda: {(n,): _STATE_VALUE.get(b.state, 0) for n, b in list(_breakers.items())})
+
 async def with_retries_async(
         op: Callable[[], Awaitable],
         is_retryable: Callable[[Exception], bool],
         breaker: CircuitBreaker,
         max_attempts: int = 3,
         base_backoff: float = 0.5,
-        jitter: float = 0.1
+        jitter: float = 0.1,
+        deadline=None
 ):
+    # deadline (app.utils.deadline.Deadline): don't start a backoff sleep the request can no longer afford
     attempt = 0
     last_err = None
     while attempt < max_attempts:
@@ -59,7 +79,13 @@ async def with_retries_async(
                 breaker.on_failure()
                 raise
             breaker.on_failure()
+            if attempt + 1 >= max_attempts:
+                break
             sleep_s = base_backoff * (2 ** attempt) + min(jitter, 0.05)
+            left = deadline.remaining() if deadline is not None else None
+            if left is not None and left <= sleep_s:
+                raise
             await asyncio.sleep(sleep_s)
             attempt += 1
+            metrics.RETRIES.inc(breaker=breaker.name, **metrics.current_labels())
     raise last_err if last_err else RuntimeError("Operation failed with no exception")
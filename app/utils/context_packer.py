@@ -0,0 +1,148 @@
+# app/utils/context_packer.py
+# Packs retrieved chunks into a token budget for the synthesis prompt:
+#  - near-duplicate sentences (overlapping chunks, repeated boilerplate) are dropped
+#  - every parent with a candidate gets a block before any parent gets a second one, so citations survive the budget
+#  - blocks are emitted in a stable (parent_id, chunk id) order, so repeated calls over the same evidence share a
+#    prompt prefix regardless of score jitter
+# Token counts use tiktoken when the model's BPE file is already in tiktoken_cache_dir, else a ~4 chars/token estimate.
+# tiktoken would otherwise download the file (no timeout) on first use, from inside a request on the event loop.
+
+import hashlib
+import math
+import os
+import re
+from dataclasses import dataclass, field
+from functools import lru_cache
+from typing import Any, Dict, FrozenSet, Iterable, List, Optional
+from app.config.app_config import AppConfigSingleton
+from app.utils.app_logging import get_logger
+
+_cfg = AppConfigSingleton.instance()
+_logger = get_logger(_cfg)
+
+_SENT_SPLIT = re.compile(r"(?<=[.!?;])\s+|\n+")
+_WORD = re.compile(r"[a-z0-9$%][a-z0-9$%.,\-]*")
+_MIN_DEDUPE_WORDS = 4
+_BPE_URL = "https://openaipublic.blob.core.windows.net/encodings/%s.tiktoken"
+
+def _bpe_cache_path(encoding_name: str) -> str:
+    # tiktoken caches each download under sha1(url) in TIKTOKEN_CACHE_DIR
+    return os.path.join(_cfg.tiktoken_cache_dir, hashlib.sha1((_BPE_URL % encoding_name).encode()).hexdigest())
+
+@lru_cache(maxsize=1)
+def _encoder():
+    try:
+        import tiktoken
+        from tiktoken.model import encoding_name_for_model
+    except ImportError as e:
+        _logger.warning("[ContextPacker] tiktoken unavailable, estimating tokens from length: %s", e)
+        return None
+    try:
+        name = encoding_name_for_model(_cfg.openai_llm_model or _cfg.openai_default_model)
+    except KeyError:
+        name = "o200k_base"
+    if not _cfg.tiktoken_cache_dir or not os.path.exists(_bpe_cache_path(name)):
+        _logger.warning("[ContextPacker] %s not in tiktoken_cache_dir=%s, estimating tokens from length",
+                        name, _cfg.tiktoken_cache_dir)
+        return None
+    os.environ.setdefault("TIKTOKEN_CACHE_DIR", _cfg.tiktoken_cache_dir)
+    try:
+        return tiktoken.get_encoding(name)
+    except Exception as e:
+        _logger.warning("[ContextPacker] tiktoken %s failed to load, estimating tokens from length: %s", name, e)
+        return None
+
+def count_tokens(text: str) -> int:
+    if not text:
+        return 0
+    enc = _encoder()
+    if enc is not None:
+        return len(enc.encode(text, disallowed_special=()))
+    return math.ceil(len(text) / 4)
+
+@dataclass
+class PackedContext:
+    blocks: List[Dict[str, Any]] = field(default_factory=list)   # {id, parent_id, text, tokens, score}
+    tokens: int = 0
+    stats: Dict[str, int] = field(default_factory=dict)
+
+    @property
+    def parent_ids(self) -> List[str]:
+        return list(dict.fromkeys(b["parent_id"] for b in self.blocks if b.get("parent_id")))
+
+    def texts(self) -> List[str]:
+        return [b["text"] for b in self.blocks]
+
+def _shingle(sentence: str) -> FrozenSet[str]:
+    return frozenset(_WORD.findall(sentence.lower()))
+
+def _near_duplicate(sig: FrozenSet[str], seen: List[FrozenSet[str]], threshold: float) -> bool:
+    if not sig:
+        return True
+    if len(sig) < _MIN_DEDUPE_WORDS:
+        # short fragments (table cells, year labels) repeat legitimately across rows
+        return False
+    for other in seen:
+        inter = len(sig & other)
+        if inter and inter / len(sig | other) >= threshold:
+            return True
+    return False
+
+def pack_context(candidates: Iterable[Dict[str, Any]], budget_tokens: Optional[int] = None, max_per_parent: Optional[int] = None,
+                 dedupe_threshold: Optional[float] = None) -> PackedContext:
+    """candidates: dicts with text, parent_id and optional id / score (higher is better)."""
+    budget = budget_tokens if budget_tokens is not None else _cfg.context_token_budget
+    per_parent = max_per_parent if max_per_parent is not None else _cfg.context_max_per_parent
+    threshold = dedupe_threshold if dedupe_threshold is not None else _cfg.context_dedupe_threshold
+
+    cands = [c for c in candidates if (c.get("text") or "").strip()]
+    order = sorted(range(len(cands)), key=lambda i: (-(cands[i].get("score") or 0.0), i))
+    stats = {"candidates": len(cands), "dup_sentences": 0, "over_budget": 0, "per_parent_cap": 0}
+
+    # Diversity first: best chunk of each parent, then the rest by score
+    firsts, rest, seen_parents = [], [], set()
+    for i in order:
+        pid = cands[i].get("parent_id")
+        (rest if pid in seen_parents else firsts).append(i)
+        seen_parents.add(pid)
+
+    kept: List[Dict[str, Any]] = []
+    seen_sigs: List[FrozenSet[str]] = []
+    per_parent_count: Dict[Any, int] = {}
+    used = 0
+    for i in firsts + rest:
+        c = cands[i]
+        pid = c.get("parent_id")
+        if per_parent and per_parent_count.get(pid, 0) >= per_parent:
+            stats["per_parent_cap"] += 1
+            continue
+        sentences = []
+        for s in _SENT_SPLIT.split(c["text"]):
+            s = s.strip()
+            if not s:
+                continue
+            sig = _shingle(s)
+            if _near_duplicate(sig, seen_sigs, threshold):
+                stats["dup_sentences"] += 1
+                continue
+            sentences.append((s, sig))
+        if not sentences:
+            continue
+        # take whole sentences while they fit; a chunk that can't contribute a sentence is skipped
+        text_parts, sigs, tokens = [], [], 0
+        for s, sig in sentences:
+            t = count_tokens(s) + 1
+            if used + tokens + t > budget:
+                break
+            text_parts.append(s); sigs.append(sig); tokens += t
+        if not text_parts:
+            stats["over_budget"] += 1
+            continue
+        seen_sigs.extend(sigs)
+        used += tokens
+        per_parent_count[pid] = per_parent_count.get(pid, 0) + 1
+        kept.append({"id": c.get("id"), "parent_id": pid, "text": " ".join(text_parts), "tokens": tokens, "score": c.get("score")})
+
+    kept.sort(key=lambda b: (str(b.get("parent_id") or ""), str(b.get("id") or "")))
+    stats.update(kept=len(kept), parents=len({b["parent_id"] for b in kept}))
+    return PackedContext(blocks=kept, tokens=used, stats=stats)
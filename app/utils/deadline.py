@@ -0,0 +1,91 @@
+# app/utils/deadline.py
+# Request-level deadline carried through the agent pipeline (run -> variant -> loop -> retrieval/LLM),
+# plus a small accumulator for per-stage wall-clock timings.
+
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional
+
+DEADLINE_HEADER = "x-request-deadline-ms"
+
+class Deadline:
+    def __init__(self, budget_ms: Optional[float] = None):
+        self.budget_ms = budget_ms if budget_ms and budget_ms > 0 else None
+        self._t0 = time.monotonic()
+        self._at = self._t0 + self.budget_ms / 1000.0 if self.budget_ms else None
+        self.degraded: List[Dict[str, Any]] = []
+
+    @classmethod
+    def from_request(cls, payload: Dict[str, Any], headers: Optional[Dict[str, str]] = None,
+                     default_ms: Optional[float] = None) -> Optional[float]:
+        """Budget in ms from payload["deadline_ms"], else the X-Request-Deadline-Ms header, else default_ms."""
+        raw = payload.get("deadline_ms")
+        if raw is None and headers:
+            raw = headers.get(DEADLINE_HEADER)
+        try:
+            return float(raw) if raw is not None else default_ms
+        except (TypeError, ValueError):
+            return default_ms
+
+    def remaining(self) -> Optional[float]:
+        """Seconds left, or None when the request is unbounded."""
+        if self._at is None:
+            return None
+        return max(0.0, self._at - time.monotonic())
+
+    def remaining_ms(self) -> Optional[float]:
+        left = self.remaining()
+        return None if left is None else left * 1000.0
+
+    def below(self, ms: float) -> bool:
+        left = self.remaining_ms()
+        return left is not None and left < ms
+
+    @property
+    def expired(self) -> bool:
+        return self.below(1.0)
+
+    def cap(self, seconds: Optional[float], reserve_s: float = 0.0) -> Optional[float]:
+        """Clamp a stage timeout to what is left of the request (minus reserve_s), never below 50 ms."""
+        left = self.remaining()
+        if left is None:
+            return seconds
+        left = max(0.05, left - reserve_s)
+        return left if seconds is None else min(seconds, left)
+
+    def note(self, stage: str, action: str, **info: Any) -> None:
+        self.degraded.append({"stage": stage, "action": action, "remaining_ms": _round(self.remaining_ms()), **info})
+
+    def report(self) -> Dict[str, Any]:
+        return {
+            "budget_ms": self.budget_ms,
+            "elapsed_ms": round((time.monotonic() - self._t0) * 1000, 2),
+            "remaining_ms": _round(self.remaining_ms()),
+            "expired": self.expired,
+            "degraded": self.degraded,
+        }
+
+class StageTimings:
+    def __init__(self):
+        self._ms: Dict[str, float] = {}
+
+    @contextmanager
+    def measure(self, stage: str) -> Iterator[None]:
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(stage, (time.perf_counter() - t0) * 1000)
+
+    def add(self, stage: str, ms: float) -> None:
+        self._ms[stage] = self._ms.get(stage, 0.0) + ms
+
+    def merge(self, other: Dict[str, float]) -> None:
+        for stage, ms in (other or {}).items():
+            self.add(stage, ms)
+
+    def as_dict(self) -> Dict[str, float]:
+        return {k: round(v, 2) for k, v in self._ms.items()}
+
+def _round(v: Optional[float]) -> Optional[float]:
+    return None if v is None else round(v, 2)
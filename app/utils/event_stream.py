@@ -0,0 +1,95 @@
+# app/utils/event_stream.py
+# Queue-backed event stream for NDJSON / SSE responses: producers emit trace, hit and token events while running;
+# the route drains them to the client as they arrive and finishes with a "result" (or "error") event.
+
+import asyncio
+import json
+import time
+from types import SimpleNamespace
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Optional
+
+_DONE = object()
+
+MEDIA_TYPES = {"ndjson": "application/x-ndjson", "sse": "text/event-stream"}
+
+class EventStream:
+    def __init__(self, fmt: str = "ndjson"):
+        self.fmt = fmt if fmt in MEDIA_TYPES else "ndjson"
+        self.media_type = MEDIA_TYPES[self.fmt]
+        self._q: asyncio.Queue = asyncio.Queue()
+        self._t0 = time.perf_counter()
+
+    async def emit(self, event: str, **data: Any) -> None:
+        self._q.put_nowait({"event": event, "t_ms": round((time.perf_counter() - self._t0) * 1000, 2), **data})
+
+    def _encode(self, item: Dict[str, Any]) -> str:
+        body = json.dumps(item, default=str, separators=(",", ":"))
+        if self.fmt == "sse":
+            return f"event: {item['event']}\ndata: {body}\n\n"
+        return body + "\n"
+
+    @staticmethod
+    def _error_payload(err: Exception) -> Dict[str, Any]:
+        # AgentError carries code/http_status/details; anything else is reported by class name
+        return {
+            "error_code": getattr(err, "code", err.__class__.__name__),
+            "http_status": getattr(err, "http_status", 500),
+            "message": getattr(err, "message", str(err)),
+            "details": getattr(err, "details", {}),
+        }
+
+    async def iter_encoded(self, producer: Awaitable[Any]) -> AsyncIterator[str]:
+        async def _run():
+            try:
+                await self.emit("result", data=await producer)
+            except Exception as e:
+                await self.emit("error", **self._error_payload(e))
+            finally:
+                self._q.put_nowait(_DONE)
+
+        task = asyncio.create_task(_run())
+        try:
+            while True:
+                item = await self._q.get()
+                if item is _DONE:
+                    break
+                yield self._encode(item)
+        finally:
+            # client went away mid-stream: stop the producer instead of finishing work nobody reads
+            if not task.done():
+                task.cancel()
+
+async def emit(events: Optional[EventStream], event: str, **data: Any) -> None:
+    if events is not None:
+        await events.emit(event, **data)
+
+class StreamInterrupted(Exception):
+    """A streamed completion failed after some deltas already reached on_token; `partial` is the text sent so far.
+    Never retry this: a replay would send the answer to the client a second time."""
+
+    def __init__(self, partial: str, cause: BaseException):
+        super().__init__(f"stream interrupted after {len(partial)} chars: {cause}")
+        self.partial = partial
+
+async def stream_chat_completion(client, on_token: Callable[[str], Awaitable[None]], **kwargs: Any) -> SimpleNamespace:
+    """Stream a chat completion from an AsyncOpenAI client, forwarding deltas to on_token;
+    returns a response-shaped object (choices/usage). Raises StreamInterrupted if it fails after the first delta."""
+    stream = await client.chat.completions.create(stream=True, stream_options={"include_usage": True}, **kwargs)
+    parts, usage = [], None
+    try:
+        async for chunk in stream:
+            if getattr(chunk, "usage", None):
+                usage = chunk.usage
+            if chunk.choices:
+                delta = chunk.choices[0].delta.content or ""
+                if delta:
+                    parts.append(delta)
+                    await on_token(delta)
+    except Exception as e:
+        if parts:
+            raise StreamInterrupted("".join(parts), e) from e
+        raise
+    return SimpleNamespace(
+        choices=[SimpleNamespace(message=SimpleNamespace(content="".join(parts)))],
+        usage=usage,
+    )
@@ -0,0 +1,161 @@
+# app/utils/memory.py
+# Where a worker's memory goes (GET /debug/memory): process RSS from /proc, each in-process cache's entry count and
+# approximate bytes, the Chroma HNSW indexes and collections loaded in this process, the ONNX embedding sessions, and
+# optionally the top tracemalloc allocators.
+# Caches report themselves: singletons register a memory_info() callable, per-instance caches (one per client) are
+# tracked weakly and summed by name. Sizes are estimates: containers are measured on a sample of their items and
+# extrapolated, so a report stays cheap on caches with thousands of entries. Library objects we don't own (Chroma
+# segments, ONNX sessions) are found by scanning the gc heap, which is slow enough that it only runs here.
+
+import gc
+import os
+import resource
+import sys
+import tracemalloc
+import weakref
+from itertools import islice
+from typing import Any, Callable, Dict, List, Optional
+
+_SAMPLE = 32
+_DEPTH = 4
+
+_components: Dict[str, Callable[[], Dict[str, Any]]] = {}
+_tracked: Dict[str, "weakref.WeakSet[Any]"] = {}
+
+def approx_size(obj: Any, sample: int = _SAMPLE, depth: int = _DEPTH) -> int:
+    """Approximate deep size in bytes; containers larger than `sample` are extrapolated from evenly taken items."""
+    size = sys.getsizeof(obj)
+    nbytes = getattr(obj, "nbytes", None)
+    if isinstance(nbytes, int):             # numpy arrays (views included)
+        return max(size, nbytes)
+    if depth <= 0 or isinstance(obj, (str, bytes, bytearray, int, float, bool)) or obj is None:
+        return size
+    try:
+        if isinstance(obj, dict):
+            n = len(obj)
+            items = list(islice(obj.items(), 0, None, max(1, n // sample)))[:sample]
+            child = sum(approx_size(k, sample, depth - 1) + approx_size(v, sample, depth - 1) for k, v in items)
+        elif isinstance(obj, (list, tuple, set, frozenset)):
+            n = len(obj)
+            items = list(islice(obj, 0, None, max(1, n // sample)))[:sample]
+            child = sum(approx_size(v, sample, depth - 1) for v in items)
+        elif hasattr(obj, "__dict__"):
+            return size + approx_size(vars(obj), sample, depth - 1)
+        else:
+            return size
+    except RuntimeError:                    # mutated by another thread mid-walk; size what we have
+        return size
+    return size + (child * n // len(items) if items else 0)
+
+def register(name: str, fn: Callable[[], Dict[str, Any]]) -> None:
+    """Register a process-wide component; fn returns at least {"entries": int, "bytes": int}."""
+    _components[name] = fn
+
+def track(name: str, obj: Any) -> None:
+    """Track an instance with a memory_info() method; instances under one name are summed, dead ones drop out."""
+    _tracked.setdefault(name, weakref.WeakSet()).add(obj)
+
+def lru_info(fn: Any) -> Dict[str, Any]:
+    """functools.lru_cache exposes counts only, not its entries."""
+    info = fn.cache_info()
+    return {"entries": info.currsize, "max_entries": info.maxsize, "bytes": None, "hits": info.hits, "misses": info.misses}
+
+def components() -> Dict[str, Any]:
+    out: Dict[str, Any] = {}
+    for name, fn in list(_components.items()):
+        try:
+            out[name] = fn()
+        except Exception as e:
+            out[name] = {"error": f"{e.__class__.__name__}: {e}"}
+    for name, refs in list(_tracked.items()):
+        items = []
+        for obj in list(refs):
+            try:
+                items.append(obj.memory_info())
+            except Exception as e:
+                items.append({"error": f"{e.__class__.__name__}: {e}"})
+        out[name] = {"instances": len(items), "entries": sum(i.get("entries") or 0 for i in items),
+                     "bytes": sum(i.get("bytes") or 0 for i in items), "items": items}
+    return out
+
+def process_memory() -> Dict[str, Any]:
+    out: Dict[str, Any] = {"pid": os.getpid()}
+    try:
+        with open("/proc/self/status", encoding="ascii") as f:
+            for line in f:
+                key, _, rest = line.partition(":")
+                if key in ("VmRSS", "VmHWM", "VmSize", "RssAnon", "RssFile", "VmSwap"):
+                    out[key.lower() + "_bytes"] = int(rest.split()[0]) * 1024
+                elif key == "Threads":
+                    out["threads"] = int(rest)
+    except OSError:
+        # no procfs (macOS): peak RSS only, reported in bytes there and in KiB on Linux
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        out["vmhwm_bytes"] = peak if sys.platform == "darwin" else peak * 1024
+    out["gc_objects"] = len(gc.get_objects())
+    return out
+
+# ---------------- Chroma / ONNX (scanned from the heap) ----------------
+
+def _instances(cls: type) -> List[Any]:
+    # type(), not isinstance: lazy module proxies (openai's pandas/numpy shims) import on __class__ access
+    return [o for o in gc.get_objects() if issubclass(type(o), cls)]
+
+def vector_store() -> Dict[str, Any]:
+    """Loaded HNSW segments, collections and ONNX embedding sessions. Blocking (sqlite counts); run off the loop."""
+    try:
+        from chromadb.api.models.Collection import Collection
+        from chromadb.segment.impl.vector.local_hnsw import LocalHnswSegment
+        from chromadb.utils.embedding_functions.onnx_mini_lm_l6_v2 import ONNXMiniLM_L6_V2
+    except ImportError:
+        return {}
+    names: Dict[str, str] = {}
+    collections: Dict[str, Dict[str, Any]] = {}
+    handles: Dict[str, int] = {}
+    for col in _instances(Collection):
+        cid = str(col.id)
+        names[cid] = col.name
+        handles[cid] = handles.get(cid, 0) + 1
+        if cid not in collections:
+            try:
+                collections[cid] = {"name": col.name, "vectors": int(col.count())}
+            except Exception as e:
+                collections[cid] = {"name": col.name, "error": str(e)}
+    for cid, n in handles.items():
+        collections[cid]["handles"] = n
+
+    segments = []
+    for seg in _instances(LocalHnswSegment):
+        idx = getattr(seg, "_index", None)
+        row: Dict[str, Any] = {"collection": names.get(str(seg._collection), str(seg._collection)), "loaded": idx is not None}
+        if idx is not None:
+            # hnswlib preallocates max_elements slots of (vector + level-0 links + label) each
+            per_elem = idx.dim * 4 + idx.M * 2 * 4 + 16
+            row.update(vectors=idx.element_count, max_elements=idx.max_elements, dim=idx.dim, M=idx.M,
+                       index_bytes_est=idx.max_elements * per_elem)
+        row["id_maps_bytes"] = sum(approx_size(getattr(seg, a, {})) for a in ("_id_to_label", "_label_to_id", "_id_to_seq_id"))
+        segments.append(row)
+
+    sessions = _instances(ONNXMiniLM_L6_V2)
+    loaded = [ef for ef in sessions if "model" in vars(ef)]     # InferenceSession is a cached_property, built on first call
+    model_path = os.path.join(ONNXMiniLM_L6_V2.DOWNLOAD_PATH, ONNXMiniLM_L6_V2.EXTRACTED_FOLDER_NAME, "model.onnx")
+    model_bytes = os.path.getsize(model_path) if os.path.exists(model_path) else None
+    return {
+        "collections": list(collections.values()),
+        "hnsw_segments": segments,
+        "embedding_functions": {"instances": len(sessions), "onnx_sessions": len(loaded), "model_file_bytes": model_bytes,
+                                "sessions_bytes_est": model_bytes * len(loaded) if model_bytes else None},
+    }
+
+# ---------------- tracemalloc ----------------
+
+_IGNORE = (tracemalloc.Filter(False, tracemalloc.__file__), tracemalloc.Filter(False, "<frozen importlib._bootstrap*>"),
+           tracemalloc.Filter(False, "<unknown>"))
+
+def top_allocations(snapshot: "tracemalloc.Snapshot", top: int, group_by: str = "lineno") -> Dict[str, Any]:
+    stats = snapshot.filter_traces(_IGNORE).statistics(group_by)
+    return {
+        "traced_bytes": sum(s.size for s in stats),
+        "top": [{"location": "; ".join(f"{fr.filename}:{fr.lineno}" for fr in s.traceback), "bytes": s.size, "blocks": s.count}
+                for s in stats[:top]],
+    }
@@ -0,0 +1,271 @@
+# app/utils/metrics.py
+# Process-wide metrics rendered in the Prometheus text exposition format (GET /metrics).
+# Dependency-free and cheap enough to leave on: an observation is one lock, a dict lookup on the label tuple and,
+# for histograms, a bisect into fixed buckets. Everything else (cumulative buckets, text) happens at scrape time.
+# The request-scoped labels (endpoint, agent) live in context variables set by MetricsMiddleware and @agent_run, so
+# deep call sites (LLM client, vector search, answer cache) are labelled without threading them through signatures.
+# Values read from existing stats (limiter, caches, breakers) are registered as gauge callbacks and sampled per scrape.
+
+import functools
+import math
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+from app.config.app_config import AppConfigSingleton
+from app.utils import memory
+
+_cfg = AppConfigSingleton.instance()
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+_endpoint: ContextVar[str] = ContextVar("metrics_endpoint", default="")
+_agent: ContextVar[str] = ContextVar("metrics_agent", default="")
+
+def current_labels() -> Dict[str, str]:
+    """endpoint / agent of the request being served ("" outside one)."""
+    return {"endpoint": _endpoint.get(), "agent": _agent.get()}
+
+def _escape(v: Any) -> str:
+    return str(v).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _fmt(v: float) -> str:
+    if v == math.inf:
+        return "+Inf"
+    return repr(float(v)) if isinstance(v, float) and not v.is_integer() else str(int(v))
+
+def _labelstr(names: Sequence[str], values: Sequence[Any], extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, doc: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.doc = doc
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Tuple[str, ...], Any] = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, Any]) -> Tuple[str, ...]:
+        return tuple(str(labels.get(n, "")) for n in self.labelnames)
+
+    def header(self) -> List[str]:
+        return [f"# HELP {self.name} {self.doc}", f"# TYPE {self.name} {self.kind}"]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._values.clear()
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount: float = 1.0, **labels: Any) -> None:
+        if not _cfg.metrics_enabled:
+            return
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self) -> List[str]:
+        with self._lock:
+            items = list(self._values.items())
+        return [f"{self.name}{_labelstr(self.labelnames, k)} {_fmt(v)}" for k, v in items]
+
+class Gauge(_Metric):
+    """Set directly, or pass fn returning {label-values tuple: value} to sample it at scrape time."""
+    kind = "gauge"
+
+    def __init__(self, name: str, doc: str, labelnames: Sequence[str] = (),
+                 fn: Optional[Callable[[], Dict[Tuple[Any, ...], float]]] = None):
+        super().__init__(name, doc, labelnames)
+        self.fn = fn
+
+    def set(self, value: float, **labels: Any) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def render(self) -> List[str]:
+        if self.fn is not None:
+            try:
+                items = [(tuple(str(x) for x in k), v) for k, v in self.fn().items() if v is not None]
+            except Exception:
+                return []
+        else:
+            with self._lock:
+                items = list(self._values.items())
+        return [f"{self.name}{_labelstr(self.labelnames, k)} {_fmt(v)}" for k, v in items]
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, doc: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS):
+        super().__init__(name, doc, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, **labels: Any) -> None:
+        if not _cfg.metrics_enabled:
+            return
+        key = self._key(labels)
+        idx = bisect_left(self.buckets, value)  # le semantics: value == bound falls in that bucket
+        with self._lock:
+            row = self._values.get(key)
+            if row is None:
+                row = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0]
+            row[0][idx] += 1
+            row[1] += value
+
+    @contextmanager
+    def time(self, **labels: Any) -> Iterator[Dict[str, Any]]:
+        """`with h.time(stage=...) as lab:` observes the block's wall time; lab can be updated before it ends."""
+        t0 = time.perf_counter()
+        try:
+            yield labels
+        finally:
+            self.observe(time.perf_counter() - t0, **labels)
+
+    def render(self) -> List[str]:
+        with self._lock:
+            items = [(k, list(row[0]), row[1]) for k, row in self._values.items()]
+        out: List[str] = []
+        for key, counts, total in items:
+            acc = 0
+            for bound, n in zip((*self.buckets, math.inf), counts):
+                acc += n
+                le = 'le="%s"' % _fmt(bound)
+                out.append(f"{self.name}_bucket{_labelstr(self.labelnames, key, le)} {acc}")
+            out.append(f"{self.name}_sum{_labelstr(self.labelnames, key)} {total!r}")
+            out.append(f"{self.name}_count{_labelstr(self.labelnames, key)} {acc}")
+        return out
+
+class Registry:
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric: _Metric) -> _Metric:
+        with self._lock:
+            # modules may be re-imported (reload, CLI runpy); keep the first instance so call sites share one series
+            return self._metrics.setdefault(metric.name, metric)
+
+    def counter(self, name: str, doc: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self.register(Counter(name, doc, labelnames))  # type: ignore[return-value]
+
+    def gauge(self, name: str, doc: str, labelnames: Sequence[str] = (),
+              fn: Optional[Callable[[], Dict[Tuple[Any, ...], float]]] = None) -> Gauge:
+        return self.register(Gauge(name, doc, labelnames, fn))  # type: ignore[return-value]
+
+    def histogram(self, name: str, doc: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, doc, labelnames, buckets))  # type: ignore[return-value]
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines: List[str] = []
+        for m in metrics:
+            lines.extend(m.header())
+            lines.extend(m.render())
+        return "\n".join(lines) + "\n"
+
+    def memory_info(self) -> Dict[str, Any]:
+        # one entry per label combination: this is where unbounded label values would show up
+        with self._lock:
+            metrics = list(self._metrics.values())
+        series = {m.name: len(m._values) for m in metrics if m._values}
+        return {"entries": sum(series.values()), "bytes": sum(memory.approx_size(m._values) for m in metrics),
+                "series_by_metric": series}
+
+    def reset(self) -> None:
+        for m in list(self._metrics.values()):
+            m.clear()
+
+registry = Registry()
+memory.register("metrics_series", registry.memory_info)
+
+# ---------------- the metrics themselves ----------------
+
+HTTP_SECONDS = registry.histogram("rag_http_request_seconds", "End-to-end HTTP request latency.", ("endpoint", "method", "status"))
+AGENT_SECONDS = registry.histogram("rag_agent_run_seconds", "End-to-end agent / RAG run latency.", ("endpoint", "agent", "outcome"))
+EMBED_SECONDS = registry.histogram("rag_embed_seconds", "Embedding latency (ONNX), per call.", ("kind",))
+VECTOR_QUERY_SECONDS = registry.histogram("rag_vector_query_seconds", "Vector store query latency including retries.",
+                                          ("collection", "outcome"))
+RETRIEVAL_STAGE_SECONDS = registry.histogram("rag_retrieval_stage_seconds", "Latency of one filter-relaxation stage of vector_search.",
+                                             ("stage", "outcome"))
+LLM_SECONDS = registry.histogram("rag_llm_call_seconds", "LLM chat completion latency (after the limiter slot is acquired).",
+                                 ("endpoint", "agent", "model", "outcome"))
+LLM_QUEUE_SECONDS = registry.histogram("rag_llm_queue_seconds", "Time spent waiting for an LLM limiter slot.", ("endpoint", "agent"))
+SCORING_SECONDS = registry.histogram("rag_scoring_seconds", "Output scoring latency.", ("scoring_model",),
+                                     buckets=(0.0001, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.5))
+
+LLM_TOKENS = registry.counter("rag_llm_tokens_total", "LLM tokens used.", ("endpoint", "agent", "model", "kind"))
+CACHE_LOOKUPS = registry.counter("rag_answer_cache_lookups_total", "Answer cache lookups by result (exact_hit, semantic_hit, miss).",
+                                 ("endpoint", "agent", "result"))
+RETRIES = registry.counter("rag_retries_total", "Retried attempts made by with_retries_async.", ("endpoint", "agent", "breaker"))
+BREAKER_TRANSITIONS = registry.counter("rag_circuit_breaker_transitions_total", "Circuit breaker state changes.", ("breaker", "state"))
+
+# ---------------- helpers for call sites ----------------
+
+def agent_run(name: Optional[str] = None):
+    """Decorator for an async agent entry point: sets the agent label for everything it calls and times the run.
+    Without a name the instance's class name is used (decorate methods)."""
+    def deco(fn):
+        @functools.wraps(fn)
+        async def wrapper(*args, **kwargs):
+            agent = name or type(args[0]).__name__
+            token = _agent.set(agent)
+            outcome = "error"
+            t0 = time.perf_counter()
+            try:
+                out = await fn(*args, **kwargs)
+                outcome = "ok"
+                return out
+            finally:
+                AGENT_SECONDS.observe(time.perf_counter() - t0, endpoint=_endpoint.get(), agent=agent, outcome=outcome)
+                _agent.reset(token)
+        return wrapper
+    return deco
+
+def _route_template(scope: Dict[str, Any]) -> str:
+    # label by route template (/eval/batch/{run_id}), never the raw path, to keep cardinality bounded
+    from starlette.routing import Match
+    app = scope.get("app")
+    partial = None
+    for route in getattr(getattr(app, "router", None), "routes", ()):
+        match, _ = route.matches(scope)
+        if match == Match.FULL:
+            return getattr(route, "path", "other")
+        if match == Match.PARTIAL and partial is None:
+            partial = getattr(route, "path", None)
+    return partial or "other"
+
+class MetricsMiddleware:
+    """Pure ASGI middleware: sets the endpoint label and observes request latency until the response body is sent."""
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not _cfg.metrics_enabled:
+            await self.app(scope, receive, send)
+            return
+        endpoint = _route_template(scope)
+        token = _endpoint.set(endpoint)
+        status = ["500"]
+
+        async def _send(message):
+            if message["type"] == "http.response.start":
+                status[0] = str(message["status"])
+            await send(message)
+
+        t0 = time.perf_counter()
+        try:
+            await self.app(scope, receive, _send)
+        finally:
+            HTTP_SECONDS.observe(time.perf_counter() - t0, endpoint=endpoint, method=scope.get("method", ""), status=status[0])
+            _endpoint.reset(token)
@@ -0,0 +1,204 @@
+# app/utils/profiler.py
+# On-demand sampling profiler. A background thread snapshots every thread's Python stack (sys._current_frames) each
+# profiling_interval_ms, so it needs no interpreter hooks and sees everything a request does: coroutines while they
+# run on the event-loop thread (the react agents' TaskGroup variants included) and the blocking work handed to
+# asyncio.to_thread / executor threads (ONNX embedding, Chroma queries). Idle samples (selector waits, parked
+# workers) are counted but left out of the stacks. Other requests in flight during the window are sampled too.
+# Results: top-N functions by self and inclusive samples, and folded stacks ("a;b;c count") for flamegraph.pl or
+# speedscope. Gated by profiling_enabled (and profiling_token when set); one profile runs at a time.
+
+import json
+import os
+import re
+import sys
+import threading
+import time
+import uuid
+from collections import Counter, OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+from app.config.app_config import AppConfigSingleton
+from app.utils.app_logging import get_logger
+from app.utils import memory
+
+_cfg = AppConfigSingleton.instance()
+_logger = get_logger(_cfg)
+
+PROFILE_HEADER = "x-profile"
+_HEADER_BYTES = PROFILE_HEADER.encode()
+_IDLE_LEAVES = {("selectors.py", "select"), ("threading.py", "wait"), ("queue.py", "get"), ("thread.py", "_worker"),
+                ("socket.py", "accept"), ("threading.py", "_wait_for_tstate_lock")}
+_THREAD_SUFFIX = re.compile(r"[_-]\d+(?: \(.*\))?$")
+_MAX_DEPTH = 128
+_KEEP = 20
+
+def _label(code) -> str:
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+class StackSampler:
+    def __init__(self, interval_s: float):
+        self.interval_s = max(0.001, interval_s)
+        self.samples: Counter = Counter()      # (thread group, code objects root-first) -> count
+        self.idle = 0
+        self.ticks = 0
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.started = self.stopped = 0.0
+
+    def start(self) -> "StackSampler":
+        self.started = time.time()
+        self._thread = threading.Thread(target=self._run, name="stack-sampler", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> "StackSampler":
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        self.stopped = time.time()
+        return self
+
+    def _run(self) -> None:
+        me = threading.get_ident()
+        while not self._stop.wait(self.interval_s):
+            names = {t.ident: t.name for t in threading.enumerate()}
+            self.ticks += 1
+            for tid, frame in sys._current_frames().items():
+                if tid == me:
+                    continue
+                leaf = frame.f_code
+                if (os.path.basename(leaf.co_filename), leaf.co_name) in _IDLE_LEAVES:
+                    self.idle += 1
+                    continue
+                stack = []
+                while frame is not None and len(stack) < _MAX_DEPTH:
+                    stack.append(frame.f_code)
+                    frame = frame.f_back
+                group = _THREAD_SUFFIX.sub("", names.get(tid, "thread"))
+                self.samples[(group, tuple(reversed(stack)))] += 1
+
+    def report(self, top_n: int = 30) -> Dict[str, Any]:
+        own: Counter = Counter()
+        total: Counter = Counter()
+        folded: Counter = Counter()
+        for (group, stack), n in self.samples.items():
+            labels = [_label(c) for c in stack]
+            own[labels[-1]] += n
+            for lab in set(labels):
+                total[lab] += n
+            folded[";".join([group, *labels])] += n
+        busy = sum(self.samples.values())
+        pct = lambda n: round(100.0 * n / busy, 2) if busy else 0.0
+        return {
+            "started": self.started,
+            "duration_s": round((self.stopped or time.time()) - self.started, 3),
+            "interval_ms": round(self.interval_s * 1000, 2),
+            "ticks": self.ticks,
+            "busy_samples": busy,
+            "idle_samples": self.idle,
+            "top_self": [{"function": f, "samples": n, "pct": pct(n)} for f, n in own.most_common(top_n)],
+            "top_total": [{"function": f, "samples": n, "pct": pct(n)} for f, n in total.most_common(top_n)],
+            "collapsed": "\n".join(f"{k} {n}" for k, n in folded.most_common()),
+        }
+
+class Profiles:
+    """Single-slot sampler plus the last few reports (memory, and profile_dir on disk)."""
+    def __init__(self):
+        self._busy = threading.Lock()
+        self._recent: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+
+    def allowed(self, token: Optional[str]) -> bool:
+        if not _cfg.profiling_enabled:
+            return False
+        return not _cfg.profiling_token or token == _cfg.profiling_token
+
+    def begin(self) -> Optional[StackSampler]:
+        if not self._busy.acquire(blocking=False):
+            return None
+        return StackSampler(_cfg.profiling_interval_ms / 1000.0).start()
+
+    def end(self, sampler: StackSampler, **meta: Any) -> Dict[str, Any]:
+        try:
+            report = sampler.stop().report()
+        finally:
+            self._busy.release()
+        profile_id = meta.pop("profile_id", None) or uuid.uuid4().hex[:12]
+        report = {"profile_id": profile_id, **meta, **report}
+        self._recent[profile_id] = report
+        while len(self._recent) > _KEEP:
+            self._recent.popitem(last=False)
+        if _cfg.profile_dir:
+            try:
+                os.makedirs(_cfg.profile_dir, exist_ok=True)
+                with open(os.path.join(_cfg.profile_dir, f"{profile_id}.json"), "w", encoding="utf-8") as f:
+                    json.dump(report, f)
+            except OSError as e:
+                _logger.warning("[Profiler] could not store profile %s: %s", profile_id, e)
+        _logger.info("[Profiler] profile=%s %s busy_samples=%d", profile_id, meta.get("target"), report["busy_samples"])
+        return report
+
+    def get(self, profile_id: str) -> Optional[Dict[str, Any]]:
+        if profile_id in self._recent:
+            return self._recent[profile_id]
+        path = os.path.join(_cfg.profile_dir or "", f"{os.path.basename(profile_id)}.json")
+        if _cfg.profile_dir and os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                return json.load(f)
+        return None
+
+    def memory_info(self) -> Dict[str, Any]:
+        return {"entries": len(self._recent), "bytes": memory.approx_size(self._recent)}
+
+    def list(self) -> List[Dict[str, Any]]:
+        return [{"profile_id": k, "target": r.get("target"), "duration_s": r["duration_s"], "busy_samples": r["busy_samples"]}
+                for k, r in reversed(self._recent.items())]
+
+profiles = Profiles()
+memory.register("profiles", profiles.memory_info)
+
+def _request_flag(scope: Dict[str, Any]) -> Tuple[bool, Optional[str]]:
+    for k, v in scope.get("headers") or ():
+        if k == _HEADER_BYTES:
+            return True, v.decode("latin-1")
+    qs = scope.get("query_string") or b""
+    if b"profile=" in qs:
+        from urllib.parse import parse_qs
+        vals = parse_qs(qs.decode("latin-1")).get("profile")
+        if vals:
+            return True, vals[0]
+    return False, None
+
+class ProfilingMiddleware:
+    """
+    Pure ASGI middleware: a request carrying X-Profile: <token> (or ?profile=<token>) runs under the sampler when
+    profiling is enabled and the token matches. The response gets X-Profile-Id; the report is at /debug/profile/{id}.
+    """
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        # /debug/* takes the same header as its credential; never profile the profiler endpoints themselves
+        if scope["type"] != "http" or not _cfg.profiling_enabled or scope.get("path", "").startswith("/debug/"):
+            await self.app(scope, receive, send)
+            return
+        wanted, token = _request_flag(scope)
+        if not wanted or not profiles.allowed(token):
+            await self.app(scope, receive, send)
+            return
+        sampler = profiles.begin()
+        profile_id = uuid.uuid4().hex[:12]
+
+        async def _send(message):
+            if message["type"] == "http.response.start":
+                status = b"sampled" if sampler is not None else b"busy"
+                headers = list(message.get("headers") or [])
+                headers.append((b"x-profile-status", status))
+                if sampler is not None:
+                    headers.append((b"x-profile-id", profile_id.encode()))
+                message = dict(message, headers=headers)
+            await send(message)
+
+        try:
+            await self.app(scope, receive, _send)
+        finally:
+            if sampler is not None:
+                profiles.end(sampler, profile_id=profile_id, target=f"{scope.get('method')} {scope.get('path')}")
@@ -0,0 +1,224 @@
+# app/utils/rate_limiter.py
+# Process-wide limiter for LLM calls: token buckets on requests/min and tokens/min plus an AIMD concurrency cap.
+# Buckets hand out reservations (balance may go negative) so waiters are served in arrival order without a lock.
+# The concurrency cap halves on 429s and shrinks on latency spikes, then grows back by ~1 per window of successes.
+
+import asyncio
+import time
+from collections import deque
+from typing import Any, Deque, Dict, Optional
+
+def _percentile(values, q: float) -> float:
+    if not values:
+        return 0.0
+    s = sorted(values)
+    return s[min(len(s) - 1, int(q * len(s)))]
+
+class TokenBucket:
+    def __init__(self, per_minute: float, capacity: Optional[float] = None):
+        self.rate = per_minute / 60.0
+        self.capacity = capacity if capacity is not None else per_minute
+        self._tokens = self.capacity
+        self._stamp = time.monotonic()
+
+    @property
+    def enabled(self) -> bool:
+        return self.rate > 0
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._stamp) * self.rate)
+        self._stamp = now
+
+    def reserve(self, amount: float) -> float:
+        """Take `amount` now and return how long the caller must wait before using it."""
+        if not self.enabled:
+            return 0.0
+        self._refill()
+        self._tokens -= min(amount, self.capacity)
+        return max(0.0, -self._tokens / self.rate)
+
+    def adjust(self, delta: float) -> None:
+        # reconcile an estimate against actual usage (positive delta = used more than reserved)
+        if self.enabled:
+            self._refill()
+            self._tokens -= delta
+
+    def drain(self) -> None:
+        if self.enabled:
+            self._refill()
+            self._tokens = min(self._tokens, 0.0)
+
+    def available(self) -> float:
+        self._refill()
+        return self._tokens
+
+class AdaptiveConcurrency:
+    def __init__(self, initial: int = 16, minimum: int = 1, maximum: int = 256,
+                 latency_spike_factor: float = 2.0, decrease_cooldown_sec: float = 1.0):
+        self.minimum, self.maximum = max(1, minimum), max(minimum, maximum)
+        self.limit = float(min(max(initial, self.minimum), self.maximum))
+        self.latency_spike_factor = latency_spike_factor
+        self.decrease_cooldown_sec = decrease_cooldown_sec
+        self.in_flight = 0
+        self._waiters: Deque[asyncio.Future] = deque()
+        self._latency_ewma: Optional[float] = None
+        self._last_decrease = 0.0
+
+    async def acquire(self) -> None:
+        if self.in_flight < int(self.limit) and not self._waiters:
+            self.in_flight += 1
+            return
+        fut = asyncio.get_running_loop().create_future()
+        self._waiters.append(fut)
+        try:
+            await fut
+        except asyncio.CancelledError:
+            if fut.done() and not fut.cancelled():
+                # slot was handed over just as we were cancelled: give it back
+                self._release_slot()
+            else:
+                self._waiters.remove(fut)
+            raise
+
+    def _release_slot(self) -> None:
+        self.in_flight -= 1
+        self._wake()
+
+    def _wake(self) -> None:
+        while self._waiters and self.in_flight < int(self.limit):
+            fut = self._waiters.popleft()
+            if not fut.done():
+                self.in_flight += 1
+                fut.set_result(None)
+
+    def _decrease(self, factor: float) -> None:
+        now = time.monotonic()
+        if now - self._last_decrease >= self.decrease_cooldown_sec:
+            self.limit = max(float(self.minimum), self.limit * factor)
+            self._last_decrease = now
+
+    def release(self, latency_s: Optional[float], rate_limited: bool = False, failed: bool = False) -> None:
+        if rate_limited:
+            self._decrease(0.5)
+        elif not failed and latency_s is not None:
+            ewma = self._latency_ewma
+            if ewma is not None and latency_s > ewma * self.latency_spike_factor:
+                self._decrease(0.9)
+            else:
+                self.limit = min(float(self.maximum), self.limit + 1.0 / self.limit)
+            self._latency_ewma = latency_s if ewma is None else 0.8 * ewma + 0.2 * latency_s
+        self._release_slot()
+
+class _Slot:
+    def __init__(self, limiter: "LLMRateLimiter", est_tokens: int):
+        self._limiter = limiter
+        self.est_tokens = est_tokens
+        self.queue_wait_s = 0.0
+        self._t0 = 0.0
+        self._recorded = False
+
+    async def __aenter__(self) -> "_Slot":
+        self.queue_wait_s = await self._limiter._acquire(self.est_tokens)
+        self._t0 = time.perf_counter()
+        return self
+
+    def record(self, resp: Any) -> None:
+        usage = getattr(resp, "usage", None)
+        if usage is None or self._recorded:
+            return
+        used = getattr(usage, "total_tokens", None) or (
+            (getattr(usage, "prompt_tokens", 0) or 0) + (getattr(usage, "completion_tokens", 0) or 0))
+        if used:
+            self._limiter.tokens.adjust(used - self.est_tokens)
+            self._recorded = True
+
+    async def __aexit__(self, exc_type, exc, tb) -> bool:
+        self._limiter._release(time.perf_counter() - self._t0, exc)
+        return False
+
+class LLMRateLimiter:
+    """Shared gate for chat completions: `async with limiter.slot(est_tokens) as s: resp = ...; s.record(resp)`."""
+
+    def __init__(self, requests_per_minute: int = 0, tokens_per_minute: int = 0,
+                 concurrency: Optional[AdaptiveConcurrency] = None, is_rate_limited=None):
+        self.requests = TokenBucket(requests_per_minute)
+        self.tokens = TokenBucket(tokens_per_minute)
+        self.concurrency = concurrency or AdaptiveConcurrency()
+        self._is_rate_limited = is_rate_limited or (lambda e: False)
+        self._paused_until = 0.0
+        self._backoff_s = 1.0
+        self._waits: Deque[float] = deque(maxlen=2048)
+        self._counters = {"requests": 0, "rate_limited": 0, "failed": 0, "cancelled": 0, "queue_wait_sum_s": 0.0, "queue_wait_max_s": 0.0}
+
+    def slot(self, est_tokens: int = 0) -> _Slot:
+        return _Slot(self, est_tokens)
+
+    async def _acquire(self, est_tokens: int) -> float:
+        t0 = time.perf_counter()
+        pause = self._paused_until - time.monotonic()
+        wait = max(self.requests.reserve(1), self.tokens.reserve(est_tokens), pause)
+        if wait > 0:
+            await asyncio.sleep(wait)
+        await self.concurrency.acquire()
+        waited = time.perf_counter() - t0
+        self._waits.append(waited)
+        self._counters["requests"] += 1
+        self._counters["queue_wait_sum_s"] += waited
+        self._counters["queue_wait_max_s"] = max(self._counters["queue_wait_max_s"], waited)
+        return waited
+
+    def _release(self, latency_s: float, exc: Optional[BaseException]) -> None:
+        if isinstance(exc, asyncio.CancelledError):
+            # caller gave up (e.g. a losing variant): says nothing about the API's health
+            self._counters["cancelled"] += 1
+            self.concurrency.release(None, failed=True)
+            return
+        rate_limited = exc is not None and self._is_rate_limited(exc)
+        if rate_limited:
+            # 429: everyone backs off together instead of each caller retrying into the storm
+            self._counters["rate_limited"] += 1
+            retry_after = _retry_after(exc)
+            self._backoff_s = min(30.0, self._backoff_s * 2) if retry_after is None else retry_after
+            self._paused_until = max(self._paused_until, time.monotonic() + self._backoff_s)
+            self.requests.drain()
+        elif exc is None:
+            self._backoff_s = 1.0
+        else:
+            self._counters["failed"] += 1
+        self.concurrency.release(None if exc is not None else latency_s, rate_limited=rate_limited, failed=exc is not None)
+
+    def stats(self) -> Dict[str, Any]:
+        waits = list(self._waits)
+        c = self._counters
+        return {
+            "concurrency_limit": round(self.concurrency.limit, 2),
+            "in_flight": self.concurrency.in_flight,
+            "queued": len(self.concurrency._waiters),
+            "requests_available": round(self.requests.available(), 2) if self.requests.enabled else None,
+            "tokens_available": round(self.tokens.available(), 2) if self.tokens.enabled else None,
+            "paused_for_s": round(max(0.0, self._paused_until - time.monotonic()), 3),
+            "requests": c["requests"],
+            "rate_limited": c["rate_limited"],
+            "failed": c["failed"],
+            "cancelled": c["cancelled"],
+            "queue_wait_ms": {
+                "avg": round(c["queue_wait_sum_s"] / c["requests"] * 1000, 2) if c["requests"] else 0.0,
+                "p50": round(_percentile(waits, 0.50) * 1000, 2),
+                "p95": round(_percentile(waits, 0.95) * 1000, 2),
+                "max": round(c["queue_wait_max_s"] * 1000, 2),
+            },
+        }
+
+def _retry_after(exc: BaseException) -> Optional[float]:
+    headers = getattr(getattr(exc, "response", None), "headers", None) or {}
+    try:
+        value = headers.get("retry-after")
+        return float(value) if value is not None else None
+    except (TypeError, ValueError):
+        return None
+
+def estimate_tokens(messages: Any, max_tokens: Optional[int] = None) -> int:
+    # ~4 chars per token is close enough for budgeting; actual usage is reconciled after the call
+    chars = sum(len(str(m.get("content") or "")) for m in (messages or []) if isinstance(m, dict))
+    return chars // 4 + (max_tokens or 0)
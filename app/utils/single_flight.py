@@ -0,0 +1,53 @@
+# app/utils/single_flight.py
+# In-process request coalescing: concurrent calls with the same key share one in-flight execution.
+# The work runs in its own task, so a caller that disconnects doesn't cancel it for the others;
+# it is cancelled only when every waiter has gone away.
+
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Tuple
+from app.utils import memory
+
+class _Flight:
+    __slots__ = ("task", "waiters")
+
+    def __init__(self, task: asyncio.Task):
+        self.task = task
+        self.waiters = 0
+
+class SingleFlight:
+    def __init__(self):
+        self._flights: Dict[str, _Flight] = {}
+        self.stats = {"leaders": 0, "coalesced": 0, "errors": 0, "max_waiters": 0}
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[Any]]) -> Tuple[Any, bool]:
+        """Run fn() once per key among concurrent callers; returns (result, shared) where shared marks a follower."""
+        flight = self._flights.get(key)
+        shared = flight is not None
+        if flight is None:
+            flight = self._flights[key] = _Flight(asyncio.create_task(fn()))
+            flight.task.add_done_callback(lambda _t: self._flights.pop(key, None) if self._flights.get(key) is flight else None)
+            self.stats["leaders"] += 1
+        else:
+            self.stats["coalesced"] += 1
+        flight.waiters += 1
+        self.stats["max_waiters"] = max(self.stats["max_waiters"], flight.waiters)
+        try:
+            return await asyncio.shield(flight.task), shared
+        except asyncio.CancelledError:
+            if flight.task.cancelled() or flight.waiters > 1:
+                raise
+            flight.task.cancel()
+            raise
+        except Exception:
+            if not shared:
+                self.stats["errors"] += 1
+            raise
+        finally:
+            flight.waiters -= 1
+
+    def info(self) -> Dict[str, Any]:
+        return {"in_flight": len(self._flights), "waiting": sum(f.waiters for f in self._flights.values()), **self.stats}
+
+    def memory_info(self) -> Dict[str, Any]:
+        # a flight holds its task (and through it the run's frames) only until the run finishes
+        return {"entries": len(self._flights), "bytes": memory.approx_size(self._flights)}
@@ -0,0 +1,75 @@
+# app/utils/snippets.py
+# Hit projection helpers: query-centred snippets and metadata field projection.
+
+import re
+from functools import lru_cache
+from typing import Any, Dict, Iterable, List, Optional, Pattern
+from app.utils import memory
+
+_STOP = {
+    "the", "and", "for", "with", "from", "that", "this", "what", "which", "were", "was", "are", "how",
+    "did", "does", "its", "their", "into", "over", "about", "year", "years", "tesla", "company",
+}
+
+def query_terms(query: str) -> List[str]:
+    terms = re.findall(r"[a-z0-9][a-z0-9\-&]{2,}", (query or "").lower())
+    return list(dict.fromkeys(t for t in terms if t not in _STOP))
+
+@lru_cache(maxsize=1024)
+def _terms_pattern(query: str) -> Optional[Pattern[str]]:
+    terms = query_terms(query)
+    if not terms:
+        return None
+    # longest first so "revenues" wins over "revenue" at the same position
+    return re.compile("|".join(re.escape(t) for t in sorted(terms, key=len, reverse=True)), re.IGNORECASE)
+
+memory.register("snippets.term_patterns", lambda: memory.lru_info(_terms_pattern))
+
+def extract_snippet(text: str, query: Optional[str], max_chars: int) -> str:
+    """Return at most max_chars of text, centred on the densest cluster of query-term matches (prefix if none)."""
+    text = text or ""
+    if max_chars <= 0 or len(text) <= max_chars:
+        return text
+    pat = _terms_pattern(query) if query else None
+    hits = [(m.start(), m.group(0).lower()) for m in pat.finditer(text)] if pat else []
+    if not hits:
+        return _trim(text, 0, max_chars)
+
+    # Two-pointer sweep: window of max_chars covering the most (distinct, then total) term matches
+    best = (0, 0, hits[0][0])
+    left = 0
+    counts: Dict[str, int] = {}
+    for right, (pos, term) in enumerate(hits):
+        counts[term] = counts.get(term, 0) + 1
+        while pos - hits[left][0] > max_chars:
+            lt = hits[left][1]
+            counts[lt] -= 1
+            if not counts[lt]:
+                del counts[lt]
+            left += 1
+        cand = (len(counts), right - left + 1, hits[left][0])
+        if cand[:2] > best[:2]:
+            best = cand
+    cluster_start = best[2]
+    cluster_end = max(p for p, _ in hits if cluster_start <= p <= cluster_start + max_chars)
+    centre = (cluster_start + cluster_end) // 2
+    start = max(0, min(len(text) - max_chars, centre - max_chars // 2))
+    return _trim(text, start, max_chars)
+
+def _trim(text: str, start: int, max_chars: int) -> str:
+    end = min(len(text), start + max_chars)
+    # snap to word boundaries so snippets don't open or close mid-word
+    if start > 0:
+        sp = text.find(" ", start, start + 40)
+        start = sp + 1 if sp != -1 else start
+    if end < len(text):
+        sp = text.rfind(" ", end - 40, end)
+        end = sp if sp > start else end
+    return ("…" if start > 0 else "") + text[start:end].strip() + ("…" if end < len(text) else "")
+
+def project_metadata(meta: Optional[Dict[str, Any]], fields: Optional[Iterable[str]]) -> Dict[str, Any]:
+    meta = meta or {}
+    if not fields:
+        return meta
+    keep = set(fields) | {"parent_id"}
+    return {k: v for k, v in meta.items() if k in keep}
@@ -0,0 +1,337 @@
+# app/utils/tracing.py
+# Span tracing for agent runs on the OpenTelemetry SDK (already present as a chromadb dependency).
+#  - one private TracerProvider (the global one is left to whoever else configures OTel in-process)
+#  - ParentBased(TraceIdRatioBased(trace_sample_rate)): a run is sampled as a whole or not at all, and unsampled
+#    spans are non-recording, so the cost left on the hot path is a context switch per span
+#  - exporters: "jsonl" (default; one span per line in trace_file, batched off the request path), "otlp" (gRPC,
+#    configured through the standard OTEL_EXPORTER_OTLP_* variables) or "none"
+#  - the last trace_recent sampled traces stay in memory for /debug/trace/{run_id}; older ones are read back from
+#    the JSONL file
+# The provider flushes pending spans at interpreter exit. Without the SDK every helper degrades to a no-op span.
+
+import functools
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional, Sequence
+from app.config.app_config import AppConfigSingleton
+from app.utils.app_logging import get_logger
+from app.utils import memory
+
+_cfg = AppConfigSingleton.instance()
+_logger = get_logger(_cfg)
+
+_MAX_SPANS_PER_TRACE = 5000
+_ROTATE_BYTES = 64 * 1024 * 1024
+
+class _NoopSpan:
+    def set_attribute(self, key: str, value: Any) -> None: pass
+    def set_attributes(self, attrs: Dict[str, Any]) -> None: pass
+    def record_exception(self, exc: BaseException) -> None: pass
+    def is_recording(self) -> bool: return False
+
+_NOOP = _NoopSpan()
+
+def _attr(v: Any) -> Any:
+    # OTel attributes are primitives or homogeneous sequences of primitives
+    if isinstance(v, (bool, int, float, str)):
+        return v
+    if isinstance(v, (list, tuple)) and all(isinstance(x, (bool, int, float, str)) for x in v):
+        return list(v)
+    return json.dumps(v, default=str)[:1000]
+
+def _clean(attrs: Dict[str, Any]) -> Dict[str, Any]:
+    return {k: _attr(v) for k, v in attrs.items() if v is not None}
+
+def span_to_dict(span: Any) -> Dict[str, Any]:
+    ctx, parent = span.context, span.parent
+    start, end = span.start_time or 0, span.end_time or 0
+    return {
+        "trace_id": format(ctx.trace_id, "032x"),
+        "span_id": format(ctx.span_id, "016x"),
+        "parent_span_id": format(parent.span_id, "016x") if parent is not None else None,
+        "name": span.name,
+        "start_time_unix_nano": start,
+        "end_time_unix_nano": end,
+        "duration_ms": round((end - start) / 1e6, 3),
+        "status": span.status.status_code.name,
+        "attributes": dict(span.attributes or {}),
+    }
+
+# ---------------- exporters / processors (defined only when the SDK is importable) ----------------
+
+try:
+    from opentelemetry import trace as _otel_trace
+    from opentelemetry.sdk.resources import Resource
+    from opentelemetry.sdk.trace import SpanProcessor, TracerProvider
+    from opentelemetry.sdk.trace.export import BatchSpanProcessor, SpanExporter, SpanExportResult
+    from opentelemetry.sdk.trace.sampling import ParentBased, TraceIdRatioBased
+    _OTEL_ERROR: Optional[str] = None
+except Exception as e:
+    _otel_trace = None
+    _OTEL_ERROR = str(e)
+    SpanProcessor = SpanExporter = object  # type: ignore[misc,assignment]
+
+class JsonlSpanExporter(SpanExporter):
+    """Appends one JSON object per finished span; the file is rolled to <path>.1 past 64 MB."""
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+
+    def export(self, spans: Sequence[Any]) -> "SpanExportResult":
+        lines = "".join(json.dumps(span_to_dict(s), separators=(",", ":")) + "\n" for s in spans)
+        try:
+            with self._lock:
+                if os.path.exists(self.path) and os.path.getsize(self.path) > _ROTATE_BYTES:
+                    os.replace(self.path, self.path + ".1")
+                with open(self.path, "a", encoding="utf-8") as f:
+                    f.write(lines)
+            return SpanExportResult.SUCCESS
+        except OSError as e:
+            _logger.warning("[Tracing] export to %s failed: %s", self.path, e)
+            return SpanExportResult.FAILURE
+
+    def shutdown(self) -> None:
+        pass
+
+class RecentTraces(SpanProcessor):
+    """Keeps finished spans of the most recent traces in memory, indexed by trace id and by run_id attribute."""
+    def __init__(self, max_traces: int):
+        self.max_traces = max(1, max_traces)
+        self._traces: "OrderedDict[str, List[Dict[str, Any]]]" = OrderedDict()
+        self._runs: Dict[str, str] = {}
+        self._lock = threading.Lock()
+
+    def on_start(self, span: Any, parent_context: Any = None) -> None:
+        pass
+
+    def on_end(self, span: Any) -> None:
+        d = span_to_dict(span)
+        tid, run_id = d["trace_id"], d["attributes"].get("run_id")
+        with self._lock:
+            spans = self._traces.get(tid)
+            if spans is None:
+                spans = self._traces[tid] = []
+                while len(self._traces) > self.max_traces:
+                    _, dropped = self._traces.popitem(last=False)
+                    for old in dropped:
+                        self._runs.pop(str(old["attributes"].get("run_id")), None)
+            if len(spans) < _MAX_SPANS_PER_TRACE:
+                spans.append(d)
+            if run_id:
+                self._runs[str(run_id)] = tid
+
+    def get(self, key: str) -> Optional[List[Dict[str, Any]]]:
+        with self._lock:
+            tid = self._runs.get(key, key)
+            spans = self._traces.get(tid)
+            return list(spans) if spans else None
+
+    def roots(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            traces = list(self._traces.values())
+        return [{"trace_id": sp["trace_id"], "run_id": sp["attributes"].get("run_id"), "name": sp["name"],
+                 "duration_ms": sp["duration_ms"], "spans": len(spans)}
+                for spans in reversed(traces) for sp in spans if sp["parent_span_id"] is None]
+
+    def memory_info(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"entries": len(self._traces), "spans": sum(len(s) for s in self._traces.values()),
+                    "bytes": memory.approx_size(self._traces) + memory.approx_size(self._runs), "max_traces": self.max_traces}
+
+    def shutdown(self) -> None:
+        pass
+
+    def force_flush(self, timeout_millis: int = 30000) -> bool:
+        return True
+
+# ---------------- provider ----------------
+
+_state: Dict[str, Any] = {"tracer": None, "provider": None, "recent": None, "init": False}
+_init_lock = threading.Lock()
+
+def _exporter() -> Optional[Any]:
+    kind = (_cfg.trace_exporter or "jsonl").lower()
+    if kind == "jsonl":
+        return JsonlSpanExporter(_cfg.trace_file)
+    if kind == "otlp":
+        try:
+            from opentelemetry.exporter.otlp.proto.grpc.trace_exporter import OTLPSpanExporter
+            return OTLPSpanExporter()
+        except Exception as e:
+            _logger.warning("[Tracing] OTLP exporter unavailable, spans kept in memory only: %s", e)
+    return None
+
+def _tracer() -> Optional[Any]:
+    if _state["init"]:
+        return _state["tracer"]
+    with _init_lock:
+        if _state["init"]:
+            return _state["tracer"]
+        if _cfg.tracing_enabled and _otel_trace is not None:
+            rate = min(1.0, max(0.0, _cfg.trace_sample_rate))
+            provider = TracerProvider(sampler=ParentBased(TraceIdRatioBased(rate)),
+                                      resource=Resource.create({"service.name": "gl-rag-app"}))
+            recent = RecentTraces(_cfg.trace_recent)
+            provider.add_span_processor(recent)
+            memory.register("recent_traces", recent.memory_info)
+            exporter = _exporter()
+            if exporter is not None:
+                provider.add_span_processor(BatchSpanProcessor(exporter))
+            _state.update(provider=provider, recent=recent, tracer=provider.get_tracer("app.tracing"))
+            _logger.info("[Tracing] enabled sample_rate=%.3f exporter=%s", rate, _cfg.trace_exporter)
+        elif _cfg.tracing_enabled:
+            _logger.warning("[Tracing] OpenTelemetry SDK unavailable, tracing off: %s", _OTEL_ERROR)
+        _state["init"] = True
+    return _state["tracer"]
+
+# ---------------- helpers for call sites ----------------
+
+@contextmanager
+def span(name: str, **attrs: Any) -> Iterator[Any]:
+    """`with span("agent.loop", loop=2) as sp:` child of the current span; attributes may be added via sp.set_attribute."""
+    tracer = _tracer()
+    if tracer is None:
+        yield _NOOP
+        return
+    parent = _otel_trace.get_current_span()
+    if parent.get_span_context().is_valid and not parent.is_recording():
+        # inside an unsampled trace: ParentBased would drop this span anyway, skip building it
+        yield _NOOP
+        return
+    with tracer.start_as_current_span(name, attributes=_clean(attrs)) as sp:
+        yield sp
+
+def traced(name: str):
+    """Decorator: runs an async function inside span(name)."""
+    def deco(fn):
+        @functools.wraps(fn)
+        async def wrapper(*args, **kwargs):
+            with span(name):
+                return await fn(*args, **kwargs)
+        return wrapper
+    return deco
+
+def set_attributes(sp: Any, **attrs: Any) -> None:
+    """Set attributes on sp, skipping None values (no-op when it isn't recording)."""
+    if sp.is_recording():
+        sp.set_attributes(_clean(attrs))
+
+def annotate(**attrs: Any) -> None:
+    """Set attributes on the current span."""
+    if _state["tracer"] is not None:
+        set_attributes(_otel_trace.get_current_span(), **attrs)
+
+def record(name: str, start_perf: float, **attrs: Any) -> None:
+    """Record an already-finished child span that started at time.perf_counter() value start_perf and ends now."""
+    tracer = _tracer()
+    if tracer is None or not _otel_trace.get_current_span().is_recording():
+        return
+    now_ns = time.time_ns()
+    started = now_ns - int((time.perf_counter() - start_perf) * 1e9)
+    tracer.start_span(name, attributes=_clean(attrs), start_time=started).end(end_time=now_ns)
+
+# ---------------- lookup / critical path ----------------
+
+def _read_jsonl(key: str) -> List[Dict[str, Any]]:
+    paths = [p for p in (_cfg.trace_file + ".1", _cfg.trace_file) if os.path.exists(p)]
+    tid = key if len(key) == 32 and all(c in "0123456789abcdef" for c in key) else None
+    if tid is None:
+        for p in paths:
+            with open(p, encoding="utf-8") as f:
+                for line in f:
+                    if key in line:
+                        d = json.loads(line)
+                        if str(d.get("attributes", {}).get("run_id")) == key:
+                            tid = d["trace_id"]
+    if tid is None:
+        return []
+    out: List[Dict[str, Any]] = []
+    for p in paths:
+        with open(p, encoding="utf-8") as f:
+            out.extend(d for d in map(json.loads, (l for l in f if tid in l)) if d.get("trace_id") == tid)
+    return out
+
+def find_trace(key: str) -> List[Dict[str, Any]]:
+    """Spans of the trace for a run_id (or a trace id): recent traces in memory first, then the JSONL file."""
+    _tracer()
+    recent = _state.get("recent")
+    spans = recent.get(key) if recent is not None else None
+    if spans:
+        return spans
+    if (_cfg.trace_exporter or "").lower() == "jsonl":
+        return _read_jsonl(key)
+    return []
+
+def recent_traces() -> List[Dict[str, Any]]:
+    """Root span of each trace still in memory, newest first."""
+    _tracer()
+    recent = _state.get("recent")
+    return recent.roots() if recent is not None else []
+
+def critical_path(spans: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Span tree plus the critical path: starting from the root, walk back from each span's end through the child that
+    finished last, then the child that finished before that one started, and so on. Sibling work that overlaps a
+    critical child (parallel variants, concurrent sub-questions) is off the path. self_ms is the span's time not
+    covered by its critical children.
+    """
+    if not spans:
+        return {}
+    by_id = {s["span_id"]: dict(s, children=[]) for s in spans}
+    roots = []
+    for s in by_id.values():
+        parent = by_id.get(s.get("parent_span_id"))
+        (parent["children"] if parent is not None else roots).append(s)
+    root = max(roots, key=lambda s: s["end_time_unix_nano"] - s["start_time_unix_nano"])
+    t0 = root["start_time_unix_nano"]
+
+    def _ms(ns: int) -> float:
+        return round(ns / 1e6, 3)
+
+    path: List[Dict[str, Any]] = []
+
+    def _walk(s: Dict[str, Any], depth: int) -> None:
+        chain, t = [], s["end_time_unix_nano"]
+        for c in sorted(s["children"], key=lambda c: c["end_time_unix_nano"], reverse=True):
+            if c["end_time_unix_nano"] <= t:
+                chain.append(c)
+                t = c["start_time_unix_nano"]
+        covered = sum(c["end_time_unix_nano"] - c["start_time_unix_nano"] for c in chain)
+        path.append({"name": s["name"], "depth": depth, "offset_ms": _ms(s["start_time_unix_nano"] - t0),
+                     "duration_ms": s["duration_ms"],
+                     "self_ms": _ms(max(0, s["end_time_unix_nano"] - s["start_time_unix_nano"] - covered)),
+                     "attributes": s["attributes"]})
+        for c in reversed(chain):
+            _walk(c, depth + 1)
+
+    _walk(root, 0)
+
+    def _tree(s: Dict[str, Any]) -> Dict[str, Any]:
+        return {"name": s["name"], "offset_ms": _ms(s["start_time_unix_nano"] - t0), "duration_ms": s["duration_ms"],
+                "status": s["status"], "attributes": s["attributes"],
+                "children": [_tree(c) for c in sorted(s["children"], key=lambda c: c["start_time_unix_nano"])]}
+
+    return {
+        "trace_id": root["trace_id"],
+        "run_id": root["attributes"].get("run_id"),
+        "duration_ms": root["duration_ms"],
+        "span_count": len(spans),
+        "critical_path": path,
+        "top_self_time": sorted(({"name": p["name"], "self_ms": p["self_ms"]} for p in path),
+                                key=lambda p: p["self_ms"], reverse=True)[:5],
+        "tree": _tree(root),
+    }
+
+def render_text(report: Dict[str, Any]) -> str:
+    """Waterfall of the critical path: offset, duration, self time and the most useful attributes per span."""
+    lines = [f"trace {report['trace_id']} run {report.get('run_id')} {report['duration_ms']:.1f} ms, {report['span_count']} spans",
+             f"{'offset':>9} {'dur':>9} {'self':>9}  span"]
+    for p in report["critical_path"]:
+        attrs = " ".join(f"{k}={v}" for k, v in p["attributes"].items() if k not in ("run_id", "question"))
+        lines.append(f"{p['offset_ms']:9.1f} {p['duration_ms']:9.1f} {p['self_ms']:9.1f}  {'  ' * p['depth']}{p['name']} {attrs}".rstrip())
+    return "\n".join(lines) + "\n"
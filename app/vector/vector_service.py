@@ -4,6 +4,7 @@
 from typing import Dict, Any, List, Optional
 from app.config.app_config import AppConfigSingleton
 from app.utils.app_logging import get_logger
+from app.utils import memory
 from app.vector.embedding_service import EmbeddingService
 from app.vector.vector_client import VectorClient, ChromaVectorClient
 from app.config.chroma_client_service import ChromaClientService
@@ -16,6 +17,7 @@ class VectorService:
         self._backend = backend.lower()
         self._embed = EmbeddingService()
         self._cache: Dict[str, List[float]] = {}
+        memory.track("vector_service.query_embeddings", self)
 
         if self._backend == "chroma":
             self.db_client: VectorClient = ChromaVectorClient(ChromaClientService())
@@ -28,6 +30,9 @@ class VectorService:
         else:
             raise ValueError(f"Unsupported vector backend: {backend}")
 
+    def memory_info(self) -> Dict[str, Any]:
+        return {"backend": self._backend, "entries": len(self._cache), "bytes": memory.approx_size(self._cache)}
+
     def get_query_embedding(self, query: str) -> List[float]:
         if query in self._cache:
             return self._cache[query]
@@ -0,0 +1,28 @@
+from app.service.cache.answer_cache import AnswerCache, semantic_scope
+
+_EMB = [0.6, 0.8, 0.0]
+
+def _scope(question, where=None):
+    return semantic_scope("gpt", "prompt-v1", 0.0, question, where)
+
+def _cache_with(question, where=None):
+    cache = AnswerCache(None)
+    cache.put_semantic(_scope(question, where), question, _EMB, "Revenue was 10 [P1].", {"usage": {}}, ["P1"])
+    return cache
+
+def test_questions_differing_only_by_year_do_not_share_an_answer():
+    cache = _cache_with("What was total revenue in 2022?")
+    # identical embedding: only the scope can keep the 2023 question from reusing the 2022 answer
+    assert cache.get_semantic(_scope("What was total revenue in 2023?"), _EMB, ["P1"]) is None
+    hit = cache.get_semantic(_scope("Total revenue in 2022?"), _EMB, ["P1"])
+    assert hit is not None and hit[0]["answer"] == "Revenue was 10 [P1]."
+
+def test_figures_are_part_of_the_scope():
+    assert _scope("Which segments grew more than 5%?") != _scope("Which segments grew more than 15%?")
+    assert _scope("Orders above 1,000 units") == _scope("Orders above 1000 units")
+
+def test_retrieval_filters_are_part_of_the_scope():
+    cache = _cache_with("What was total revenue?", {"year": "2022"})
+    assert cache.get_semantic(_scope("What was total revenue?", {"year": "2023"}), _EMB, ["P1"]) is None
+    assert cache.get_semantic(_scope("What was total revenue?"), _EMB, ["P1"]) is None
+    assert cache.get_semantic(_scope("What was total revenue?", {"year": "2022"}), _EMB, ["P1"]) is not None
@@ -0,0 +1,63 @@
+import logging
+
+import pytest
+
+from app.utils import app_logging
+from app.utils.app_logging import RateLimitFilter
+
+class _Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+@pytest.fixture
+def clock(monkeypatch):
+    c = _Clock()
+    monkeypatch.setattr(app_logging.time, "monotonic", c)
+    return c
+
+def _record(msg="[Tools] vector_search stage=%s", level=logging.INFO, name="gl_rag_app", args=("strict",)):
+    return logging.LogRecord(name, level, __file__, 1, msg, args, None)
+
+def test_burst_then_suppress_per_template(clock):
+    f = RateLimitFilter(per_second=3)
+    passed = [f.filter(_record()) for _ in range(5)]
+    assert passed == [True, True, True, False, False]
+    # another template has its own bucket
+    assert f.filter(_record("[Cache] miss key=%s"))
+
+def test_refill_reports_suppressed_count(clock):
+    f = RateLimitFilter(per_second=2)
+    for _ in range(5):
+        f.filter(_record())
+    clock.now += 1.0
+    rec = _record()
+    assert f.filter(rec)
+    assert rec.suppressed == 3
+    assert rec.getMessage() == "[Tools] vector_search stage=strict [+3 similar suppressed]"
+    nxt = _record()
+    assert f.filter(nxt) and not hasattr(nxt, "suppressed")
+
+def test_warnings_and_errors_always_pass(clock):
+    f = RateLimitFilter(per_second=1)
+    assert all(f.filter(_record(level=logging.WARNING)) for _ in range(10))
+    assert all(f.filter(_record(level=logging.ERROR)) for _ in range(10))
+
+def test_zero_rate_disables_limiting(clock):
+    f = RateLimitFilter(per_second=0)
+    assert all(f.filter(_record()) for _ in range(100))
+
+def test_templates_not_interpolated_messages_are_keyed(clock):
+    # same template with different args shares one bucket
+    f = RateLimitFilter(per_second=1)
+    assert f.filter(_record(args=("a",)))
+    assert not f.filter(_record(args=("b",)))
+
+def test_bucket_table_is_bounded(clock, monkeypatch):
+    monkeypatch.setattr(app_logging, "_MAX_TEMPLATES", 4)
+    f = RateLimitFilter(per_second=1)
+    for i in range(10):
+        f.filter(_record(f"template {i}", args=()))
+    assert len(f._buckets) <= 4
@@ -0,0 +1,45 @@
+import asyncio
+import json
+
+import pytest
+
+from app.service.eval import batch_runner
+from app.service.eval.batch_runner import BatchRun, _parquet_rows
+
+def _run(coro):
+    return asyncio.run(coro)
+
+def _questions(tmp_path, *recs):
+    path = tmp_path / "q.jsonl"
+    path.write_text("".join(json.dumps(r) + "\n" for r in recs))
+    return str(path)
+
+def test_parquet_rows_have_one_type_per_column():
+    records = [
+        {"id": "1", "expected": "Paris", "agent_score": 4, "citations": ["P1"], "usage": {"total_tokens": 3}, "error": None},
+        {"id": "2", "expected": {"answer": 42}, "agent_score": "n/a", "citations": None, "usage": {}, "error": {"type": "X"}},
+        {"id": "3", "expected": None, "agent_score": None},
+    ]
+    rows = _parquet_rows(records)
+    assert [r["expected"] for r in rows] == ['"Paris"', '{"answer": 42}', None]
+    assert [r["agent_score"] for r in rows] == [4.0, None, None]
+    assert [r["citations"] for r in rows] == [["P1"], [], []]
+    assert rows[1]["error"] == '{"type": "X"}' and rows[0]["error"] is None
+
+def test_parquet_failure_keeps_the_run_completed(tmp_path, monkeypatch):
+    async def answer(rec):
+        return {"answer": "ok [P1]", "citations": ["P1"]}
+
+    def broken_write(records, path):
+        raise TypeError("cannot mix list and non-list")
+
+    monkeypatch.setattr(batch_runner, "agent_runner", lambda name: answer)
+    monkeypatch.setattr(batch_runner, "_write_parquet", broken_write)
+    run = BatchRun("rag", _questions(tmp_path, {"question": "a"}, {"question": "b", "expected": [1]}),
+                   str(tmp_path / "out.jsonl"), concurrency=2)
+    run.output_format = "parquet"  # pyarrow is optional; the export itself is replaced above
+    summary = _run(run.run())
+    assert summary["state"] == "completed" and summary["error"] is None
+    assert summary["parquet_error"] == "TypeError: cannot mix list and non-list"
+    assert summary["output_path"] == run.output_path and summary["ok"] == 2
+    assert len((tmp_path / "out.jsonl").read_text().splitlines()) == 2
@@ -0,0 +1,33 @@
+# Benchmark regression gate: reruns the suite with the parameters stored in data/bench/baseline.json and fails on any
+# metric worse than bench_regression_tolerance. Slow and machine-dependent, so deselected unless asked for:
+#   python -m pytest -m benchmark
+import argparse
+import asyncio
+import json
+from pathlib import Path
+
+import pytest
+
+from app.config.app_config import AppConfigSingleton
+
+_cfg = AppConfigSingleton.instance()
+BASELINE = Path(_cfg.bench_dir) / "baseline.json"
+
+@pytest.mark.benchmark
+def test_no_regression_against_baseline(tmp_path):
+    from app.service.eval.benchmark import _embedding_function, run_suite
+
+    if not BASELINE.exists():
+        pytest.skip(f"no baseline at {BASELINE}; record one with python -m app.service.eval.benchmark --save-baseline")
+    meta = json.loads(BASELINE.read_text())["meta"]
+    if meta.get("embedding_function") != _embedding_function():
+        pytest.skip(f"baseline was recorded with {meta.get('embedding_function')}, this environment embeds with "
+                    f"{_embedding_function()}; re-record it with --save-baseline")
+    args = argparse.Namespace(
+        stages=",".join(meta["stages"]), docs=len(meta["documents"]), max_pages=meta["max_pages"],
+        concurrency=",".join(str(c) for c in meta["concurrency"]), requests=meta["requests"],
+        agent_questions=meta["agent_questions"], questions=None, baseline=str(BASELINE), save_baseline=False,
+        tolerance=_cfg.bench_regression_tolerance, output=str(tmp_path / "results.json"), real_llm=False)
+    report = asyncio.run(run_suite(args))
+    regressed = [r for r in report["comparison"]["rows"] if r["regressed"]]
+    assert not regressed, json.dumps(regressed, indent=2)
@@ -0,0 +1,75 @@
+import pytest
+
+from app.utils import context_packer
+from app.utils.context_packer import count_tokens, pack_context
+
+def _chunk(cid, pid, text, score):
+    return {"id": cid, "parent_id": pid, "text": text, "score": score}
+
+CANDIDATES = [
+    _chunk("a-2", "A", "Automotive revenue grew to 20.8 billion in 2019. Gross margin fell slightly year over year.", 0.91),
+    _chunk("a-1", "A", "Energy generation revenue was 1.5 billion in 2019. Storage deployments doubled in the year.", 0.88),
+    _chunk("b-1", "B", "Services and other revenue reached 2.2 billion. Used vehicle sales drove most of the increase.", 0.62),
+    _chunk("c-1", "C", "Research and development expenses were 1.3 billion. Headcount rose in engineering teams.", 0.40),
+]
+
+@pytest.fixture(autouse=True)
+def _fresh_encoder():
+    context_packer._encoder.cache_clear()
+    yield
+    context_packer._encoder.cache_clear()
+
+def test_budget_is_never_exceeded():
+    for budget in (10, 25, 40, 1000):
+        packed = pack_context(CANDIDATES, budget_tokens=budget, max_per_parent=3, dedupe_threshold=0.8)
+        assert packed.tokens <= budget
+        assert packed.tokens == sum(b["tokens"] for b in packed.blocks)
+        assert all(count_tokens(b["text"]) <= b["tokens"] for b in packed.blocks)
+
+def test_every_parent_gets_a_block_before_a_second_one():
+    cands = [
+        _chunk("a-1", "A", "Automotive revenue grew to 20.8 billion in 2019.", 0.95),
+        _chunk("a-2", "A", "Energy generation revenue was 1.5 billion in 2019.", 0.94),
+        _chunk("b-1", "B", "Services and other revenue reached 2.2 billion.", 0.60),
+        _chunk("c-1", "C", "Research and development expenses were 1.3 billion.", 0.40),
+    ]
+    per_block = max(count_tokens(c["text"]) + 1 for c in cands)
+    # room for three blocks: the weakest parent's only chunk wins over A's second-best one
+    packed = pack_context(cands, budget_tokens=3 * per_block, max_per_parent=3, dedupe_threshold=0.8)
+    assert set(packed.parent_ids) == {"A", "B", "C"}
+    assert "a-2" not in [b["id"] for b in packed.blocks]
+    assert packed.stats["over_budget"] == 1
+
+def test_blocks_are_in_stable_parent_chunk_order():
+    shuffled = [CANDIDATES[2], CANDIDATES[0], CANDIDATES[3], CANDIDATES[1]]
+    jittered = [{**c, "score": 1.0 - c["score"]} for c in CANDIDATES]
+    ids = [b["id"] for b in pack_context(CANDIDATES, budget_tokens=1000).blocks]
+    assert ids == ["a-1", "a-2", "b-1", "c-1"]
+    assert [b["id"] for b in pack_context(shuffled, budget_tokens=1000).blocks] == ids
+    assert [b["id"] for b in pack_context(jittered, budget_tokens=1000).blocks] == ids
+
+def test_near_duplicate_sentences_are_dropped():
+    dup = _chunk("b-2", "B", "Automotive revenue grew to 20.8 billion in 2019.", 0.95)
+    packed = pack_context([*CANDIDATES, dup], budget_tokens=1000, max_per_parent=3, dedupe_threshold=0.8)
+    assert packed.stats["dup_sentences"] == 1
+    assert sum("20.8 billion" in t for t in packed.texts()) == 1
+
+def test_per_parent_cap():
+    packed = pack_context(CANDIDATES, budget_tokens=1000, max_per_parent=1)
+    assert packed.stats["per_parent_cap"] == 1
+    assert len(packed.blocks) == 3
+
+def test_empty_and_blank_candidates():
+    packed = pack_context([_chunk("x", "X", "   ", 1.0)], budget_tokens=100)
+    assert packed.blocks == [] and packed.tokens == 0
+
+def test_missing_bpe_file_falls_back_without_network(tmp_path, monkeypatch):
+    import tiktoken.load
+
+    def _no_network(*_a, **_k):
+        raise AssertionError("tiktoken tried to download")
+
+    monkeypatch.setattr(tiktoken.load, "read_file", _no_network)
+    monkeypatch.setattr(context_packer._cfg, "tiktoken_cache_dir", str(tmp_path))
+    assert context_packer._encoder() is None
+    assert count_tokens("x" * 40) == 10
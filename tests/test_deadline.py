@@ -0,0 +1,63 @@
+import time
+
+import pytest
+
+from app.utils.deadline import DEADLINE_HEADER, Deadline, StageTimings
+
+def test_unbounded_deadline_never_expires():
+    d = Deadline(None)
+    assert d.remaining() is None and d.remaining_ms() is None
+    assert not d.below(10_000) and not d.expired
+    assert d.cap(3.0) == 3.0 and d.cap(None) is None
+
+def test_non_positive_budget_is_unbounded():
+    assert Deadline(0).budget_ms is None
+    assert Deadline(-5).remaining() is None
+
+def test_remaining_counts_down_and_expires():
+    d = Deadline(30)
+    assert 0 < d.remaining_ms() <= 30
+    assert d.below(1_000)
+    time.sleep(0.04)
+    assert d.remaining() == 0.0
+    assert d.expired
+
+def test_cap_clamps_to_remaining_minus_reserve_with_floor():
+    d = Deadline(2_000)
+    assert d.cap(10.0) == pytest.approx(2.0, abs=0.05)
+    assert d.cap(0.5) == 0.5
+    assert d.cap(None, reserve_s=1.0) == pytest.approx(1.0, abs=0.05)
+    assert d.cap(10.0, reserve_s=5.0) == 0.05
+
+def test_from_request_prefers_payload_then_header_then_default():
+    headers = {DEADLINE_HEADER: "1500"}
+    assert Deadline.from_request({"deadline_ms": 800}, headers, default_ms=100) == 800.0
+    assert Deadline.from_request({}, headers, default_ms=100) == 1500.0
+    assert Deadline.from_request({}, {}, default_ms=100) == 100
+    assert Deadline.from_request({"deadline_ms": "soon"}, headers, default_ms=100) == 100
+
+def test_note_and_report():
+    d = Deadline(5_000)
+    d.note("retrieval", "relaxation_stopped", query="q")
+    report = d.report()
+    assert report["budget_ms"] == 5_000 and not report["expired"]
+    assert report["degraded"][0]["stage"] == "retrieval"
+    assert report["degraded"][0]["query"] == "q"
+    assert report["degraded"][0]["remaining_ms"] <= 5_000
+
+def test_stage_timings_accumulate_and_merge():
+    t = StageTimings()
+    with t.measure("llm"):
+        time.sleep(0.01)
+    t.add("llm", 5.0)
+    t.merge({"retrieval": 1.234, "llm": 1.0})
+    out = t.as_dict()
+    assert out["llm"] >= 16.0
+    assert out["retrieval"] == 1.23
+
+def test_stage_timings_measure_records_on_error():
+    t = StageTimings()
+    with pytest.raises(RuntimeError):
+        with t.measure("scoring"):
+            raise RuntimeError("boom")
+    assert "scoring" in t.as_dict()
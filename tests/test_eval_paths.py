@@ -0,0 +1,28 @@
+import os
+
+import pytest
+from fastapi import HTTPException
+
+from app.router.eval_router import _confined_path
+
+@pytest.mark.parametrize("name", ["/etc/passwd.jsonl", "../x.jsonl", "a/../../x.jsonl", "a\\..\\..\\x.jsonl",
+                                  "C:/x.jsonl", "\\\\host\\share\\x.jsonl", ""])
+def test_escaping_paths_are_rejected(tmp_path, name):
+    with pytest.raises(HTTPException) as e:
+        _confined_path(name, str(tmp_path), (".jsonl",), "input_path")
+    assert e.value.status_code == 400
+
+def test_wrong_suffix_is_rejected(tmp_path):
+    with pytest.raises(HTTPException):
+        _confined_path("questions.py", str(tmp_path), (".jsonl",), "input_path")
+
+def test_symlink_out_of_root_is_rejected(tmp_path):
+    root = tmp_path / "root"
+    root.mkdir()
+    os.symlink(tmp_path, root / "up")
+    with pytest.raises(HTTPException):
+        _confined_path("up/x.jsonl", str(root), (".jsonl",), "output_path")
+
+def test_relative_path_resolves_under_root(tmp_path):
+    full = _confined_path("documents/q.jsonl", str(tmp_path), (".jsonl",), "input_path")
+    assert full == os.path.join(os.path.realpath(tmp_path), "documents", "q.jsonl")
@@ -0,0 +1,95 @@
+import asyncio
+import re
+
+import pytest
+
+from app.utils import metrics
+from app.utils.metrics import Registry
+
+# one sample line of the Prometheus text format: name{labels} value
+_SAMPLE = re.compile(r'^[a-zA-Z_:][a-zA-Z0-9_:]*(\{([a-zA-Z_][a-zA-Z0-9_]*="(\\.|[^"\\])*",?)*\})? (-?[0-9.e+]+|\+Inf|NaN)$')
+
+def _samples(text):
+    return [l for l in text.splitlines() if l and not l.startswith("#")]
+
+def test_counter_and_gauge_exposition():
+    reg = Registry()
+    c = reg.counter("t_requests_total", "Requests.", ("route",))
+    c.inc(route="/a")
+    c.inc(2, route="/a")
+    c.inc(route="/b")
+    g = reg.gauge("t_in_flight", "In flight.")
+    g.set(3)
+    text = reg.render()
+    assert text.endswith("\n")
+    assert "# HELP t_requests_total Requests.\n# TYPE t_requests_total counter" in text
+    assert '# TYPE t_in_flight gauge' in text
+    assert 't_requests_total{route="/a"} 3' in text
+    assert 't_requests_total{route="/b"} 1' in text
+    assert "t_in_flight 3" in text
+    assert all(_SAMPLE.match(l) for l in _samples(text)), text
+
+def test_histogram_buckets_are_cumulative_with_inf_sum_and_count():
+    reg = Registry()
+    h = reg.histogram("t_seconds", "Latency.", ("op",), buckets=(0.1, 1.0))
+    for v in (0.05, 0.1, 0.5, 2.0):
+        h.observe(v, op="x")
+    lines = _samples(reg.render())
+    assert lines == [
+        't_seconds_bucket{op="x",le="0.1"} 2',
+        't_seconds_bucket{op="x",le="1"} 3',
+        't_seconds_bucket{op="x",le="+Inf"} 4',
+        't_seconds_sum{op="x"} 2.65',
+        't_seconds_count{op="x"} 4',
+    ]
+
+def test_label_values_are_escaped():
+    reg = Registry()
+    reg.counter("t_errors_total", "Errors.", ("msg",)).inc(msg='bad "quote" \\ and\nnewline')
+    line = _samples(reg.render())[0]
+    assert line == 't_errors_total{msg="bad \\"quote\\" \\\\ and\\nnewline"} 1'
+    assert _SAMPLE.match(line)
+
+def test_callback_gauge_sampled_at_scrape_and_failures_skipped():
+    reg = Registry()
+    state = {"v": 1}
+    reg.gauge("t_state", "State.", ("field",), fn=lambda: {("a",): state["v"], ("b",): None})
+    assert _samples(reg.render()) == ['t_state{field="a"} 1']
+    state["v"] = 7
+    assert _samples(reg.render()) == ['t_state{field="a"} 7']
+
+    reg.gauge("t_broken", "Broken.", fn=lambda: 1 / 0)
+    text = reg.render()
+    assert "# TYPE t_broken gauge" in text
+    assert not any(l.startswith("t_broken") for l in _samples(text))
+
+def test_registering_twice_returns_the_first_instance():
+    reg = Registry()
+    first = reg.counter("t_dup_total", "Dup.")
+    assert reg.counter("t_dup_total", "Dup.") is first
+
+def test_disabled_metrics_record_nothing(monkeypatch):
+    reg = Registry()
+    c = reg.counter("t_off_total", "Off.")
+    monkeypatch.setattr(metrics._cfg, "metrics_enabled", False)
+    c.inc()
+    assert _samples(reg.render()) == []
+
+def test_histogram_time_and_agent_run_labels():
+    reg = Registry()
+    h = reg.histogram("t_block_seconds", "Block.", ("stage", "outcome"))
+    with h.time(stage="s") as lab:
+        lab["outcome"] = "ok"
+    assert 't_block_seconds_count{stage="s",outcome="ok"} 1' in reg.render()
+
+    class Agent:
+        @metrics.agent_run()
+        async def run(self):
+            return metrics.current_labels()["agent"]
+
+    assert asyncio.run(Agent().run()) == "Agent"
+    assert metrics.current_labels()["agent"] == ""
+
+@pytest.mark.parametrize("value,expected", [(3, "3"), (2.0, "2"), (0.25, "0.25"), (float("inf"), "+Inf")])
+def test_number_formatting(value, expected):
+    assert metrics._fmt(value) == expected
@@ -0,0 +1,133 @@
+import asyncio
+
+import pytest
+
+from app.service.variants.variant_output_score_service import VariantOutputScoreService as S
+
+FULL = (
+    'Automotive revenue increased from $17.6B in 2018 to $20.8B in 2019 [tesla-10k-2019]. '
+    'Energy revenue was $1.5B [tesla-10k-2020]. Risks include "We may be unable to grow production" [tesla-10k-2019] '
+    'and "Our suppliers may fail to deliver components" [tesla-10k-2020]. Overall revenue grew year over year.'
+)
+
+def test_empty_answer_scores_zero():
+    assert S.score("", [], question="What was revenue?")["score"] == 0.0
+    assert S.score_scalar("", []) == 0.0
+
+def test_every_rubric_item_gives_the_maximum():
+    out = S.score(FULL, [], question="How did automotive revenue change?")
+    assert out["score"] == S.MAX_SCORE
+    assert out["ids_in_answer"] == ["tesla-10k-2019", "tesla-10k-2020"]
+    assert out["quoted_risk_with_cite_count"] == 2
+    assert out["has_year_pair"] and out["has_delta_language"] and out["sentence_like"]
+
+def test_partial_answer_rubric():
+    # citation (1) + number (1) + question term "revenue" (1) = 3 of 10
+    out = S.score("Revenue was 24.6 billion [tesla-10k-2019].", [], question="What was revenue?")
+    assert out["score"] == 1.5
+    assert out["question_terms_overlap"] == ["what", "revenue"]
+    assert out["question_overlap"]
+
+def test_question_terms_skip_short_and_common_words():
+    out = S.score("Nothing relevant here.", [], question="What is the total for those years?")
+    assert out["question_terms_overlap"] == ["what"]
+    assert not out["question_overlap"]
+
+def test_repeated_citations_count_once():
+    out = S.score("A [p1] b [p1] c [p1]", [])
+    assert out["ids_in_answer"] == ["p1"] and out["distinct_parent_ids"] == 1
+
+def test_score_is_bounded():
+    for answer in ("x", FULL, FULL * 3, "[a] [b] " * 100):
+        assert 0.0 <= S.score_scalar(answer, []) <= S.MAX_SCORE
+
+def test_batch_matches_single_scores():
+    answers = [FULL, "Revenue was 24.6 billion [tesla-10k-2019].", "", "Up 5% [x] and down 3% [y]."]
+    q = "How did revenue change?"
+    batch = S.score_batch(answers, question=q)
+    assert [b["score"] for b in batch] == [S.score_scalar(a, [], question=q) for a in answers]
+
+def test_wrappers_agree():
+    q = "How did revenue change?"
+    assert S.score_breakdown(FULL, [], question=q) == S.score(FULL, [], question=q)
+    assert asyncio.run(S.score_async(FULL, [], question=q)) == S.score(FULL, [], question=q)
+
+@pytest.mark.parametrize("word", ["increase", "declined", "grew", "reduction", "∆"])
+def test_delta_language(word):
+    assert S.score(f"Revenue {word} sharply", [])["has_delta_language"]
+
+# ---------------- grounded_v1 ----------------
+
+CONTEXT = [{"id": "p1::chunk::0001", "parent_id": "p1", "embedding": [1.0, 0.0, 0.0]},
+           {"id": "p2::chunk::0001", "parent_id": "p2", "embedding": [0.0, 1.0, 0.0]}]
+
+def _embed(texts):
+    # sentences about revenue point at p1's chunk, about energy at p2's, anything else is off-topic
+    return [[1.0, 0.0, 0.0] if "revenue" in t else [0.0, 1.0, 0.0] if "energy" in t else [0.0, 0.0, 1.0] for t in texts]
+
+def _grounded(answer, **kw):
+    return S.score(answer, [], scoring_model=S.GROUNDED_V1, context=kw.pop("context", CONTEXT), embed_fn=_embed, **kw)
+
+def test_grounded_supported_and_cited_scores_maximum():
+    out = _grounded("Total revenue was 24.6 billion in 2019 [p1]. The energy business grew quickly that year [p2].")
+    assert out["scoring_model"] == S.GROUNDED_V1
+    assert out["sentences"] == 2 and out["supported_sentences"] == 2
+    assert out["grounding"] == 1.0 and out["citation_coverage"] == 1.0
+    assert out["score"] == S.MAX_SCORE
+
+def test_grounded_unsupported_sentence_keeps_only_citation_credit():
+    out = _grounded("The weather was pleasant in Austin that spring [p1].")
+    assert out["grounding"] == 0.0 and out["unsupported_sentences"] == 1
+    assert out["score"] == pytest.approx(S.MAX_SCORE * 0.3)
+    assert out["weakest"][0]["similarity"] == 0.0
+
+def test_grounded_cited_sentence_is_only_compared_with_its_cites():
+    # the revenue sentence matches p1's chunk, but it cites p2
+    out = _grounded("Total revenue was 24.6 billion in 2019 [p2].")
+    assert out["grounding"] == 0.0
+
+def test_grounded_uncited_sentence_compares_with_every_chunk():
+    out = _grounded("Total revenue was 24.6 billion in 2019.")
+    assert out["grounding"] == 1.0 and out["citation_coverage"] == 0.0
+    assert out["score"] == pytest.approx(S.MAX_SCORE * 0.7)
+
+def test_grounded_invalid_citation():
+    out = _grounded("Total revenue was 24.6 billion in 2019 [made-up-doc].")
+    assert out["invalid_citations"] == ["made-up-doc"]
+    assert out["citation_coverage"] == 0.0
+
+def test_grounded_allowed_ids_extend_valid_citations():
+    out = _grounded("Total revenue was 24.6 billion in 2019 [p1] [p9].", allowed_ids=["p9"])
+    assert out["invalid_citations"] == [] and out["citation_coverage"] == 1.0
+
+def test_grounded_cite_after_period_belongs_to_previous_sentence():
+    out = _grounded("Total revenue was 24.6 billion in 2019. [p1] The energy business grew quickly that year. [p2]")
+    assert out["sentences"] == 2
+    assert out["ids_in_answer"] == ["p1", "p2"] and out["citation_coverage"] == 1.0
+
+def test_grounded_without_vectors_or_embedder_falls_back_to_heuristic():
+    no_vectors = [{**c, "embedding": None} for c in CONTEXT]
+    for kw in ({"context": no_vectors, "embed_fn": _embed}, {"context": CONTEXT, "embed_fn": None}):
+        out = S.score(FULL, [], scoring_model=S.GROUNDED_V1, question="How did revenue change?", **kw)
+        assert out["scoring_model"] == S.HEURISTIC_V1 and out["fallback_from"] == S.GROUNDED_V1
+        assert out["score"] == S.score_scalar(FULL, [], question="How did revenue change?")
+
+def test_grounded_batch_embeds_once():
+    calls = []
+
+    def embed(texts):
+        calls.append(len(texts))
+        return _embed(texts)
+
+    answers = ["Total revenue was 24.6 billion in 2019 [p1].", "", "The energy business grew quickly that year [p2]."]
+    out = S.score_batch(answers, scoring_model=S.GROUNDED_V1, context=CONTEXT, embed_fn=embed)
+    assert calls == [2]
+    assert [o["score"] for o in out] == [S.MAX_SCORE, 0.0, S.MAX_SCORE]
+
+def test_target_score_is_the_maximum_unless_opted_in(monkeypatch):
+    from app.service.variants import variant_output_score_service as mod
+    monkeypatch.setattr(mod._cfg, "grounded_target_score", None)
+    assert S.target_score(S.GROUNDED_V1) == S.MAX_SCORE
+    monkeypatch.setattr(mod._cfg, "grounded_target_score", 4.0)
+    assert S.target_score(S.GROUNDED_V1) == 4.0
+    assert S.target_score(S.HEURISTIC_V1) == S.MAX_SCORE
@@ -0,0 +1,147 @@
+import asyncio
+
+import pytest
+
+from app.utils.rate_limiter import AdaptiveConcurrency, LLMRateLimiter, TokenBucket, estimate_tokens
+
+class _RateLimited(Exception):
+    pass
+
+def _run(coro):
+    return asyncio.run(coro)
+
+def test_token_bucket_reservation_goes_negative_and_reports_wait():
+    bucket = TokenBucket(per_minute=60)            # 1 token/s, capacity 60
+    assert bucket.reserve(60) == pytest.approx(0.0, abs=1e-3)
+    assert bucket.reserve(2) == pytest.approx(2.0, abs=0.05)
+
+def test_disabled_bucket_never_waits():
+    bucket = TokenBucket(per_minute=0)
+    assert not bucket.enabled
+    assert bucket.reserve(10_000) == 0.0
+
+def test_additive_increase_on_fast_successes():
+    c = AdaptiveConcurrency(initial=4, maximum=8)
+    for _ in range(4):
+        c.in_flight += 1
+        c.release(0.1)
+    assert c.limit == pytest.approx(5.0, abs=0.1)
+    assert c.in_flight == 0
+
+def test_limit_never_exceeds_maximum():
+    c = AdaptiveConcurrency(initial=4, maximum=5)
+    for _ in range(100):
+        c.in_flight += 1
+        c.release(0.1)
+    assert c.limit == 5.0
+
+def test_multiplicative_decrease_on_rate_limit_respects_cooldown():
+    c = AdaptiveConcurrency(initial=16, minimum=2, decrease_cooldown_sec=60)
+    c.in_flight = 2
+    c.release(None, rate_limited=True)
+    assert c.limit == 8.0
+    c.release(None, rate_limited=True)             # inside the cooldown: one 429 burst halves once
+    assert c.limit == 8.0
+
+def test_decrease_floors_at_minimum():
+    c = AdaptiveConcurrency(initial=2, minimum=2, decrease_cooldown_sec=0)
+    c.in_flight = 1
+    c.release(None, rate_limited=True)
+    assert c.limit == 2.0
+
+def test_latency_spike_shrinks_limit():
+    c = AdaptiveConcurrency(initial=10, latency_spike_factor=2.0, decrease_cooldown_sec=0)
+    c.in_flight = 2
+    c.release(0.1)
+    before = c.limit
+    c.release(1.0)
+    assert c.limit == pytest.approx(before * 0.9)
+
+def test_failures_leave_limit_alone():
+    c = AdaptiveConcurrency(initial=10)
+    c.in_flight = 1
+    c.release(None, failed=True)
+    assert c.limit == 10.0 and c.in_flight == 0
+
+def test_waiters_served_in_arrival_order():
+    async def main():
+        c = AdaptiveConcurrency(initial=1, maximum=1)
+        order = []
+        await c.acquire()
+
+        async def worker(i):
+            await c.acquire()
+            order.append(i)
+            c.release(0.01)
+
+        tasks = [asyncio.create_task(worker(i)) for i in range(3)]
+        await asyncio.sleep(0)
+        assert len(c._waiters) == 3
+        c.release(0.01)
+        await asyncio.gather(*tasks)
+        return order, c
+
+    order, c = _run(main())
+    assert order == [0, 1, 2]
+    assert c.in_flight == 0
+
+def test_cancelled_waiter_does_not_leak_a_slot():
+    async def main():
+        c = AdaptiveConcurrency(initial=1, maximum=1)
+        await c.acquire()
+        waiter = asyncio.create_task(c.acquire())
+        await asyncio.sleep(0)
+        waiter.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiter
+        c.release(0.01)
+        return c
+
+    c = _run(main())
+    assert c.in_flight == 0 and not c._waiters
+
+def test_limiter_pauses_everyone_after_429():
+    async def main():
+        limiter = LLMRateLimiter(is_rate_limited=lambda e: isinstance(e, _RateLimited))
+        with pytest.raises(_RateLimited):
+            async with limiter.slot(10):
+                raise _RateLimited()
+        return limiter.stats()
+
+    stats = _run(main())
+    assert stats["rate_limited"] == 1
+    assert stats["paused_for_s"] > 0
+    assert stats["in_flight"] == 0
+
+def test_cancellation_is_not_counted_as_failure():
+    async def main():
+        limiter = LLMRateLimiter(concurrency=AdaptiveConcurrency(initial=4))
+        with pytest.raises(asyncio.CancelledError):
+            async with limiter.slot(0):
+                raise asyncio.CancelledError()
+        return limiter
+
+    limiter = _run(main())
+    stats = limiter.stats()
+    assert stats["cancelled"] == 1 and stats["failed"] == 0
+    assert limiter.concurrency.limit == 4.0
+
+def test_record_reconciles_token_estimate():
+    class _Usage:
+        total_tokens = 300
+
+    class _Resp:
+        usage = _Usage()
+
+    async def main():
+        limiter = LLMRateLimiter(tokens_per_minute=1000)
+        async with limiter.slot(100) as s:
+            s.record(_Resp())
+            s.record(_Resp())                      # second record is a no-op
+        return limiter
+
+    limiter = _run(main())
+    assert limiter.tokens.available() == pytest.approx(700, abs=1)
+
+def test_estimate_tokens():
+    assert estimate_tokens([{"content": "x" * 40}], max_tokens=10) == 20
@@ -0,0 +1,46 @@
+import pytest
+
+from app.service.eval.retrieval_quality import judge, pareto, score_ranking
+
+def test_recall_counts_share_of_relevant_chunks_in_top_k():
+    out = score_ranking([False, True, False, True], n_relevant=3, ks=[1, 2, 4])
+    assert out["recall@1"] == 0.0
+    assert out["recall@2"] == pytest.approx(1 / 3)
+    assert out["recall@4"] == pytest.approx(2 / 3)
+    assert out["hit@1"] == 0.0 and out["hit@2"] == 1.0 and out["hit@4"] == 1.0
+    assert out["mrr"] == 0.5
+
+def test_recall_is_capped_when_more_chunks_match_than_listed():
+    out = score_ranking([True, True, True], n_relevant=1, ks=[3])
+    assert out["recall@3"] == 1.0
+    assert out["ndcg"] == pytest.approx(1.0)
+
+def test_no_relevant_hit():
+    out = score_ranking([False, False], n_relevant=2, ks=[2])
+    assert out == {"recall@2": 0.0, "hit@2": 0.0, "mrr": 0.0, "ndcg": 0.0}
+
+def test_judge_by_chunk_ids():
+    item = {"chunk_ids": ["p::chunk::1", "p::chunk::7"]}
+    hits = [{"id": "p::chunk::7"}, {"id": "p::chunk::2"}, {"id": "p::chunk::1"}]
+    assert judge(item, hits) == ([True, False, True], 2)
+
+def test_judge_by_evidence_phrase_counts_each_chunk_once():
+    item = {"evidence": "Revenue was $24.58 billion", "chunk_ids": ["a"]}
+    hits = [{"id": "a", "text": "Total revenue was $24.58  billion in 2019."}, {"id": "a", "text": "revenue was $24.58 billion"},
+            {"id": "b", "text": "unrelated"}]
+    assert judge(item, hits) == ([True, False, False], 1)
+
+def test_judge_parent_only_items_count_each_parent_once():
+    item = {"parent_ids": ["tesla-10k-2019", "tesla-10k-2020"]}
+    hits = [{"id": "1", "parent_id": "tesla-10k-2019"}, {"id": "2", "parent_id": "tesla-10k-2019"},
+            {"id": "3", "parent_id": "tesla-10k-2020"}]
+    rels, n = judge(item, hits)
+    assert rels == [True, False, True] and n == 2
+    assert score_ranking(rels, n, [3])["recall@3"] == 1.0
+
+def test_pareto_marks_undominated_rows():
+    rows = [{"recall": 0.8, "mrr": 0.6, "latency_p50_ms": 10, "context_tokens": 500},
+            {"recall": 0.7, "mrr": 0.5, "latency_p50_ms": 12, "context_tokens": 600},
+            {"recall": 0.9, "mrr": 0.6, "latency_p50_ms": 20, "context_tokens": 500}]
+    pareto(rows)
+    assert [r["pareto"] for r in rows] == [True, False, True]
@@ -0,0 +1,102 @@
+import asyncio
+
+import pytest
+
+from app.utils.single_flight import SingleFlight
+
+def _run(coro):
+    return asyncio.run(coro)
+
+def test_concurrent_callers_share_one_execution():
+    calls = []
+
+    async def work():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return {"answer": 42}
+
+    async def main():
+        sf = SingleFlight()
+        results = await asyncio.gather(*(sf.do("k", work) for _ in range(3)))
+        return sf, results
+
+    sf, results = _run(main())
+    assert len(calls) == 1
+    assert [shared for _, shared in results] == [False, True, True]
+    assert all(r == {"answer": 42} for r, _ in results)
+    assert sf.stats["leaders"] == 1 and sf.stats["coalesced"] == 2 and sf.stats["max_waiters"] == 3
+    assert sf.info()["in_flight"] == 0
+
+def test_different_keys_run_separately():
+    async def main():
+        sf = SingleFlight()
+        out = await asyncio.gather(sf.do("a", lambda: asyncio.sleep(0, "a")), sf.do("b", lambda: asyncio.sleep(0, "b")))
+        return sf, out
+
+    sf, out = _run(main())
+    assert out == [("a", False), ("b", False)]
+    assert sf.stats["leaders"] == 2 and sf.stats["coalesced"] == 0
+
+def test_sequential_calls_do_not_coalesce():
+    async def main():
+        sf = SingleFlight()
+        first = await sf.do("k", lambda: asyncio.sleep(0, 1))
+        second = await sf.do("k", lambda: asyncio.sleep(0, 2))
+        return first, second
+
+    assert _run(main()) == ((1, False), (2, False))
+
+def test_error_reaches_every_waiter_and_counts_once():
+    async def boom():
+        await asyncio.sleep(0.01)
+        raise ValueError("upstream failed")
+
+    async def main():
+        sf = SingleFlight()
+        out = await asyncio.gather(*(sf.do("k", boom) for _ in range(3)), return_exceptions=True)
+        return sf, out
+
+    sf, out = _run(main())
+    assert all(isinstance(e, ValueError) for e in out)
+    assert sf.stats["errors"] == 1
+    assert sf.info()["in_flight"] == 0
+
+def test_follower_cancel_does_not_cancel_leader():
+    async def work():
+        await asyncio.sleep(0.02)
+        return "done"
+
+    async def main():
+        sf = SingleFlight()
+        leader = asyncio.create_task(sf.do("k", work))
+        await asyncio.sleep(0)
+        follower = asyncio.create_task(sf.do("k", work))
+        await asyncio.sleep(0)
+        follower.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await follower
+        return await leader
+
+    assert _run(main()) == ("done", False)
+
+def test_last_waiter_leaving_cancels_the_work():
+    async def main():
+        sf = SingleFlight()
+        entered = asyncio.Event()
+
+        async def work():
+            entered.set()
+            await asyncio.sleep(10)
+
+        caller = asyncio.create_task(sf.do("k", work))
+        await entered.wait()
+        flight_task = sf._flights["k"].task
+        caller.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await caller
+        await asyncio.sleep(0)
+        return sf, flight_task
+
+    sf, flight_task = _run(main())
+    assert flight_task.cancelled()
+    assert sf.info()["in_flight"] == 0
@@ -0,0 +1,66 @@
+import asyncio
+from types import SimpleNamespace
+
+import httpx
+import pytest
+
+from app.service.rag import rag_search_service
+from app.service.rag.rag_search_service import RAGSearchService
+from app.utils.event_stream import StreamInterrupted
+
+def _run(coro):
+    return asyncio.run(coro)
+
+def _chunk(text):
+    return SimpleNamespace(usage=None, choices=[SimpleNamespace(delta=SimpleNamespace(content=text))])
+
+class _FlakyStreamClient:
+    """Streams `tokens`, failing with a read timeout after `fail_after` of them on the first `failures` calls."""
+
+    def __init__(self, tokens, fail_after, failures=1):
+        self.tokens, self.fail_after, self.failures, self.calls = tokens, fail_after, failures, 0
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self._create))
+
+    async def _create(self, **kwargs):
+        self.calls += 1
+        broken = self.calls <= self.failures
+
+        async def gen():
+            for i, tok in enumerate(self.tokens):
+                if broken and i == self.fail_after:
+                    raise httpx.ReadTimeout("read timeout")
+                yield _chunk(tok)
+        return gen()
+
+@pytest.fixture(autouse=True)
+def _no_backoff(monkeypatch):
+    async def no_sleep(_s):
+        return None
+    monkeypatch.setattr("app.utils.circuit_breaker.asyncio.sleep", no_sleep)
+
+def test_mid_stream_failure_is_not_replayed(monkeypatch):
+    client = _FlakyStreamClient(["The ", "answer ", "is ", "42."], fail_after=2)
+    monkeypatch.setattr(rag_search_service, "get_llm_client", lambda: client)
+    sent = []
+
+    async def on_token(tok):
+        sent.append(tok)
+
+    with pytest.raises(StreamInterrupted) as exc:
+        _run(RAGSearchService()._complete("q", "ctx", on_token=on_token))
+    assert client.calls == 1
+    assert sent == ["The ", "answer "]
+    assert exc.value.partial == "The answer "
+
+def test_failure_before_first_token_is_still_retried(monkeypatch):
+    client = _FlakyStreamClient(["The ", "answer."], fail_after=0)
+    monkeypatch.setattr(rag_search_service, "get_llm_client", lambda: client)
+    sent = []
+
+    async def on_token(tok):
+        sent.append(tok)
+
+    text, _ = _run(RAGSearchService()._complete("q", "ctx", on_token=on_token))
+    assert client.calls == 2
+    assert sent == ["The ", "answer."]
+    assert text == "The answer."